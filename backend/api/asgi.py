@@ -0,0 +1,177 @@
+"""
+ASGI-приложение для Django 2.2, в котором нет своего ASGI-обработчика.
+
+Каждый запрос проходит полный стек MIDDLEWARE и обычный dispatch
+представления (django.core.handlers.base.BaseHandler) в потоке пула,
+поэтому цикл событий не ждет БД и процесс держит много медленных
+клиентов одновременно. Тело запроса читается из сообщений ASGI по мере
+того, как его читает представление: загрузки частями (api/v1/views.py,
+ImageUploadViewSet) не собираются в памяти. Потоковые ответы
+отправляются частями.
+
+Действия из api.v1.async_views под ASGI выполняют независимые
+обращения к БД и кэшу одного ответа одновременно.
+"""
+import io
+import sys
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core import signals
+from django.core.handlers import base
+from django.core.handlers.wsgi import WSGIRequest, get_script_name
+from django.http.request import UnreadablePostError
+from django.urls import set_script_prefix
+
+from .v1.async_views import ASGI_ENVIRON_KEY
+
+
+class RequestBody(io.RawIOBase):
+    """
+    Тело запроса из сообщений http.request. Читается в потоке
+    обработчика через LimitedStream запроса: каждое сообщение ожидается
+    в цикле событий, в памяти лежит не больше одного куска.
+    """
+
+    def __init__(self, receive):
+        self.receive = async_to_sync(receive)
+        self.buffer = b''
+        self.more_body = True
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None:
+            size = -1
+        while self.more_body and (size < 0 or len(self.buffer) < size):
+            message = self.receive()
+            if message['type'] == 'http.disconnect':
+                raise UnreadablePostError('Клиент закрыл соединение')
+            self.buffer += message.get('body', b'')
+            self.more_body = message.get('more_body', False)
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def build_environ(scope, body):
+    """WSGI environ запроса ASGI; тело читается из body."""
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        # Конец тела отмечает more_body: тело без Content-Length
+        # (Transfer-Encoding: chunked) читается из wsgi.input.
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        ASGI_ENVIRON_KEY: True,
+    }
+    if scope.get('server'):
+        environ['SERVER_NAME'] = scope['server'][0]
+        environ['SERVER_PORT'] = str(scope['server'][1] or 0)
+    else:
+        environ['SERVER_NAME'] = 'localhost'
+        environ['SERVER_PORT'] = '80'
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin1')
+        if key in environ:
+            value = environ[key] + ',' + value
+        environ[key] = value
+    return environ
+
+
+class ASGIHandler(base.BaseHandler):
+    request_class = WSGIRequest
+
+    def __init__(self):
+        super().__init__()
+        self.load_middleware()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(
+                f'Тип соединения {scope["type"]} не поддерживается')
+
+        response = await sync_to_async(self.handle, thread_sensitive=False)(
+            scope, receive)
+        try:
+            await self.send_response(response, send)
+        finally:
+            await sync_to_async(response.close, thread_sensitive=False)()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def handle(self, scope, receive):
+        """То же, что WSGIHandler.__call__, до отправки ответа."""
+        environ = build_environ(scope, RequestBody(receive))
+        set_script_prefix(get_script_name(environ))
+        signals.request_started.send(sender=self.__class__, environ=environ)
+        request = self.request_class(environ)
+        response = self.get_response(request)
+        response._handler_class = self.__class__
+        return response
+
+    async def send_response(self, response, send):
+        headers = [
+            (name.lower().encode('latin1'), value.encode('latin1'))
+            for name, value in response.items()
+        ]
+        for cookie in response.cookies.values():
+            headers.append(
+                (b'set-cookie', cookie.output(header='').strip().encode()))
+        if not response.streaming:
+            content = response.content
+            if (not response.has_header('Content-Length')
+                    and response.status_code != 304):
+                headers.append(
+                    (b'content-length', str(len(content)).encode()))
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+        if not response.streaming:
+            await send({'type': 'http.response.body', 'body': content})
+            return
+
+        chunks = iter(response)
+        next_chunk = sync_to_async(
+            lambda: next(chunks, None), thread_sensitive=False)
+        while True:
+            chunk = await next_chunk()
+            if chunk is None:
+                break
+            await send({
+                'type': 'http.response.body',
+                'body': chunk,
+                'more_body': True,
+            })
+        await send({'type': 'http.response.body', 'body': b''})
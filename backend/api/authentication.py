@@ -0,0 +1,148 @@
+"""
+Аутентификация по подписанным токенам.
+
+Токен - подписанный SIGNED_TOKEN_KEY список [id пользователя, jti,
+срок действия, поколение], поэтому проверка токена не обращается к БД.
+Пользователь берется из кэша процесса на SIGNED_TOKEN_USER_CACHE_TTL
+секунд. Поколение - отпечаток хэша пароля: смена пароля делает
+недействительными все выданные токены пользователя.
+Выход из системы записывает jti в RevokedToken до истечения срока
+токена; каждый процесс перечитывает этот список не чаще одного раза
+в SIGNED_TOKEN_REVOCATION_REFRESH секунд.
+
+Заголовок прежний: Authorization: Token <токен>. Токены из БД
+(rest_framework.authtoken) по-прежнему принимаются.
+"""
+import secrets
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from users.models import CustomUser, RevokedToken
+
+SALT = 'api.authentication'
+# Токены rest_framework.authtoken - hex без разделителя подписи.
+SEPARATOR = ':'
+USER_CACHE_SIZE = 10000
+GENERATION_LENGTH = 12
+USER_FIELDS = tuple(
+    field.attname for field in CustomUser._meta.concrete_fields)
+
+_users = {}
+_users_lock = threading.Lock()
+_revoked = frozenset()
+_revoked_loaded = None
+_revoked_lock = threading.Lock()
+
+
+class SignedToken:
+    def __init__(self, key, user_id, jti, expires, generation):
+        self.key = key
+        self.user_id = user_id
+        self.jti = jti
+        self.expires = expires
+        self.generation = generation
+
+
+def get_generation(user):
+    """Отпечаток хэша пароля: меняется при смене пароля."""
+    return user.get_session_auth_hash()[:GENERATION_LENGTH]
+
+
+def issue_token(user):
+    expires = int(
+        time.time() + settings.SIGNED_TOKEN_LIFETIME.total_seconds())
+    return signing.dumps(
+        [user.pk, secrets.token_urlsafe(9), expires, get_generation(user)],
+        key=settings.SIGNED_TOKEN_KEY,
+        salt=SALT,
+    )
+
+
+def parse_token(key):
+    try:
+        user_id, jti, expires, generation = signing.loads(
+            key, key=settings.SIGNED_TOKEN_KEY, salt=SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise AuthenticationFailed('Недействительный токен.')
+    if expires < time.time():
+        raise AuthenticationFailed('Срок действия токена истек.')
+    return SignedToken(key, user_id, jti, expires, generation)
+
+
+def get_user(user_id):
+    """
+    Пользователь по id через кэш процесса. Каждый запрос получает
+    свой экземпляр модели, поэтому изменения в одном запросе
+    не видны в другом.
+    """
+    entry = _users.get(user_id)
+    if entry is None or entry[0] < time.monotonic():
+        queryset = CustomUser.objects.filter(pk=user_id)
+        values = queryset.values_list(*USER_FIELDS).first()
+        with _users_lock:
+            if len(_users) >= USER_CACHE_SIZE:
+                _users.clear()
+            _users[user_id] = entry = (
+                time.monotonic() + settings.SIGNED_TOKEN_USER_CACHE_TTL,
+                queryset.db, values)
+    _, db, values = entry
+    if values is None:
+        return None
+    return CustomUser.from_db(db, USER_FIELDS, values)
+
+
+def forget_user(user_id):
+    """Сбросить пользователя из кэша процесса."""
+    _users.pop(user_id, None)
+
+
+def is_revoked(jti):
+    global _revoked, _revoked_loaded
+    now = time.monotonic()
+    if (_revoked_loaded is None or now - _revoked_loaded
+            > settings.SIGNED_TOKEN_REVOCATION_REFRESH):
+        with _revoked_lock:
+            if _revoked_loaded is None or _revoked_loaded < now:
+                _revoked = frozenset(RevokedToken.objects.filter(
+                    expires__gt=timezone.now()
+                ).values_list('jti', flat=True))
+                _revoked_loaded = time.monotonic()
+    return jti in _revoked
+
+
+def revoke_token(token):
+    """Отозвать токен до истечения срока действия."""
+    global _revoked
+    RevokedToken.objects.filter(expires__lte=timezone.now()).delete()
+    RevokedToken.objects.create(
+        jti=token.jti,
+        expires=datetime.fromtimestamp(token.expires, timezone.utc))
+    with _revoked_lock:
+        _revoked = _revoked | {token.jti}
+
+
+class SignedTokenAuthentication(TokenAuthentication):
+    """
+    Authorization: Token <подписанный токен>. Токены из БД проверяет
+    TokenAuthentication.
+    """
+
+    def authenticate_credentials(self, key):
+        if SEPARATOR not in key:
+            return super().authenticate_credentials(key)
+
+        token = parse_token(key)
+        if is_revoked(token.jti):
+            raise AuthenticationFailed('Токен отозван.')
+        user = get_user(token.user_id)
+        if user is None or not user.is_active:
+            raise AuthenticationFailed('Пользователь неактивен или удален.')
+        if token.generation != get_generation(user):
+            raise AuthenticationFailed('Пароль изменен, войдите заново.')
+        return user, token
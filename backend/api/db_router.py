@@ -0,0 +1,153 @@
+"""
+Чтение с реплик БД.
+
+GET, HEAD и OPTIONS запросы к представлениям api.v1.views читают
+с одной из DATABASE_REPLICAS, все остальное идет в default. После
+запроса на запись пользователь DB_REPLICA_STICKY_SECONDS секунд
+читает с default, чтобы видеть свои изменения, даже если реплика
+отстает. Отметка хранится в общем кэше Django (CACHE_LOCATION), а без
+него - файлом в VERSION_STAMP_DIR, который видят все процессы сервера:
+время изменения файла - время последней записи.
+
+Индексы и кэши, общие для запросов, строятся с default независимо
+от реплики запроса (router.db_for_write), чтобы отставание реплики
+не попало в них.
+"""
+import contextvars
+import hashlib
+import os
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from recipes.cache import is_shared
+from recipes.versions import write_atomic
+from rest_framework.authentication import get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+
+from .authentication import SEPARATOR, parse_token
+
+REPLICA_VIEW_MODULES = ('api.v1.views',)
+
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+
+
+def get_token_identity(key):
+    """
+    Кому принадлежит токен, без обращения к БД: id пользователя
+    подписанного токена или сам токен из БД (он один у пользователя).
+    """
+    if SEPARATOR not in key:
+        return key
+    try:
+        return parse_token(key).user_id
+    except AuthenticationFailed:
+        return None
+
+
+def get_request_identity(request):
+    auth = get_authorization_header(request).split()
+    if len(auth) != 2 or auth[0].lower() != b'token':
+        return None
+    return get_token_identity(auth[1].decode(errors='replace'))
+
+
+def get_sticky_key(identity):
+    return f'db:primary:{identity}'
+
+
+def get_sticky_path(identity):
+    # В имени файла нет самого токена.
+    digest = hashlib.sha256(str(identity).encode()).hexdigest()
+    return os.path.join(settings.VERSION_STAMP_DIR, 'primary', digest)
+
+
+def stick_to_primary(identity):
+    """Читать с default ближайшие DB_REPLICA_STICKY_SECONDS секунд."""
+    if not settings.DATABASE_REPLICAS or identity is None:
+        return
+    if is_shared():
+        cache.set(get_sticky_key(identity), True,
+                  settings.DB_REPLICA_STICKY_SECONDS)
+    else:
+        write_atomic(get_sticky_path(identity), b'')
+
+
+def is_sticky(identity):
+    """Была ли запись от identity в последние DB_REPLICA_STICKY_SECONDS."""
+    if is_shared():
+        return bool(cache.get(get_sticky_key(identity)))
+    path = get_sticky_path(identity)
+    try:
+        modified = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return False
+    if time.time() - modified < settings.DB_REPLICA_STICKY_SECONDS:
+        return True
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    return False
+
+
+def get_read_alias(request, view_class):
+    """Реплика для чтения в этом запросе или None (default)."""
+    if (settings.DATABASE_REPLICAS
+            and request.method in SAFE_METHODS
+            and view_class is not None
+            and view_class.__module__ in REPLICA_VIEW_MODULES):
+        identity = get_request_identity(request)
+        if identity is None or not is_sticky(identity):
+            return random.choice(settings.DATABASE_REPLICAS)
+    return None
+
+
+def get_current_alias():
+    """Реплика для чтения, выбранная для текущего запроса, или None."""
+    return _read_alias.get()
+
+
+@contextmanager
+def read_from(alias):
+    """Читать с alias внутри блока (None - с default)."""
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        # Объекты, прочитанные с реплики, сохраняются в default.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+class ReadReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _read_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        if request.method not in SAFE_METHODS:
+            stick_to_primary(get_request_identity(request))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _read_alias.set(get_read_alias(
+            request, getattr(view_func, 'cls', None)))
@@ -0,0 +1,286 @@
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib import error, request
+
+from api import authentication
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import Client, override_settings
+from recipes import models
+from rest_framework.authtoken.models import Token
+
+from .seed_benchmark_data import PREFIX
+
+PERCENTILES = (50, 95, 99)
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочный тест маршрутов api/v1/urls.py на данных seed_benchmark_data.
+    Use:
+        python manage.py seed_benchmark_data
+        python manage.py benchmark --requests 200 --concurrency 8 \\
+            --output bench.json
+        python manage.py benchmark --compare bench-old.json bench.json
+    По умолчанию запросы идут через WSGI-обработчик в этом процессе;
+    с --url они отправляются по HTTP на запущенный сервер. Время
+    открытия соединений с БД (connect) берется из заголовка
+    Server-Timing, на сервере нужен QUERY_METRICS_HEADERS=True.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100,
+                            help='запросов на каждый маршрут')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--warmup', type=int, default=5,
+                            help='запросов на маршрут до замера')
+        parser.add_argument('--endpoints', nargs='*',
+                            help='проверить только эти маршруты')
+        parser.add_argument('--url', help='адрес сервера, например '
+                            'http://localhost:8000')
+        parser.add_argument('--output', help='сохранить результат в JSON')
+        parser.add_argument('--compare', nargs=2,
+                            metavar=('BEFORE', 'AFTER'),
+                            help='сравнить два сохраненных результата')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options['compare']:
+            self.compare(*options['compare'])
+            return
+
+        self.random = random.Random(options['seed'])
+        self.base_url = options['url']
+        self.local = threading.local()
+        self.load_fixtures()
+
+        endpoints = self.get_endpoints()
+        if options['endpoints']:
+            endpoints = {
+                name: endpoint for name, endpoint in endpoints.items()
+                if name in options['endpoints']
+            }
+
+        results = {}
+        with override_settings(QUERY_METRICS_HEADERS=True):
+            for name, endpoint in endpoints.items():
+                self.run_endpoint(endpoint, options['warmup'], 1)
+                results[name] = self.run_endpoint(
+                    endpoint, options['requests'], options['concurrency'])
+                self.stdout.write(self.format_line(name, results[name]))
+
+        report = {'meta': self.get_meta(options), 'endpoints': results}
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'saved to {options["output"]}')
+
+    def load_fixtures(self):
+        if settings.SIGNED_TOKEN_AUTH:
+            self.tokens = [
+                authentication.issue_token(user)
+                for user in models.CustomUser.objects.filter(
+                    username__startswith=PREFIX).only('id')
+            ]
+        else:
+            self.tokens = list(Token.objects.filter(
+                user__username__startswith=PREFIX
+            ).values_list('key', flat=True))
+        self.recipe_ids = list(models.Recipe.objects.filter(
+            name__startswith=PREFIX).values_list('id', flat=True))
+        self.user_ids = list(models.CustomUser.objects.filter(
+            username__startswith=PREFIX).values_list('id', flat=True))
+        self.tag_slugs = list(models.Tag.objects.filter(
+            slug__startswith=f'{PREFIX}-').values_list('slug', flat=True))
+        if not (self.tokens and self.recipe_ids and self.tag_slugs):
+            raise CommandError(
+                'Нет данных для теста: выполните seed_benchmark_data')
+        connection.close()
+
+    def get_endpoints(self):
+        """Имя -> функция, возвращающая (url, нужна ли авторизация)."""
+        choice = self.random.choice
+        return {
+            'recipes-list': lambda: ('/api/recipes/?limit=6', False),
+            'recipes-list-auth': lambda: ('/api/recipes/?limit=6', True),
+            'recipes-list-deep-page': lambda: (
+                f'/api/recipes/?limit=6&page={len(self.recipe_ids) // 12}',
+                True),
+            'recipes-list-cursor': lambda: (
+                '/api/recipes/?limit=6&cursor=', True),
+            'recipes-list-tags': lambda: (
+                f'/api/recipes/?limit=6&tags={choice(self.tag_slugs)}'
+                f'&tags={choice(self.tag_slugs)}', True),
+            'recipes-list-favorited': lambda: (
+                '/api/recipes/?limit=6&is_favorited=1', True),
+            'recipes-detail': lambda: (
+                f'/api/recipes/{choice(self.recipe_ids)}/', True),
+            'recipes-download-shopping-cart': lambda: (
+                '/api/recipes/download_shopping_cart/', True),
+            'tag-list': lambda: ('/api/tags/', False),
+            'ingredient-list': lambda: ('/api/ingredients/', False),
+            'ingredient-search': lambda: (
+                f'/api/ingredients/?name={PREFIX}%20ингредиент%20'
+                f'{self.random.randint(1, 99)}', False),
+            'customuser-list': lambda: ('/api/users/?limit=6', True),
+            'customuser-detail': lambda: (
+                f'/api/users/{choice(self.user_ids)}/', True),
+            'customuser-me': lambda: ('/api/users/me/', True),
+            'customuser-subscriptions': lambda: (
+                '/api/users/subscriptions/?limit=6&recipes_limit=3', True),
+        }
+
+    def get(self, url, authorized):
+        headers = {}
+        if authorized:
+            headers['HTTP_AUTHORIZATION'] = (
+                f'Token {self.random.choice(self.tokens)}')
+        start = time.perf_counter()
+        if self.base_url:
+            status, server_timing = self.get_http(url, headers)
+        else:
+            status, server_timing = self.get_local(url, headers)
+        return (time.perf_counter() - start, status,
+                get_connect_ms(server_timing))
+
+    def get_local(self, url, headers):
+        if not hasattr(self.local, 'client'):
+            self.local.client = Client(HTTP_HOST='localhost')
+        # Тестовый клиент не закрывает соединения с БД в начале и в конце
+        # запроса, как это делает WSGIHandler.
+        close_old_connections()
+        try:
+            response = self.local.client.get(url, **headers)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        finally:
+            close_old_connections()
+        return response.status_code, response.get('Server-Timing')
+
+    def get_http(self, url, headers):
+        http_request = request.Request(self.base_url.rstrip('/') + url)
+        if 'HTTP_AUTHORIZATION' in headers:
+            http_request.add_header(
+                'Authorization', headers['HTTP_AUTHORIZATION'])
+        try:
+            with request.urlopen(http_request) as response:
+                response.read()
+                return response.status, response.headers['Server-Timing']
+        except error.HTTPError as http_error:
+            return http_error.code, http_error.headers['Server-Timing']
+
+    def run_endpoint(self, endpoint, count, concurrency):
+        def worker(_):
+            return self.get(*endpoint())
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = list(executor.map(worker, range(count)))
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(latency for latency, _, _ in samples)
+        errors = sum(1 for _, status, _ in samples if status >= 400)
+        connect_times = [
+            connect_ms for _, _, connect_ms in samples
+            if connect_ms is not None]
+        result = {
+            'requests': count,
+            'errors': errors,
+            'concurrency': concurrency,
+            'rps': round(count / elapsed, 2) if elapsed else None,
+            'mean_ms': round(statistics.mean(latencies) * 1000, 2),
+            'connect_ms': (round(statistics.mean(connect_times), 3)
+                           if connect_times else None),
+        }
+        for percentile in PERCENTILES:
+            result[f'p{percentile}_ms'] = round(
+                percentile_of(latencies, percentile) * 1000, 2)
+        return result
+
+    def get_meta(self, options):
+        try:
+            commit = subprocess.run(
+                ('git', 'rev-parse', '--short', 'HEAD'),
+                cwd=settings.BASE_DIR, capture_output=True, text=True,
+                check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'date': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+            'pool_size': connection.settings_dict.get('POOL_SIZE'),
+            'target': options['url'] or 'in-process',
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'recipes': len(self.recipe_ids),
+            'users': len(self.user_ids),
+        }
+
+    def format_line(self, name, result):
+        line = (
+            f'{name:32} {result["rps"]:9.1f} rps  '
+            f'p50 {result["p50_ms"]:8.2f}  p95 {result["p95_ms"]:8.2f}  '
+            f'p99 {result["p99_ms"]:8.2f} ms  errors {result["errors"]}'
+        )
+        if result.get('connect_ms') is not None:
+            line += f'  connect {result["connect_ms"]:.3f} ms'
+        return line
+
+    def compare(self, before_path, after_path):
+        with open(before_path, encoding='utf-8') as file:
+            before = json.load(file)
+        with open(after_path, encoding='utf-8') as file:
+            after = json.load(file)
+        self.stdout.write(
+            f'{before["meta"]["commit"]} -> {after["meta"]["commit"]}')
+        for name, result in after['endpoints'].items():
+            old = before['endpoints'].get(name)
+            if old is None:
+                self.stdout.write(f'{name:32} новый маршрут')
+                continue
+            line = (
+                f'{name:32} rps {old["rps"]:9.1f} -> {result["rps"]:9.1f}  '
+                f'p95 {old["p95_ms"]:8.2f} -> {result["p95_ms"]:8.2f} ms  '
+                f'({change(old["p95_ms"], result["p95_ms"])})'
+            )
+            if (old.get('connect_ms') is not None
+                    and result.get('connect_ms') is not None):
+                line += (f'  connect {old["connect_ms"]:.3f} -> '
+                         f'{result["connect_ms"]:.3f} ms')
+            self.stdout.write(line)
+
+
+def get_connect_ms(server_timing):
+    """Время открытия соединений с БД из заголовка Server-Timing."""
+    for metric in (server_timing or '').split(','):
+        name, _, duration = metric.strip().partition(';dur=')
+        if name == 'db-connect':
+            return float(duration)
+    return None
+
+
+def percentile_of(values, percentile):
+    """Перцентиль методом ближайшего ранга по отсортированному списку."""
+    if not values:
+        return 0.0
+    rank = max(1, round(percentile / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+def change(old, new):
+    if not old:
+        return 'n/a'
+    return f'{(new - old) / old * 100:+.1f}%'
@@ -0,0 +1,138 @@
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes import ingredient_index, models, pantry_index, search, versions
+from rest_framework.authtoken.models import Token
+from users.models import CustomUser
+
+PREFIX = 'bench'
+PASSWORD = 'Foodgram-bench-1'
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    """
+    Заполнить БД синтетическими данными для команды benchmark.
+    Use:
+        python manage.py seed_benchmark_data --users 500 --recipes 5000
+    Пользователи получают логин bench<N>, пароль Foodgram-bench-1
+    и токен. Повторный запуск сначала удаляет прежние данные bench.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--tags', type=int, default=8)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--units', type=int, default=20)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='избранных рецептов на пользователя')
+        parser.add_argument('--carts', type=int, default=5,
+                            help='рецептов в списке покупок на пользователя')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='подписок на пользователя')
+        parser.add_argument('--seed', type=int, default=1)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        self.random = random.Random(options['seed'])
+        self.clear()
+
+        units = self.bulk(models.Unit, (
+            models.Unit(name=f'{PREFIX} unit {index}')
+            for index in range(options['units'])
+        ))
+        ingredients = self.bulk(models.Ingredient, (
+            models.Ingredient(
+                name=f'{PREFIX} ингредиент {index}',
+                measurement_unit=self.random.choice(units))
+            for index in range(options['ingredients'])
+        ))
+        tags = self.bulk(models.Tag, (
+            models.Tag(
+                name=f'{PREFIX} tag {index}',
+                color='#%06X' % self.random.randrange(0x1000000),
+                slug=f'{PREFIX}-{index}')
+            for index in range(options['tags'])
+        ))
+        password = make_password(PASSWORD)
+        users = self.bulk(CustomUser, (
+            CustomUser(
+                username=f'{PREFIX}{index}',
+                email=f'{PREFIX}{index}@foodgram.ru',
+                first_name='Bench',
+                last_name=f'User {index}',
+                password=password)
+            for index in range(options['users'])
+        ))
+        self.bulk(Token, (
+            Token(key=Token.generate_key(), user=user) for user in users))
+        recipes = self.bulk(models.Recipe, (
+            models.Recipe(
+                name=f'{PREFIX} рецепт {index}',
+                text='Синтетический рецепт для нагрузочного теста. ' * 5,
+                cooking_time=self.random.randint(5, 180),
+                author=users[index % len(users)])
+            for index in range(options['recipes'])
+        ))
+        self.bulk(models.TagRecipe, (
+            models.TagRecipe(recipe=recipe, tag=tag)
+            for recipe in recipes
+            for tag in self.sample(tags, options['tags_per_recipe'])
+        ))
+        self.bulk(models.IngredientRecipe, (
+            models.IngredientRecipe(
+                recipe=recipe,
+                ingredient=ingredient,
+                amount=self.random.randint(1, 500))
+            for recipe in recipes
+            for ingredient in self.sample(
+                ingredients, options['ingredients_per_recipe'])
+        ))
+        for model, option in ((models.Favorite, 'favorites'),
+                              (models.ShoppingCart, 'carts')):
+            self.bulk(model, (
+                model(user=user, recipe=recipe)
+                for user in users
+                for recipe in self.sample(recipes, options[option])
+            ))
+        self.bulk(models.Subscription, (
+            models.Subscription(user=user, following=following)
+            for user in users
+            for following in self.sample(users, options['subscriptions'])
+            if following != user
+        ))
+        search.index_recipes(recipe.pk for recipe in recipes)
+        transaction.on_commit(ingredient_index.bump_version)
+        transaction.on_commit(pantry_index.bump_version)
+        transaction.on_commit(versions.tags.bump)
+        transaction.on_commit(versions.recipe_tags.bump)
+
+        self.stdout.write(
+            f'{len(users)} users, {len(recipes)} recipes, '
+            f'{len(ingredients)} ingredients, {len(tags)} tags '
+            f'seeded in {time.monotonic() - start:.1f}s')
+
+    def sample(self, population, count):
+        return self.random.sample(population, min(count, len(population)))
+
+    def bulk(self, model, objects):
+        """bulk_create пачками; на SQLite id перечитываются из БД."""
+        objects = list(objects)
+        created = model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+        if created and created[0].pk is None:
+            created = list(model.objects.order_by('-pk')[:len(objects)])
+            created.reverse()
+        return created
+
+    def clear(self):
+        CustomUser.objects.filter(username__startswith=PREFIX).delete()
+        models.Tag.objects.filter(slug__startswith=f'{PREFIX}-').delete()
+        models.Ingredient.objects.filter(name__startswith=PREFIX).delete()
+        models.Unit.objects.filter(name__startswith=PREFIX).delete()
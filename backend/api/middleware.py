@@ -0,0 +1,176 @@
+"""
+Метрики запросов к API: число SQL-запросов, время в БД,
+самый медленный запрос, время сериализации (SerializerTimingMixin
+представлений API), открытия соединений с БД и состояние пулов
+соединений (foodgram/db/pool.py).
+
+Метрики пишутся в лог api.metrics одной JSON-строкой на запрос.
+При QUERY_METRICS_HEADERS = True они также отдаются в заголовках
+Server-Timing, X-Query-Count и X-Query-Budget.
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.template.response import SimpleTemplateResponse
+from foodgram.db.pool import get_pool_stats
+
+from .query_budgets import QUERY_BUDGETS
+
+logger = logging.getLogger('api.metrics')
+
+SLOW_SQL_LENGTH = 300
+
+_current_metrics = contextvars.ContextVar('query_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.slowest_sql = ''
+        self.slowest_time = 0.0
+        self.serializer_time = 0.0
+        self.connects = 0
+        self.connect_time = 0.0
+        # Запросы ASGI-обработчиков идут из нескольких потоков сразу.
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            with self.lock:
+                self.query_count += 1
+                self.sql_time += duration
+                if duration > self.slowest_time:
+                    self.slowest_time = duration
+                    self.slowest_sql = sql[:SLOW_SQL_LENGTH]
+
+
+def stop_serializer_timer(timer):
+    metrics, start, sql_time = timer
+    with metrics.lock:
+        # Время SQL-запросов считается отдельно (db в Server-Timing).
+        elapsed = time.perf_counter() - start - (metrics.sql_time - sql_time)
+        metrics.serializer_time += max(elapsed, 0.0)
+
+
+class SerializerTimingMixin:
+    """
+    Время сериализации для метрик запроса в представлениях API:
+    действие после initial() (прав и условного запроса) и рендеринг
+    ответа без времени SQL-запросов.
+    """
+    serializer_timer = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        metrics = get_current_metrics()
+        if metrics is not None:
+            self.serializer_timer = (
+                metrics, time.perf_counter(), metrics.sql_time)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        timer, self.serializer_timer = self.serializer_timer, None
+        if timer is None:
+            return response
+        if (isinstance(response, SimpleTemplateResponse)
+                and not response.is_rendered):
+            response.add_post_render_callback(
+                lambda _: stop_serializer_timer(timer))
+        else:
+            stop_serializer_timer(timer)
+        return response
+
+
+def get_connect_totals():
+    """Сколько раз и как долго открывались соединения этого потока."""
+    count, duration = 0, 0.0
+    for connection in connections.all():
+        count += getattr(connection, 'connect_count', 0)
+        duration += getattr(connection, 'connect_time', 0.0)
+    return count, duration
+
+
+def get_current_metrics():
+    """RequestMetrics текущего запроса или None вне запроса."""
+    return _current_metrics.get()
+
+
+@contextmanager
+def collect_metrics(metrics):
+    """Учесть в metrics SQL-запросы, соединения и сериализацию потока."""
+    token = _current_metrics.set(metrics)
+    connects_before, connect_time_before = get_connect_totals()
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            yield
+    finally:
+        _current_metrics.reset(token)
+        connects, connect_time = get_connect_totals()
+        with metrics.lock:
+            metrics.connects += connects - connects_before
+            metrics.connect_time += connect_time - connect_time_before
+
+
+def report_metrics(request, route, response, metrics, total_time):
+    """Записать метрики в лог api.metrics и в заголовки ответа."""
+    budget = QUERY_BUDGETS.get((route, request.method))
+    over_budget = budget is not None and metrics.query_count > budget
+    record = json.dumps({
+        'method': request.method,
+        'path': request.path,
+        'route': route,
+        'status': response.status_code,
+        'query_count': metrics.query_count,
+        'query_budget': budget,
+        'over_budget': over_budget,
+        'sql_ms': round(metrics.sql_time * 1000, 2),
+        'slowest_sql_ms': round(metrics.slowest_time * 1000, 2),
+        'slowest_sql': metrics.slowest_sql,
+        'serializer_ms': round(metrics.serializer_time * 1000, 2),
+        'db_connects': metrics.connects,
+        'db_connect_ms': round(metrics.connect_time * 1000, 2),
+        'db_pool': get_pool_stats() or None,
+        'total_ms': round(total_time * 1000, 2),
+    }, ensure_ascii=False)
+    logger.log(logging.WARNING if over_budget else logging.INFO, record)
+
+    if settings.QUERY_METRICS_HEADERS:
+        response['X-Query-Count'] = str(metrics.query_count)
+        if budget is not None:
+            response['X-Query-Budget'] = str(budget)
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={metrics.sql_time * 1000:.2f}',
+            f'db-slowest;dur={metrics.slowest_time * 1000:.2f}',
+            f'db-connect;dur={metrics.connect_time * 1000:.2f}',
+            f'serializer;dur={metrics.serializer_time * 1000:.2f}',
+            f'total;dur={total_time * 1000:.2f}',
+        ))
+
+
+class QueryMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        start = time.perf_counter()
+        with collect_metrics(metrics):
+            response = self.get_response(request)
+        match = request.resolver_match
+        report_metrics(request, match.url_name if match else None,
+                       response, metrics, time.perf_counter() - start)
+        return response
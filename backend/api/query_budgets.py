@@ -0,0 +1,50 @@
+"""
+Бюджет SQL-запросов для маршрутов api/v1/urls.py: (имя маршрута, метод).
+
+Значения сняты тестом api/tests/test_query_budgets.py на холодном кэше
+рецептов и прогретом кэше пользователей api/authentication.py, они
+не зависят от размера страницы. Токен из БД (SIGNED_TOKEN_AUTH = False)
+добавляет к каждому запросу один SQL-запрос. Превышение бюджета в рабочем
+трафике отмечается в логе api.metrics как over_budget.
+"""
+
+QUERY_BUDGETS = {
+    ('tag-list', 'GET'): 1,
+    ('tag-detail', 'GET'): 1,
+    ('ingredient-list', 'GET'): 1,
+    ('ingredient-detail', 'GET'): 2,
+    ('customuser-list', 'GET'): 3,
+    ('customuser-list', 'POST'): 4,
+    ('customuser-detail', 'GET'): 2,
+    ('customuser-me', 'GET'): 0,
+    ('customuser-set-password', 'POST'): 1,
+    ('customuser-subscriptions', 'GET'): 3,
+    ('recipes-list', 'GET'): 6,
+    ('recipes-list', 'POST'): 15,
+    ('recipes-detail', 'GET'): 4,
+    ('recipes-detail', 'PATCH'): 22,
+    ('recipes-detail', 'DELETE'): 11,
+    ('recipes-download-shopping-cart', 'GET'): 2,
+    ('recipes-pantry', 'GET'): 7,
+    ('favorite-list', 'POST'): 4,
+    ('favorite-list', 'DELETE'): 4,
+    ('shopping_cart-list', 'POST'): 4,
+    ('shopping_cart-list', 'DELETE'): 4,
+    ('subscribe-list', 'POST'): 6,
+    ('subscribe-list', 'DELETE'): 4,
+    ('token-login', 'POST'): 1,
+    ('token-logout', 'POST'): 3,
+    ('uploads-list', 'POST'): 1,
+    ('uploads-detail', 'GET'): 1,
+    ('uploads-detail', 'PATCH'): 2,
+    ('uploads-detail', 'DELETE'): 3,
+}
+
+# Маршруты без бюджета: корень API и .../<pk>/delete/, которыми
+# фронтенд не пользуется (удаление идет методом DELETE на -list).
+UNCHECKED_ROUTES = {
+    'api-root',
+    'favorite-delete',
+    'shopping_cart-delete',
+    'subscribe-delete',
+}
@@ -0,0 +1,15 @@
+from functools import partial
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from recipes.cache import now_and_on_commit
+from users.models import CustomUser
+
+from . import authentication
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def forget_cached_user(sender, instance, **kwargs):
+    """Измененный пользователь перечитывается при следующем запросе."""
+    now_and_on_commit(partial(authentication.forget_user, instance.pk))
@@ -0,0 +1,53 @@
+import os
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+
+class IsolatedFilesMixin:
+    """
+    Индексы, штампы версий, загрузки и медиа теста пишутся во временный
+    каталог класса, а не в backend/; кэш очищается перед каждым тестом.
+    """
+    client_class = APIClient
+
+    @classmethod
+    def setUpClass(cls):
+        cls.files_dir = tempfile.TemporaryDirectory()
+        path = cls.files_dir.name
+        cls.files_settings = override_settings(
+            INGREDIENT_INDEX_PATH=os.path.join(path, 'ingredients.idx'),
+            PANTRY_INDEX_PATH=os.path.join(path, 'pantry.idx'),
+            VERSION_STAMP_DIR=os.path.join(path, 'versions'),
+            IMAGE_UPLOAD_DIR=os.path.join(path, 'uploads'),
+            MEDIA_ROOT=os.path.join(path, 'media'),
+            PROTECTED_MEDIA_ROOT=os.path.join(path, 'protected'),
+            PANTRY_INDEX_BACKGROUND_REBUILD=False,
+        )
+        cls.files_settings.enable()
+        try:
+            super().setUpClass()
+        except Exception:
+            cls.files_settings.disable()
+            cls.files_dir.cleanup()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.files_settings.disable()
+        cls.files_dir.cleanup()
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+class APITestCase(IsolatedFilesMixin, TestCase):
+    """Тест в транзакции, которая откатывается после теста."""
+
+
+class APITransactionTestCase(IsolatedFilesMixin, TransactionTestCase):
+    """Тест с настоящими коммитами: выполняются и on_commit."""
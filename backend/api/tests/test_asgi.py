@@ -0,0 +1,143 @@
+import asyncio
+import io
+import json
+
+from api import authentication
+from api.asgi import ASGIHandler
+from django.test import override_settings
+from PIL import Image
+from recipes import models
+from users.models import CustomUser
+
+from .base import APITransactionTestCase
+
+
+@override_settings(SIGNED_TOKEN_AUTH=True, SIGNED_TOKEN_KEY='asgi-test-key')
+class ASGIHandlerTest(APITransactionTestCase):
+    """
+    Ответы ASGI совпадают с ответами тестового клиента (WSGI).
+    Потоки пула работают со своими соединениями, поэтому данные
+    теста закоммичены.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(
+            username='author', email='author@foodgram.ru',
+            first_name='Author', last_name='Author')
+        self.token = authentication.issue_token(self.user)
+        # Кэш пользователей процесса, как у работающего сервера.
+        authentication.get_user(self.user.pk)
+        authentication.is_revoked(None)
+        tag = models.Tag.objects.create(
+            name='tag', color='#E26C2D', slug='tag')
+        ingredient = models.Ingredient.objects.create(
+            name='соль', measurement_unit=models.Unit.objects.create(name='г'))
+        self.recipe = models.Recipe.objects.create(
+            name='Рецепт', text='Описание', cooking_time=5, author=self.user)
+        self.recipe.tags.set([tag])
+        models.IngredientRecipe.objects.create(
+            recipe=self.recipe, ingredient=ingredient, amount=2)
+        models.ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        self.application = ASGIHandler()
+
+    def call(self, method, path, query='', body=(), headers=()):
+        """Ответ ASGI: (статус, заголовки, сообщения тела)."""
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'root_path': '',
+            'query_string': query.encode(),
+            'headers': [(b'host', b'testserver')] + [
+                (name.encode(), value.encode()) for name, value in headers],
+            'server': ('testserver', 80),
+            'client': ('127.0.0.1', 12345),
+        }
+        messages = [
+            {'type': 'http.request', 'body': chunk, 'more_body': True}
+            for chunk in body
+        ] + [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(self.application(scope, receive, send))
+        start, *body_messages = sent
+        self.assertEqual(start['type'], 'http.response.start')
+        headers = {
+            name.decode(): value.decode() for name, value in start['headers']}
+        return start['status'], headers, body_messages
+
+    def assert_same_response(self, path, query='', authenticated=False):
+        headers = ()
+        kwargs = {}
+        if authenticated:
+            headers = (('authorization', f'Token {self.token}'),)
+            kwargs['HTTP_AUTHORIZATION'] = f'Token {self.token}'
+        status, asgi_headers, body = self.call('GET', path, query, (), headers)
+        response = self.client.get(f'{path}?{query}', **kwargs)
+        self.assertEqual(status, response.status_code)
+        self.assertEqual(
+            asgi_headers,
+            {name.lower(): value for name, value in response.items()})
+        self.assertEqual(
+            b''.join(message['body'] for message in body),
+            b''.join(response) if response.streaming else response.content)
+
+    def test_responses_match_test_client(self):
+        cases = (
+            ('/api/tags/', ''),
+            ('/api/ingredients/', 'name=%D1%81%D0%BE'),
+            ('/api/recipes/', ''),
+            ('/api/recipes/', 'limit=1&page=2'),
+            (f'/api/recipes/{self.recipe.pk}/', ''),
+            ('/api/recipes/999999/', ''),
+            ('/api/recipes/abc/', ''),
+            ('/api/users/me/', ''),
+            ('/api/recipes/download_shopping_cart/', ''),
+        )
+        for authenticated in (False, True):
+            for path, query in cases:
+                with self.subTest(path=path, query=query,
+                                  authenticated=authenticated):
+                    self.assert_same_response(path, query, authenticated)
+
+    def test_middleware_runs(self):
+        status, headers, _ = self.call('GET', '/api/tags/')
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['x-frame-options'], 'SAMEORIGIN')
+
+    def upload(self, headers):
+        image = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(image, 'PNG')
+        image = image.getvalue()
+        response = self.client.post('/api/uploads/', {
+            'filename': 'image.png', 'size': len(image),
+        }, format='json', HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.assertEqual(response.status_code, 201)
+
+        chunks = [image[:10], image[10:20], image[20:]]
+        status, _, body = self.call(
+            'PATCH', f'/api/uploads/{response.data["token"]}/', body=chunks,
+            headers=(
+                ('authorization', f'Token {self.token}'),
+                ('content-type', 'application/offset+octet-stream'),
+                ('upload-offset', '0'),
+            ) + headers(image))
+        self.assertEqual(status, 200)
+        data = json.loads(b''.join(message['body'] for message in body))
+        self.assertEqual(data['offset'], len(image))
+
+    def test_request_body_is_read_in_parts(self):
+        self.upload(lambda image: (('content-length', str(len(image))),))
+
+    def test_chunked_request_body(self):
+        self.upload(lambda image: (('transfer-encoding', 'chunked'),))
@@ -0,0 +1,114 @@
+import time
+from unittest import mock
+
+from api import authentication, middleware
+from django.conf import settings
+from django.test import override_settings
+from rest_framework.test import APIClient
+from users.models import CustomUser, RevokedToken
+
+from .base import APITestCase
+
+PASSWORD = 'Secret-password-1'
+NEW_PASSWORD = 'Other-password-2'
+
+
+@override_settings(SIGNED_TOKEN_AUTH=True, SIGNED_TOKEN_KEY='auth-test-key')
+class SignedTokenTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='user', email='user@foodgram.ru',
+            first_name='User', last_name='User', password=PASSWORD)
+
+    def setUp(self):
+        super().setUp()
+        # Кэш пользователей и отозванных токенов свой у каждого теста.
+        for name, value in (('_users', {}), ('_revoked', frozenset()),
+                            ('_revoked_loaded', None)):
+            patcher = mock.patch.object(authentication, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Холодные кэши превышают бюджет запросов, это ожидаемо.
+        patcher = mock.patch.object(middleware.logger, 'disabled', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def login(self, password=PASSWORD):
+        response = self.client.post('/api/auth/token/login/', {
+            'email': self.user.email, 'password': password,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['auth_token']
+
+    def get_client(self, key):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+        return client
+
+    def assert_rejected(self, client, detail):
+        response = client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['detail'], detail)
+
+    def test_token_is_checked_without_queries(self):
+        client = self.get_client(self.login())
+        response = client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], self.user.pk)
+        with self.assertNumQueries(0):
+            client.get('/api/users/me/')
+
+    def test_tampered_token(self):
+        key = self.login()
+        self.assert_rejected(
+            self.get_client(key[:-2] + 'xx'), 'Недействительный токен.')
+
+    def test_expired_token(self):
+        client = self.get_client(self.login())
+        lifetime = settings.SIGNED_TOKEN_LIFETIME.total_seconds()
+        with mock.patch('time.time', return_value=time.time() + lifetime + 1):
+            self.assert_rejected(client, 'Срок действия токена истек.')
+
+    def test_logout_revokes_only_its_token(self):
+        client = self.get_client(self.login())
+        other = self.get_client(self.login())
+        self.assertEqual(client.post('/api/auth/token/logout/').status_code,
+                         204)
+        self.assert_rejected(client, 'Токен отозван.')
+        self.assertEqual(other.get('/api/users/me/').status_code, 200)
+        self.assertEqual(RevokedToken.objects.count(), 1)
+
+        # Другой процесс читает отозванные токены из БД.
+        authentication._revoked = frozenset()
+        authentication._revoked_loaded = None
+        self.assert_rejected(client, 'Токен отозван.')
+
+    def test_expired_revocations_are_removed(self):
+        client = self.get_client(self.login())
+        client.post('/api/auth/token/logout/')
+        lifetime = settings.SIGNED_TOKEN_LIFETIME.total_seconds()
+        with mock.patch('time.time', return_value=time.time() + lifetime + 1):
+            client = self.get_client(self.login())
+        with mock.patch('django.utils.timezone.now',
+                        return_value=RevokedToken.objects.get().expires):
+            client.post('/api/auth/token/logout/')
+        self.assertEqual(RevokedToken.objects.count(), 1)
+
+    def test_password_change_revokes_tokens(self):
+        client = self.get_client(self.login())
+        other = self.get_client(self.login())
+        response = client.post('/api/users/set_password/', {
+            'current_password': PASSWORD, 'new_password': NEW_PASSWORD,
+        }, format='json')
+        self.assertEqual(response.status_code, 204)
+        for old_client in (client, other):
+            self.assert_rejected(old_client, 'Пароль изменен, войдите заново.')
+        client = self.get_client(self.login(NEW_PASSWORD))
+        self.assertEqual(client.get('/api/users/me/').status_code, 200)
+
+    def test_inactive_user(self):
+        client = self.get_client(self.login())
+        self.user.is_active = False
+        self.user.save()
+        self.assert_rejected(client, 'Пользователь неактивен или удален.')
@@ -0,0 +1,83 @@
+from unittest import mock, skipUnless
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from recipes import models
+from users.models import CustomUser
+
+from .base import APITestCase
+
+LOGGER = 'recipes.management.commands.clear_table'
+
+
+# Лог команды пишется в файл рядом с ней, в тестах он не нужен.
+@mock.patch('recipes.management.commands.clear_table.initialize_logger')
+class ClearTableTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create_user(
+            username='author', email='author@foodgram.ru',
+            first_name='Author', last_name='Author')
+        ingredient = models.Ingredient.objects.create(
+            name='соль', measurement_unit=models.Unit.objects.create(name='г'))
+        tag = models.Tag.objects.create(
+            name='tag', color='#E26C2D', slug='tag')
+        for index in range(5):
+            recipe = models.Recipe.objects.create(
+                name=f'рецепт {index}', text='Описание', cooking_time=5,
+                author=user)
+            recipe.tags.set([tag])
+            models.IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=index + 1)
+            models.Favorite.objects.create(user=user, recipe=recipe)
+
+    def assert_recipes_cleared(self):
+        self.assertFalse(models.Recipe.objects.exists())
+        self.assertFalse(models.IngredientRecipe.objects.exists())
+        self.assertFalse(models.TagRecipe.objects.exists())
+        self.assertFalse(models.Favorite.objects.exists())
+        self.assertTrue(models.Ingredient.objects.exists())
+        self.assertTrue(models.Tag.objects.exists())
+
+    def test_chunk_size(self, _):
+        with self.assertLogs(LOGGER) as logs:
+            call_command(
+                'clear_table', 'tablename', 'recipes_recipe', chunk_size=2)
+        self.assert_recipes_cleared()
+        self.assertEqual([
+            message for message in logs.output if 'deleted' in message
+        ], [
+            f'INFO:{LOGGER}:recipes_recipe: deleted {deleted} of 5'
+            for deleted in (2, 4, 5)
+        ])
+
+    @skipUnless(connection.vendor != 'postgresql', 'БД без TRUNCATE')
+    def test_fast_falls_back_to_chunks(self, _):
+        with self.assertLogs(LOGGER) as logs:
+            call_command('clear_table', 'tablename', 'recipes_recipe',
+                         fast=True)
+        self.assert_recipes_cleared()
+        self.assertIn('WARNING', logs.output[0])
+        self.assertIn(
+            f'INFO:{LOGGER}:recipes_recipe: deleted 5 of 5', logs.output)
+
+    @skipUnless(connection.vendor == 'postgresql', 'TRUNCATE на PostgreSQL')
+    def test_fast_truncates(self, _):
+        with self.assertLogs(LOGGER) as logs:
+            call_command('clear_table', 'tablename', 'recipes_recipe',
+                         fast=True)
+        self.assert_recipes_cleared()
+        self.assertIn('truncated', logs.output[-1])
+
+    def test_all_tables(self, _):
+        call_command('clear_table', 'tablename', 'all', chunk_size=2)
+        for model in (models.Recipe, models.Ingredient, models.Unit,
+                      models.Tag, models.Favorite):
+            with self.subTest(model=model.__name__):
+                self.assertFalse(model.objects.exists())
+        self.assertTrue(CustomUser.objects.exists())
+
+    def test_unknown_table(self, _):
+        with self.assertRaises(CommandError):
+            call_command('clear_table', 'tablename', 'users_customuser')
+        self.assertEqual(models.Recipe.objects.count(), 5)
@@ -0,0 +1,76 @@
+import os
+import warnings
+
+from django.core.cache import CacheKeyWarning
+from django.test import override_settings
+from recipes import models
+from users.models import CustomUser
+
+from .base import APITestCase
+
+
+class ConditionalGetTest(APITestCase):
+    """
+    ETag рецептов и /api/users/me/ с общим кэшем: повторный запрос
+    получает 304, запись меняет ETag.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='viewer', email='viewer@foodgram.ru',
+            first_name='Viewer', last_name='Viewer')
+        cls.recipe = models.Recipe.objects.create(
+            name='Рецепт', text='Описание', cooking_time=5, author=cls.user)
+
+    def setUp(self):
+        # Кэш в файлах считается общим для процессов, как memcached.
+        shared_cache = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(self.files_dir.name, 'cache'),
+        }})
+        shared_cache.enable()
+        self.addCleanup(shared_cache.disable)
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def assert_not_modified(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        repeated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeated.status_code, 304)
+        return response['ETag']
+
+    def assert_changed(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_recipe_list(self):
+        url = '/api/recipes/'
+        etag = self.assert_not_modified(url)
+        self.recipe.name = 'Новое название'
+        self.recipe.save()
+        self.assert_changed(url, etag)
+
+    def test_recipe_detail(self):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        etag = self.assert_not_modified(url)
+        response = self.client.post(f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assert_changed(url, etag)
+
+    def test_users_me(self):
+        url = '/api/users/me/'
+        etag = self.assert_not_modified(url)
+        self.user.first_name = 'Другое имя'
+        self.user.save()
+        self.assert_changed(url, etag)
+
+    def test_recipe_id_is_not_a_cache_key(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            for pk in ('abc', '1' * 300, str(2 ** 31)):
+                with self.subTest(pk=pk[:10]):
+                    response = self.client.get(f'/api/recipes/{pk}/')
+                    self.assertEqual(response.status_code, 404)
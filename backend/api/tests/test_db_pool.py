@@ -0,0 +1,126 @@
+import itertools
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+from foodgram.db import pool
+from foodgram.db.sqlite3.base import DatabaseWrapper
+
+aliases = (f'pool_test_{index}' for index in itertools.count())
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    """
+    Пул обертки foodgram.db.sqlite3 на отдельном файле SQLite. Каждая
+    обертка - соединение одного потока, как connections[alias]
+    в потоке gunicorn.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.alias = next(aliases)
+        self.settings_dict = {
+            'ENGINE': 'foodgram.db.sqlite3',
+            'NAME': os.path.join(directory.name, 'pool.sqlite3'),
+            'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '',
+            'OPTIONS': {}, 'TIME_ZONE': None, 'AUTOCOMMIT': True,
+            'ATOMIC_REQUESTS': False, 'CONN_MAX_AGE': 0,
+            'CONN_HEALTH_CHECKS': True,
+            'POOL_SIZE': 1, 'POOL_TIMEOUT': 0.1,
+        }
+        self.addCleanup(self.close_pool)
+
+    def close_pool(self):
+        idle = pool._pools.pop(self.alias).idle
+        for pooled in idle:
+            pooled.connection.close()
+
+    def get_wrapper(self):
+        return DatabaseWrapper(self.settings_dict, self.alias)
+
+    def end_request(self, wrapper):
+        """То, что Django делает по сигналу request_finished."""
+        wrapper.close_if_unusable_or_obsolete()
+        self.assertIsNone(wrapper.connection)
+
+    def test_connection_returns_to_pool(self):
+        first = self.get_wrapper()
+        first.ensure_connection()
+        connection = first.connection
+        self.end_request(first)
+
+        second = self.get_wrapper()
+        second.ensure_connection()
+        self.assertIs(second.connection, connection)
+        self.end_request(second)
+        stats = pool.get_pool_stats()[self.alias]
+        self.assertEqual(
+            (stats['opened'], stats['idle'], stats['created'],
+             stats['reused']),
+            (1, 1, 1, 1))
+
+    def test_uncommitted_changes_are_rolled_back(self):
+        first = self.get_wrapper()
+        with first.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id integer)')
+        first.set_autocommit(False)
+        with first.cursor() as cursor:
+            cursor.execute('INSERT INTO item VALUES (1)')
+        first.close()
+
+        second = self.get_wrapper()
+        with second.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM item')
+            self.assertEqual(cursor.fetchone(), (0, ))
+        self.end_request(second)
+
+    def test_timeout_when_pool_is_busy(self):
+        first = self.get_wrapper()
+        first.ensure_connection()
+        with self.assertRaises(pool.PoolTimeoutError):
+            self.get_wrapper().ensure_connection()
+        self.assertEqual(pool.get_pool_stats()[self.alias]['timeouts'], 1)
+        self.end_request(first)
+
+    def test_waiting_thread_gets_released_connection(self):
+        self.settings_dict['POOL_TIMEOUT'] = 10
+        first = self.get_wrapper()
+        first.ensure_connection()
+        connection = first.connection
+        acquired = []
+
+        def request():
+            second = self.get_wrapper()
+            second.ensure_connection()
+            acquired.append(second.connection)
+            self.end_request(second)
+
+        thread = threading.Thread(target=request)
+        thread.start()
+        self.end_request(first)
+        thread.join()
+        self.assertEqual(acquired, [connection])
+        self.assertEqual(pool.get_pool_stats()[self.alias]['created'], 1)
+
+    @mock.patch('foodgram.db.wrapper.HEALTH_CHECK_IDLE', 0)
+    def test_broken_connection_is_replaced(self):
+        first = self.get_wrapper()
+        first.ensure_connection()
+        connection = first.connection
+        self.end_request(first)
+        # Соединение закрыто, пока лежало в пуле.
+        connection.close()
+
+        second = self.get_wrapper()
+        with second.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            self.assertEqual(cursor.fetchone(), (1, ))
+        self.assertIsNot(second.connection, connection)
+        self.end_request(second)
+        stats = pool.get_pool_stats()[self.alias]
+        self.assertEqual(
+            (stats['opened'], stats['created'], stats['discarded']),
+            (1, 2, 1))
@@ -0,0 +1,119 @@
+import os
+import shutil
+import time
+from unittest import mock
+
+from api import authentication, db_router
+from api.v1.views import RecipeViewSet
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from users.models import CustomUser
+
+from .base import APITestCase
+
+REPLICA = 'replica1'
+
+
+@override_settings(
+    DATABASE_REPLICAS=[REPLICA], DB_REPLICA_STICKY_SECONDS=5,
+    SIGNED_TOKEN_AUTH=True, SIGNED_TOKEN_KEY='router-test-key')
+class ReplicaStickinessTest(APITestCase):
+    """
+    Чтение идет с реплики, пока пользователь ничего не записал;
+    после записи он DB_REPLICA_STICKY_SECONDS секунд читает с default.
+    Реплики в тестах нет, поэтому проверяется только выбор алиаса.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            CustomUser.objects.create_user(
+                username=f'user{index}', email=f'user{index}@foodgram.ru',
+                first_name='User', last_name='User')
+            for index in range(2)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        # Файлы отметок записи общие для тестов класса.
+        shutil.rmtree(os.path.join(settings.VERSION_STAMP_DIR, 'primary'),
+                      ignore_errors=True)
+        self.tokens = [authentication.issue_token(user) for user in self.users]
+
+    def route(self, method, token=None, view=RecipeViewSet):
+        """Алиас, выбранный ReadReplicaMiddleware для представления."""
+        headers = {}
+        if token is not None:
+            headers['HTTP_AUTHORIZATION'] = f'Token {token}'
+        request = RequestFactory().generic(method, '/api/recipes/', **headers)
+        view_func = view.as_view({'get': 'list', 'post': 'create'})
+        aliases = []
+
+        def get_response(request):
+            middleware.process_view(request, view_func, (), {})
+            aliases.append(db_router.get_current_alias())
+            return HttpResponse()
+
+        middleware = db_router.ReadReplicaMiddleware(get_response)
+        middleware(request)
+        self.assertIsNone(db_router.get_current_alias())
+        return aliases[0]
+
+    def test_reads_from_replica(self):
+        self.assertEqual(self.route('GET'), REPLICA)
+        self.assertEqual(self.route('GET', self.tokens[0]), REPLICA)
+        self.assertEqual(self.route('HEAD', self.tokens[0]), REPLICA)
+
+    def test_writes_go_to_default(self):
+        self.assertIsNone(self.route('POST', self.tokens[0]))
+
+    def test_other_views_read_from_default(self):
+        class View(RecipeViewSet):
+            pass
+
+        View.__module__ = 'api.tests'
+        self.assertIsNone(self.route('GET', view=View))
+
+    def test_sticky_after_write(self):
+        self.route('POST', self.tokens[0])
+        self.assertIsNone(self.route('GET', self.tokens[0]))
+        # Новый токен того же пользователя тоже читает с default.
+        token = authentication.issue_token(self.users[0])
+        self.assertIsNone(self.route('GET', token))
+        self.assertEqual(self.route('GET', self.tokens[1]), REPLICA)
+        self.assertEqual(self.route('GET'), REPLICA)
+
+    def test_stickiness_expires(self):
+        self.route('POST', self.tokens[0])
+        path = db_router.get_sticky_path(self.users[0].pk)
+        self.assertTrue(os.path.exists(path))
+        with mock.patch('time.time', return_value=time.time() + 6):
+            self.assertEqual(self.route('GET', self.tokens[0]), REPLICA)
+        self.assertFalse(os.path.exists(path))
+
+    def test_login_sticks_to_primary(self):
+        with mock.patch.object(CustomUser, 'check_password',
+                               return_value=True):
+            response = self.client.post('/api/auth/token/login/', {
+                'email': self.users[1].email, 'password': 'password',
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(db_router.is_sticky(self.users[1].pk))
+        self.assertFalse(db_router.is_sticky(self.users[0].pk))
+
+    def test_shared_cache(self):
+        shared_cache = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(self.files_dir.name, 'cache'),
+        }})
+        shared_cache.enable()
+        self.addCleanup(shared_cache.disable)
+        cache.clear()
+        self.route('POST', self.tokens[0])
+        self.assertTrue(cache.get(db_router.get_sticky_key(self.users[0].pk)))
+        self.assertFalse(os.path.exists(
+            db_router.get_sticky_path(self.users[0].pk)))
+        self.assertIsNone(self.route('GET', self.tokens[0]))
+        self.assertEqual(self.route('GET', self.tokens[1]), REPLICA)
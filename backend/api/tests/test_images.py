@@ -0,0 +1,92 @@
+import io
+import os
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from PIL import Image
+from recipes import images, models
+from users.models import CustomUser
+
+from .base import APITransactionTestCase
+
+
+def make_jpeg(size=(2000, 1000)):
+    """JPEG с EXIF: поворот на 90° и имя камеры."""
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif[0x010F] = 'camera'
+    image = io.BytesIO()
+    Image.new('RGB', size, 'red').save(image, 'JPEG', exif=exif.tobytes())
+    return image.getvalue()
+
+
+class ImageVariantsTest(APITransactionTestCase):
+    """
+    Варианты строятся после коммита; пока их нет, image_variants
+    рецепта равно None.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(
+            username='author', email='author@foodgram.ru',
+            first_name='Author', last_name='Author')
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self, content, name='photo.jpg'):
+        return models.Recipe.objects.create(
+            name='Рецепт', text='Описание', cooking_time=5, author=self.user,
+            image=ContentFile(content, name=name))
+
+    def get_variants(self, recipe):
+        response = self.client.get(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['image_variants']
+
+    def open_variant(self, url):
+        prefix = 'http://testserver' + settings.MEDIA_URL
+        self.assertTrue(url.startswith(prefix))
+        path = url[len(prefix):]
+        return Image.open(os.path.join(settings.MEDIA_ROOT, path))
+
+    @override_settings(IMAGE_VARIANT_WORKERS=0)
+    def test_variants(self):
+        recipe = self.create_recipe(make_jpeg())
+        variants = self.get_variants(recipe)
+        self.assertEqual(set(variants), set(images.VARIANTS))
+        for variant, size in images.VARIANTS.items():
+            self.assertEqual(set(variants[variant]), set(images.FORMATS))
+            for image_format, url in variants[variant].items():
+                with self.subTest(variant=variant, format=image_format):
+                    with self.open_variant(url) as image:
+                        self.assertEqual(image.format, image_format.upper())
+                        # Поворот из EXIF применен: изображение стоит.
+                        self.assertEqual(image.size, (size // 2, size))
+                        self.assertFalse(image.getexif())
+
+    @override_settings(IMAGE_VARIANT_WORKERS=0)
+    def test_broken_image(self):
+        with self.assertLogs('recipes.images', 'ERROR'):
+            recipe = self.create_recipe(b'not an image', name='broken.png')
+        self.assertIsNone(self.get_variants(recipe))
+
+    @override_settings(IMAGE_VARIANT_WORKERS=1)
+    def test_worker_invalidates_cached_recipe(self):
+        images._executor = None
+        self.addCleanup(setattr, images, '_executor', None)
+        self.addCleanup(lambda: images.get_executor().shutdown(wait=True))
+        # Единственный поток пула занят, пока рецепт не закэширован.
+        busy = threading.Event()
+        images.get_executor().submit(busy.wait)
+
+        recipe = self.create_recipe(make_jpeg((400, 300)))
+        self.assertIsNone(self.get_variants(recipe))
+        busy.set()
+        images.get_executor().submit(lambda: None).result()
+        variants = self.get_variants(recipe)
+        self.assertIsNotNone(variants)
+        with self.open_variant(variants['card']['webp']) as image:
+            # Уменьшаются только большие изображения.
+            self.assertEqual(image.size, (300, 400))
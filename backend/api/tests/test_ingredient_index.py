@@ -0,0 +1,58 @@
+from django.db import transaction
+from recipes import ingredient_index, models
+
+from .base import APITestCase, APITransactionTestCase
+
+
+class IngredientIndexVersionTest(APITransactionTestCase):
+    """Штамп индекса меняется и после коммита (now_and_on_commit)."""
+
+    def setUp(self):
+        super().setUp()
+        self.unit = models.Unit.objects.create(name='г')
+
+    def assert_bumped_on_commit(self, change):
+        with transaction.atomic():
+            change()
+            stamp = ingredient_index.get_version()
+        self.assertNotEqual(ingredient_index.get_version(), stamp)
+
+    def test_ingredient_change(self):
+        self.assert_bumped_on_commit(
+            lambda: models.Ingredient.objects.create(
+                name='шафран', measurement_unit=self.unit))
+        response = self.client.get('/api/ingredients/?name=шаф')
+        self.assertEqual(
+            [item['name'] for item in response.json()], ['шафран'])
+
+    def test_unit_change(self):
+        models.Ingredient.objects.create(
+            name='шафран', measurement_unit=self.unit)
+        self.unit.name = 'кг'
+        self.assert_bumped_on_commit(self.unit.save)
+        response = self.client.get('/api/ingredients/?name=шаф')
+        self.assertEqual(
+            [item['measurement_unit'] for item in response.json()], ['кг'])
+
+
+class IngredientSearchTest(APITestCase):
+    def setUp(self):
+        super().setUp()
+        unit = models.Unit.objects.create(name='г')
+        models.Ingredient.objects.create(name='солод', measurement_unit=unit)
+        models.Ingredient.objects.create(
+            name='соль', measurement_unit=models.Unit.objects.create(
+                name='по вкусу'))
+        models.Ingredient.objects.create(
+            name='фасоль', measurement_unit=unit)
+
+    def search(self, query):
+        response = self.client.get(f'/api/ingredients/?name={query}')
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()]
+
+    def test_ranked_by_name_length_not_unit(self):
+        self.assertEqual(self.search('сол'), ['соль', 'солод'])
+
+    def test_substring_when_no_prefix_matches(self):
+        self.assertEqual(self.search('асол'), ['фасоль'])
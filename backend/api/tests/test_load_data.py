@@ -0,0 +1,49 @@
+import json
+import os
+from unittest import mock
+
+from django.core.management import call_command
+from recipes import ingredient_index, models
+
+from .base import APITransactionTestCase
+
+INGREDIENTS = [
+    {'name': 'соль', 'measurement_unit': 'г'},
+    {'name': 'соль', 'measurement_unit': 'по вкусу'},
+    {'name': 'соль', 'measurement_unit': 'г'},
+    {'name': 'вода', 'measurement_unit': ''},
+    {'name': 'вода', 'measurement_unit': ''},
+]
+
+
+# Лог команды пишется в файл рядом с ней, в тестах он не нужен.
+@mock.patch('recipes.management.commands.load_data.initialize_logger')
+class LoadDataTest(APITransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.json_path = os.path.join(self.files_dir.name, 'ingredients.json')
+        with open(self.json_path, 'w', encoding='utf-8') as file:
+            json.dump(INGREDIENTS, file, ensure_ascii=False)
+        self.csv_path = os.path.join(self.files_dir.name, 'ingredients.csv')
+        with open(self.csv_path, 'w', encoding='utf-8') as file:
+            file.write('name,measurement_unit\nсоль,г\nсахар,г\nвода,\n')
+
+    def load(self, *paths):
+        call_command('load_data', *paths, batch_size=2)
+        return set(models.Ingredient.objects.values_list(
+            'name', 'measurement_unit__name'))
+
+    def test_second_run_inserts_nothing(self, _):
+        expected = {('соль', 'г'), ('соль', 'по вкусу'), ('вода', None)}
+        self.assertEqual(self.load(self.json_path), expected)
+        stamp = ingredient_index.get_version()
+        self.assertEqual(self.load(self.json_path), expected)
+        self.assertEqual(models.Ingredient.objects.count(), len(expected))
+        self.assertEqual(ingredient_index.get_version(), stamp)
+
+    def test_existing_rows_are_skipped(self, _):
+        self.load(self.json_path)
+        self.assertEqual(
+            self.load(self.csv_path),
+            {('соль', 'г'), ('соль', 'по вкусу'), ('вода', None),
+             ('сахар', 'г')})
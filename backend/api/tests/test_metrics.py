@@ -0,0 +1,47 @@
+import json
+
+from recipes import models
+from rest_framework import serializers
+from users.models import CustomUser
+
+from .base import APITestCase
+
+
+class SerializerTimeTest(APITestCase):
+    """Время сериализации считают представления API, а не классы DRF."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create_user(
+            username='author', email='author@foodgram.ru',
+            first_name='Author', last_name='Author')
+        for index in range(3):
+            models.Recipe.objects.create(
+                name=f'рецепт {index}', text='Описание', cooking_time=5,
+                author=author)
+
+    def get_metrics(self, url, **headers):
+        with self.assertLogs('api.metrics', 'INFO') as logs:
+            response = self.client.get(url, **headers)
+        self.assertEqual(len(logs.records), 1)
+        return response, json.loads(logs.records[0].getMessage())
+
+    def test_serializer_time_is_reported(self):
+        response, metrics = self.get_metrics('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(metrics['serializer_ms'], 0)
+        self.assertLessEqual(metrics['serializer_ms'], metrics['total_ms'])
+
+    def test_not_modified_has_no_serializer_time(self):
+        response = self.client.get('/api/tags/')
+        response, metrics = self.get_metrics(
+            '/api/tags/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(metrics['serializer_ms'], 0)
+
+    def test_drf_serializers_are_not_patched(self):
+        for serializer_class in (serializers.Serializer,
+                                 serializers.ListSerializer):
+            self.assertEqual(
+                serializer_class.__dict__['data'].fget.__module__,
+                'rest_framework.serializers')
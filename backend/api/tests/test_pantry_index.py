@@ -0,0 +1,52 @@
+import threading
+
+from django.test import override_settings
+from recipes import models, pantry_index
+from users.models import CustomUser
+
+from .base import APITransactionTestCase
+
+
+@override_settings(PANTRY_INDEX_BACKGROUND_REBUILD=True)
+class PantryIndexRebuildTest(APITransactionTestCase):
+    """Пока индекс строится в фоне, отдается прежний."""
+
+    def setUp(self):
+        super().setUp()
+        unit = models.Unit.objects.create(name='г')
+        self.salt = models.Ingredient.objects.create(
+            name='соль', measurement_unit=unit)
+        self.author = CustomUser.objects.create_user(
+            username='author', email='author@foodgram.ru',
+            first_name='Author', last_name='Author')
+
+    def add_recipe(self, name):
+        recipe = models.Recipe.objects.create(
+            name=name, text='Описание', cooking_time=10, author=self.author)
+        models.IngredientRecipe.objects.create(
+            recipe=recipe, ingredient=self.salt, amount=1)
+        return recipe
+
+    def wait_for_rebuild(self):
+        for thread in threading.enumerate():
+            if thread.name == 'pantry-index':
+                thread.join()
+
+    def get_ranking(self):
+        response = self.client.get(
+            f'/api/recipes/pantry/?ingredients={self.salt.id}')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_stale_index_is_served_while_rebuilding(self):
+        first = self.add_recipe('первый')
+        self.assertEqual(self.get_ranking(), [first.id])
+        stale = pantry_index.get_pantry_index()
+
+        second = self.add_recipe('второй')
+        self.assertIs(pantry_index.get_pantry_index(), stale)
+        self.wait_for_rebuild()
+
+        index = pantry_index.get_pantry_index()
+        self.assertEqual(index.stamp, pantry_index.get_version())
+        self.assertEqual(self.get_ranking(), [second.id, first.id])
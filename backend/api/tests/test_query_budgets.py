@@ -0,0 +1,205 @@
+import io
+
+from api import authentication
+from api.query_budgets import QUERY_BUDGETS, UNCHECKED_ROUTES
+from api.v1.urls import v1_router
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from recipes import models
+from users.models import CustomUser
+
+from .base import APITransactionTestCase
+
+PAGE_SIZE = 6
+PASSWORD = 'Foodgram-budget-1'
+
+
+@override_settings(SIGNED_TOKEN_AUTH=True,
+                   SIGNED_TOKEN_KEY='query-budgets-test-key')
+class QueryBudgetsTest(APITransactionTestCase):
+    """
+    Число SQL-запросов маршрутов api/v1/urls.py не больше бюджетов
+    api/query_budgets.py. Каждый маршрут проверяется на холодном кэше
+    рецептов и прогретом кэше пользователей, как у работающего сервера.
+    """
+
+    def setUp(self):
+        super().setUp()
+        unit = models.Unit.objects.create(name='г')
+        self.ingredients = [
+            models.Ingredient.objects.create(
+                name=f'ингредиент {index}', measurement_unit=unit)
+            for index in range(PAGE_SIZE * 2)
+        ]
+        self.tags = [
+            models.Tag.objects.create(
+                name=f'tag {index}', color='#E26C2D', slug=f'tag{index}')
+            for index in range(3)
+        ]
+        self.user = CustomUser.objects.create_user(
+            username='viewer', email='viewer@foodgram.ru', password=PASSWORD,
+            first_name='Viewer', last_name='Viewer')
+        self.authors = [
+            CustomUser.objects.create_user(
+                username=f'author{index}', email=f'author{index}@foodgram.ru',
+                password=PASSWORD, first_name='Author', last_name='Author')
+            for index in range(PAGE_SIZE)
+        ]
+        self.recipes = []
+        for index in range(PAGE_SIZE * 2):
+            recipe = models.Recipe.objects.create(
+                name=f'рецепт {index}', text='Описание', cooking_time=10,
+                author=self.authors[index % PAGE_SIZE])
+            recipe.tags.set(self.tags)
+            models.IngredientRecipe.objects.bulk_create(
+                models.IngredientRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=index + 1)
+                for ingredient in self.ingredients[:4]
+            )
+            self.recipes.append(recipe)
+        for recipe in self.recipes[:PAGE_SIZE]:
+            models.Favorite.objects.create(user=self.user, recipe=recipe)
+            models.ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        for author in self.authors[1:]:
+            models.Subscription.objects.create(
+                user=self.user, following=author)
+        image = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(image, 'PNG')
+        self.image = image.getvalue()
+        self.login()
+
+    def login(self):
+        key = authentication.issue_token(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+
+    def warm_up(self):
+        """Прогреть кэш процесса пользователей и отозванных токенов."""
+        authentication.get_user(self.user.pk)
+        authentication.is_revoked(None)
+
+    def get_cases(self):
+        """(маршрут, метод, url, данные); порядок важен: запросы пишут."""
+        recipe = self.recipes[-1]
+        author = self.authors[0]
+        recipe_data = {
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 5,
+            'tags': [tag.id for tag in self.tags[:2]],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in self.ingredients[:PAGE_SIZE]
+            ],
+        }
+        return (
+            ('tag-list', 'GET', '/api/tags/', None),
+            ('tag-detail', 'GET', f'/api/tags/{self.tags[0].id}/', None),
+            ('ingredient-list', 'GET', '/api/ingredients/?name=инг', None),
+            ('ingredient-detail', 'GET',
+             f'/api/ingredients/{self.ingredients[0].id}/', None),
+            ('customuser-list', 'GET', f'/api/users/?limit={PAGE_SIZE}',
+             None),
+            ('customuser-list', 'POST', '/api/users/', {
+                'email': 'new@foodgram.ru', 'username': 'new',
+                'first_name': 'New', 'last_name': 'New',
+                'password': PASSWORD,
+            }),
+            ('customuser-detail', 'GET', f'/api/users/{author.id}/', None),
+            ('customuser-me', 'GET', '/api/users/me/', None),
+            ('customuser-subscriptions', 'GET',
+             f'/api/users/subscriptions/?limit={PAGE_SIZE}&recipes_limit=3',
+             None),
+            ('recipes-list', 'GET',
+             f'/api/recipes/?limit={PAGE_SIZE}&tags={self.tags[0].slug}'
+             f'&tags={self.tags[1].slug}&facets=true', None),
+            ('recipes-detail', 'GET', f'/api/recipes/{recipe.id}/', None),
+            ('recipes-list', 'POST', '/api/recipes/', recipe_data),
+            ('recipes-detail', 'PATCH', '/api/recipes/{created}/',
+             dict(recipe_data, name='Измененный рецепт',
+                  tags=[tag.id for tag in self.tags[1:]],
+                  ingredients=[
+                      {'id': ingredient.id, 'amount': 20}
+                      for ingredient in self.ingredients[2:PAGE_SIZE + 2]
+                  ])),
+            ('recipes-download-shopping-cart', 'GET',
+             '/api/recipes/download_shopping_cart/', None),
+            ('recipes-pantry', 'GET',
+             f'/api/recipes/pantry/?limit={PAGE_SIZE}' + ''.join(
+                 f'&ingredients={ingredient.id}'
+                 for ingredient in self.ingredients[:3]), None),
+            ('favorite-list', 'POST', f'/api/recipes/{recipe.id}/favorite/',
+             None),
+            ('favorite-list', 'DELETE',
+             f'/api/recipes/{recipe.id}/favorite/', None),
+            ('shopping_cart-list', 'POST',
+             f'/api/recipes/{recipe.id}/shopping_cart/', None),
+            ('shopping_cart-list', 'DELETE',
+             f'/api/recipes/{recipe.id}/shopping_cart/', None),
+            ('subscribe-list', 'POST', f'/api/users/{author.id}/subscribe/',
+             None),
+            ('subscribe-list', 'DELETE',
+             f'/api/users/{author.id}/subscribe/', None),
+            ('customuser-set-password', 'POST', '/api/users/set_password/', {
+                'current_password': PASSWORD, 'new_password': PASSWORD,
+            }),
+            ('recipes-detail', 'DELETE', '/api/recipes/{created}/', None),
+            ('uploads-list', 'POST', '/api/uploads/', {
+                'filename': 'image.png', 'size': len(self.image),
+            }),
+            ('uploads-detail', 'PATCH', '/api/uploads/{upload}/', self.image),
+            ('uploads-detail', 'GET', '/api/uploads/{upload}/', None),
+            ('uploads-detail', 'DELETE', '/api/uploads/{upload}/', None),
+            ('token-login', 'POST', '/api/auth/token/login/', {
+                'email': self.user.email, 'password': PASSWORD,
+            }),
+            ('token-logout', 'POST', '/api/auth/token/logout/', None),
+        )
+
+    def request(self, method, url, data):
+        """Ответ и число запросов, включая чтение потокового ответа."""
+        with CaptureQueriesContext(connection) as queries:
+            if method == 'GET':
+                response = self.client.get(url)
+            elif isinstance(data, bytes):
+                response = self.client.generic(
+                    method, url, data,
+                    content_type='application/offset+octet-stream',
+                    HTTP_UPLOAD_OFFSET='0')
+            else:
+                response = getattr(self.client, method.lower())(
+                    url, data, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+        return response, len(queries)
+
+    def test_every_route_is_checked(self):
+        checked = {route for route, _, _, _ in self.get_cases()}
+        routes = {url.name for url in v1_router.urls}
+        self.assertEqual(routes - checked - UNCHECKED_ROUTES, set())
+        self.assertEqual(
+            {key[0] for key in QUERY_BUDGETS} - routes, set(),
+            'бюджеты для несуществующих маршрутов')
+
+    def test_query_budgets(self):
+        created = upload = None
+        for route, method, url, data in self.get_cases():
+            cache.clear()
+            self.warm_up()
+            url = url.format(created=created, upload=upload)
+            response, count = self.request(method, url, data)
+            self.assertLess(response.status_code, 400, f'{method} {url}')
+            with self.subTest(route=route, method=method):
+                budget = QUERY_BUDGETS.get((route, method))
+                self.assertIsNotNone(budget, 'нет бюджета')
+                self.assertLessEqual(count, budget)
+            if route == 'recipes-list' and method == 'POST':
+                created = response.data['id']
+            if route == 'uploads-list':
+                upload = response.data['token']
+            if route == 'customuser-set-password':
+                # Смена пароля отзывает выданные токены.
+                self.user.refresh_from_db()
+                self.login()
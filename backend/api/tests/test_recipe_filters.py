@@ -0,0 +1,153 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from recipes import models
+from users.models import CustomUser
+
+from .base import APITestCase
+
+
+class RecipeTagFilterTest(APITestCase):
+    """Отбор по тегам и фасеты по индексу тегов и подзапросами."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.other = [
+            CustomUser.objects.create_user(
+                username=name, email=f'{name}@foodgram.ru',
+                first_name='Author', last_name='Author')
+            for name in ('author', 'other')
+        ]
+        cls.breakfast, cls.dinner, cls.vegan = [
+            models.Tag.objects.create(name=slug, color='#E26C2D', slug=slug)
+            for slug in ('breakfast', 'dinner', 'vegan')
+        ]
+        cls.recipes = {}
+        for name, author, tags in (
+            ('завтрак', cls.author, [cls.breakfast]),
+            ('ужин', cls.author, [cls.dinner]),
+            ('каша', cls.other, [cls.breakfast, cls.dinner]),
+            ('салат', cls.other, [cls.vegan]),
+        ):
+            recipe = models.Recipe.objects.create(
+                name=name, text='Описание', cooking_time=5, author=author)
+            recipe.tags.set(tags)
+            cls.recipes[name] = recipe
+
+    def get(self, query):
+        response = self.client.get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def names(self, query):
+        return sorted(item['name'] for item in self.get(query)['results'])
+
+    def test_tags_match_all(self):
+        self.assertEqual(
+            self.names('tags=breakfast&tags=dinner'), ['каша'])
+        self.assertEqual(
+            self.names(f'tags=breakfast&author={self.author.pk}'),
+            ['завтрак'])
+
+    def test_tags_any_match_one(self):
+        self.assertEqual(
+            self.names('tags_any=breakfast&tags_any=dinner'),
+            ['завтрак', 'каша', 'ужин'])
+        self.assertEqual(
+            self.names(f'tags_any=dinner&tags_any=vegan'
+                       f'&author={self.other.pk}'),
+            ['каша', 'салат'])
+
+    def test_facets_from_tag_index(self):
+        self.assertEqual(self.get('facets=true')['facets'], {'tags': {
+            'breakfast': 2, 'dinner': 2, 'vegan': 1}})
+        self.assertEqual(
+            self.get('facets=true&tags=breakfast')['facets'], {'tags': {
+                'breakfast': 2, 'dinner': 1, 'vegan': 0}})
+
+    def test_facets_with_other_filters(self):
+        self.assertEqual(
+            self.get(f'facets=true&author={self.other.pk}')['facets'],
+            {'tags': {'breakfast': 1, 'dinner': 1, 'vegan': 1}})
+        self.assertEqual(
+            self.get(f'facets=true&tags_any=breakfast'
+                     f'&author={self.author.pk}')['facets'],
+            {'tags': {'breakfast': 1, 'dinner': 0, 'vegan': 0}})
+
+    def test_index_follows_tag_changes(self):
+        self.assertEqual(self.names('tags=vegan'), ['салат'])
+        self.recipes['каша'].tags.add(self.vegan)
+        self.assertEqual(self.names('tags=vegan'), ['каша', 'салат'])
+        models.TagRecipe.objects.filter(
+            recipe=self.recipes['салат'], tag=self.vegan).delete()
+        self.assertEqual(self.names('tags=vegan'), ['каша'])
+        self.assertEqual(
+            self.get('facets=true')['facets']['tags']['vegan'], 1)
+
+
+class RecipeUserRelationFilterTest(APITestCase):
+    """is_favorited и is_in_shopping_cart: EXISTS без дублей и DISTINCT."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer, *others = [
+            CustomUser.objects.create_user(
+                username=name, email=f'{name}@foodgram.ru',
+                first_name='User', last_name='User')
+            for name in ('viewer', 'first', 'second')
+        ]
+        cls.recipes = [
+            models.Recipe.objects.create(
+                name=f'рецепт {index}', text='Описание', cooking_time=5,
+                author=others[0])
+            for index in range(4)
+        ]
+        # Отметки других пользователей не должны размножать строки.
+        for user in others:
+            for recipe in cls.recipes:
+                models.Favorite.objects.create(user=user, recipe=recipe)
+                models.ShoppingCart.objects.create(user=user, recipe=recipe)
+        models.Favorite.objects.create(user=cls.viewer, recipe=cls.recipes[0])
+        models.Favorite.objects.create(user=cls.viewer, recipe=cls.recipes[1])
+        models.ShoppingCart.objects.create(
+            user=cls.viewer, recipe=cls.recipes[2])
+
+    def ids(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200)
+        for sql in (query['sql'] for query in queries):
+            self.assertNotIn('DISTINCT', sql.upper())
+        ids = [item['id'] for item in response.data['results']]
+        self.assertEqual(response.data['count'], len(ids))
+        return sorted(ids)
+
+    def recipe_ids(self, *indexes):
+        return sorted(self.recipes[index].id for index in indexes)
+
+    def test_is_favorited(self):
+        self.client.force_authenticate(self.viewer)
+        self.assertEqual(self.ids('is_favorited=1'), self.recipe_ids(0, 1))
+        self.assertEqual(self.ids('is_favorited=0'), self.recipe_ids(2, 3))
+
+    def test_is_in_shopping_cart(self):
+        self.client.force_authenticate(self.viewer)
+        self.assertEqual(
+            self.ids('is_in_shopping_cart=1'), self.recipe_ids(2))
+        self.assertEqual(
+            self.ids('is_in_shopping_cart=0'), self.recipe_ids(0, 1, 3))
+
+    def test_combined(self):
+        self.client.force_authenticate(self.viewer)
+        self.assertEqual(
+            self.ids('is_favorited=1&is_in_shopping_cart=0'),
+            self.recipe_ids(0, 1))
+        self.assertEqual(
+            self.ids('is_favorited=0&is_in_shopping_cart=0'),
+            self.recipe_ids(3))
+
+    def test_anonymous(self):
+        for name in ('is_favorited', 'is_in_shopping_cart'):
+            with self.subTest(name=name):
+                self.assertEqual(self.ids(f'{name}=1'), [])
+                self.assertEqual(
+                    self.ids(f'{name}=0'), self.recipe_ids(0, 1, 2, 3))
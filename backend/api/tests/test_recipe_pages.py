@@ -0,0 +1,86 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from recipes import models
+from users.models import CustomUser
+
+from .base import APITestCase
+
+RECIPES = 60
+AUTHORS = 10
+
+
+class RecipePageQueriesTest(APITestCase):
+    """Число запросов страницы рецептов не зависит от ее размера."""
+
+    @classmethod
+    def setUpTestData(cls):
+        unit = models.Unit.objects.create(name='г')
+        ingredients = [
+            models.Ingredient.objects.create(
+                name=f'ингредиент {index}', measurement_unit=unit)
+            for index in range(3)
+        ]
+        tags = [
+            models.Tag.objects.create(
+                name=f'tag {index}', color='#E26C2D', slug=f'tag{index}')
+            for index in range(2)
+        ]
+        cls.viewer = CustomUser.objects.create_user(
+            username='viewer', email='viewer@foodgram.ru',
+            first_name='Viewer', last_name='Viewer')
+        authors = [
+            CustomUser.objects.create_user(
+                username=f'author{index}', email=f'author{index}@foodgram.ru',
+                first_name='Author', last_name='Author')
+            for index in range(AUTHORS)
+        ]
+        for index in range(RECIPES):
+            recipe = models.Recipe.objects.create(
+                name=f'рецепт {index}', text='Описание', cooking_time=10,
+                author=authors[index % AUTHORS])
+            recipe.tags.set(tags)
+            models.IngredientRecipe.objects.bulk_create(
+                models.IngredientRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=index + 1)
+                for ingredient in ingredients
+            )
+            if index % 2:
+                models.Favorite.objects.create(user=cls.viewer, recipe=recipe)
+                models.ShoppingCart.objects.create(
+                    user=cls.viewer, recipe=recipe)
+        for author in authors[::2]:
+            models.Subscription.objects.create(
+                user=cls.viewer, following=author)
+
+    def get_page(self, limit):
+        response = self.client.get(f'/api/recipes/?limit={limit}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+        return response
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for user in (None, self.viewer):
+            with self.subTest(user=user):
+                self.client.force_authenticate(user)
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    self.get_page(1)
+                cache.clear()
+                with self.assertNumQueries(len(queries)):
+                    self.get_page(50)
+
+    def test_cursor_pages_return_every_recipe_once(self):
+        self.client.force_authenticate(self.viewer)
+        url, ids, query_counts = '/api/recipes/?cursor=&limit=25', [], set()
+        while url:
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            query_counts.add(len(queries))
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(ids, sorted(
+            models.Recipe.objects.values_list('id', flat=True)))
+        self.assertEqual(len(query_counts), 1)
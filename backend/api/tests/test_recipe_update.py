@@ -0,0 +1,101 @@
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.test.utils import CaptureQueriesContext
+from recipes import models
+from users.models import CustomUser
+
+from .base import APITestCase
+
+
+class RecipeUpdateQueriesTest(APITestCase):
+    """Число запросов PATCH рецепта не зависит от числа ингредиентов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(
+            username='author', email='author@foodgram.ru',
+            first_name='Author', last_name='Author')
+        unit = models.Unit.objects.create(name='г')
+        cls.ingredients = [
+            models.Ingredient.objects.create(
+                name=f'ингредиент {index}', measurement_unit=unit)
+            for index in range(90)
+        ]
+        cls.tags = [
+            models.Tag.objects.create(
+                name=f'tag {index}', color='#E26C2D', slug=f'tag{index}')
+            for index in range(4)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.author)
+
+    def create_recipe(self, size):
+        recipe = models.Recipe.objects.create(
+            name=f'рецепт {size}', text='Описание', cooking_time=5,
+            author=self.author)
+        recipe.tags.set(self.tags[:2])
+        models.IngredientRecipe.objects.bulk_create(
+            models.IngredientRecipe(
+                recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in self.ingredients[:size]
+        )
+        return recipe
+
+    def update(self, size):
+        """Треть ингредиентов удаляется, треть меняется, треть новые."""
+        recipe = self.create_recipe(size)
+        third = size // 3
+        ingredients = [
+            {'id': ingredient.id, 'amount': 2}
+            for ingredient in self.ingredients[third:size + third]
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(f'/api/recipes/{recipe.pk}/', {
+                'name': 'Новое название',
+                'tags': [tag.id for tag in self.tags[1:]],
+                'ingredients': ingredients,
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            models.IngredientRecipe.objects.filter(recipe=recipe).count(),
+            size)
+        return [query['sql'] for query in queries]
+
+    def test_query_count_does_not_depend_on_recipe_size(self):
+        small = self.update(3)
+        large = self.update(30)
+        self.assertEqual(len(small), len(large), '\n'.join(large))
+
+    def test_rows_are_deleted_without_signals(self):
+        deleted = []
+
+        def receiver(sender, **kwargs):
+            deleted.append(sender)
+
+        for model in (models.IngredientRecipe, models.TagRecipe):
+            post_delete.connect(receiver, sender=model)
+            self.addCleanup(post_delete.disconnect, receiver, sender=model)
+        self.update(30)
+        self.assertEqual(deleted, [])
+
+    def test_update_invalidates_recipe_once_saved(self):
+        recipe = self.create_recipe(3)
+        self.client.get(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(self.names('tags=tag0'), [recipe.name])
+        response = self.client.patch(f'/api/recipes/{recipe.pk}/', {
+            'tags': [self.tags[1].id],
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 5}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        data = self.client.get(f'/api/recipes/{recipe.pk}/').data
+        self.assertEqual(
+            [(item['id'], item['amount']) for item in data['ingredients']],
+            [(self.ingredients[0].id, 5)])
+        self.assertEqual(self.names('tags=tag0'), [])
+
+    def names(self, query):
+        response = self.client.get(f'/api/recipes/?{query}')
+        return [item['name'] for item in response.data['results']]
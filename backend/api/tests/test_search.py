@@ -0,0 +1,87 @@
+import io
+from unittest import skipIf
+
+from django.core.management import call_command
+from django.db import connection
+from recipes import models, search
+from users.models import CustomUser
+
+from .base import APITestCase
+
+URL = '/api/recipes/'
+
+
+@skipIf(connection.vendor == 'postgresql', 'на PostgreSQL ранг ts_rank')
+class RecipeSearchTest(APITestCase):
+    """
+    Поиск на SQLite (индекс RecipeSearchTerm): вес слова в названии
+    больше, чем в ингредиентах, а в ингредиентах - больше, чем в описании.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create_user(
+            username='author', email='author@foodgram.ru',
+            first_name='Author', last_name='Author')
+        grams = models.Unit.objects.create(name='г')
+        beet = models.Ingredient.objects.create(
+            name='Свёкла', measurement_unit=grams)
+        dressing = models.Ingredient.objects.create(
+            name='борщевая заправка', measurement_unit=grams)
+        recipes = {
+            'in_text': ('Обед', 'Подавать как борщ.', []),
+            'in_ingredients': ('Суп', 'Описание', [dressing]),
+            'in_name': ('Борщ', 'Описание', [beet]),
+            'elsewhere': ('Каша', 'Описание', [beet]),
+        }
+        cls.recipes = {}
+        for key, (name, text, ingredients) in recipes.items():
+            recipe = cls.recipes[key] = models.Recipe.objects.create(
+                name=name, text=text, cooking_time=5, author=author)
+            for ingredient in ingredients:
+                models.IngredientRecipe.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=1)
+        call_command('build_search_index', stdout=io.StringIO())
+
+    def search(self, query):
+        response = self.client.get(URL, {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def ids(self, *keys):
+        return [self.recipes[key].pk for key in keys]
+
+    def test_ranking(self):
+        self.assertEqual(
+            self.search('борщ'),
+            self.ids('in_name', 'in_ingredients', 'in_text'))
+        ranks = search.search(models.Recipe.objects.all(), 'борщ').values_list(
+            'search_rank', flat=True)
+        self.assertEqual(list(ranks), [
+            search.WEIGHTS['A'], search.WEIGHTS['B'], search.WEIGHTS['C']])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search('борщ свекла'), self.ids('in_name'))
+        self.assertEqual(self.search('борщ рис'), [])
+
+    def test_case_and_yo_are_ignored(self):
+        self.assertEqual(
+            self.search('СВЕКЛ'), self.ids('in_name', 'elsewhere'))
+
+    def test_ties_keep_recipe_ordering(self):
+        self.assertEqual(
+            self.search('описание'),
+            self.ids('in_name', 'elsewhere', 'in_ingredients'))
+
+    def test_short_words_are_ignored(self):
+        self.assertEqual(self.search('б'), [])
+
+    def test_reindex_recipe(self):
+        recipe = self.recipes['elsewhere']
+        recipe.name = 'Борщ зеленый'
+        recipe.save()
+        search.index_recipes([recipe.pk])
+        self.assertEqual(self.search('каша'), [])
+        self.assertEqual(
+            self.search('борщ'),
+            self.ids('in_name', 'elsewhere', 'in_ingredients', 'in_text'))
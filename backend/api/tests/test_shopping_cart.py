@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from recipes import models
+from users.models import CustomUser
+
+from .base import APITestCase
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+class ShoppingCartDownloadTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='buyer', email='buyer@foodgram.ru',
+            first_name='Buyer', last_name='Buyer')
+        grams = models.Unit.objects.create(name='г')
+        salt = models.Ingredient.objects.create(
+            name='соль', measurement_unit=grams)
+        flour = models.Ingredient.objects.create(
+            name='мука', measurement_unit=grams)
+        for index, amount in enumerate((5, 7)):
+            recipe = models.Recipe.objects.create(
+                name=f'рецепт {index}', text='Описание', cooking_time=5,
+                author=cls.user)
+            models.IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=salt, amount=amount)
+            models.IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=flour, amount=100)
+            models.ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def download(self, query='', **headers):
+        """(ответ, тело); строки выбраны до отдачи тела."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(URL + query, **headers)
+        self.assertEqual(response.status_code, 200)
+        # Проверка корзины и одна агрегация ингредиентов.
+        self.assertEqual(len(queries), 2)
+        with self.assertNumQueries(0):
+            content = b''.join(response.streaming_content)
+        return response, content
+
+    def test_txt_by_default(self):
+        response, content = self.download(HTTP_ACCEPT='application/json')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertIn('shopping_cart.txt', response['Content-Disposition'])
+        self.assertEqual(
+            content.decode(),
+            'Список покупок:\nмука (г) - 200\nсоль (г) - 12')
+
+    def test_csv(self):
+        response, content = self.download('?format=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(list(csv.reader(io.StringIO(content.decode()))), [
+            ['name', 'measurement_unit', 'amount'],
+            ['мука', 'г', '200'],
+            ['соль', 'г', '12'],
+        ])
+
+    def test_json(self):
+        _, content = self.download('?format=json')
+        self.assertEqual(json.loads(content), [
+            {'name': 'мука', 'unit': 'г', 'amount': 200},
+            {'name': 'соль', 'unit': 'г', 'amount': 12},
+        ])
+
+    def test_pdf(self):
+        response, content = self.download('?format=pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(content.startswith(b'%PDF'))
+
+    def test_unknown_format(self):
+        response = self.client.get(URL + '?format=xml')
+        self.assertEqual(response.status_code, 404)
+
+    def test_empty_cart(self):
+        models.ShoppingCart.objects.filter(user=self.user).delete()
+        response = self.client.get(URL)
+        self.assertEqual(response.status_code, 204)
@@ -0,0 +1,95 @@
+import hashlib
+import os
+import stat
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from recipes import models
+from recipes.storage import ContentAddressedStorage
+from users.models import CustomUser
+
+from .base import APITestCase
+
+
+class ContentAddressedStorageTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='author', email='author@foodgram.ru',
+            first_name='Author', last_name='Author')
+
+    def test_name_from_content(self):
+        storage = ContentAddressedStorage()
+        digest = hashlib.sha256(b'content').hexdigest()
+        name = storage.save(
+            'recipes/images/Photo.JPG', ContentFile(b'content'))
+        self.assertEqual(name, os.path.join(
+            'recipes/images', digest[:2], digest[2:4], digest + '.jpg'))
+        with storage.open(name) as file:
+            self.assertEqual(file.read(), b'content')
+        other = storage.save('recipes/images/other.jpg', ContentFile(b'other'))
+        self.assertNotEqual(other, name)
+
+    def test_same_image_is_stored_once(self):
+        recipes = [
+            models.Recipe.objects.create(
+                name=f'рецепт {index}', text='Описание', cooking_time=5,
+                author=self.user,
+                image=ContentFile(b'image', name=f'photo{index}.png'))
+            for index in range(2)
+        ]
+        self.assertEqual(recipes[0].image.name, recipes[1].image.name)
+        directory = os.path.dirname(recipes[0].image.path)
+        self.assertEqual(os.listdir(directory), [
+            os.path.basename(recipes[0].image.name)])
+
+
+@override_settings(USE_X_ACCEL_REDIRECT=True)
+class ShoppingCartAccelRedirectTest(APITestCase):
+    """Список покупок отдает nginx из PROTECTED_MEDIA_ROOT."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='buyer', email='buyer@foodgram.ru',
+            first_name='Buyer', last_name='Buyer')
+        recipe = models.Recipe.objects.create(
+            name='Рецепт', text='Описание', cooking_time=5, author=cls.user)
+        ingredient = models.Ingredient.objects.create(
+            name='соль', measurement_unit=models.Unit.objects.create(name='г'))
+        models.IngredientRecipe.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=3)
+        models.ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def download(self):
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+        return response
+
+    def test_headers_and_file(self):
+        response = self.download()
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertEqual(
+            response['Content-Disposition'],
+            'attachment; filename="shopping_cart.txt"')
+        content = 'Список покупок:\nсоль (г) - 3'.encode()
+        name = os.path.join(
+            'shopping_lists', hashlib.sha256(content).hexdigest() + '.txt')
+        self.assertEqual(
+            response['X-Accel-Redirect'], settings.PROTECTED_MEDIA_URL + name)
+        path = os.path.join(settings.PROTECTED_MEDIA_ROOT, name)
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), content)
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o644)
+
+    def test_same_list_is_written_once(self):
+        first = self.download()['X-Accel-Redirect']
+        self.assertEqual(self.download()['X-Accel-Redirect'], first)
+        self.assertEqual(len(os.listdir(os.path.join(
+            settings.PROTECTED_MEDIA_ROOT, 'shopping_lists'))), 1)
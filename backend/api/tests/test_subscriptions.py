@@ -0,0 +1,82 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from recipes import models
+from users.models import CustomUser
+
+from .base import APITestCase
+
+URL = '/api/users/subscriptions/'
+
+
+class SubscriptionRecipesLimitTest(APITestCase):
+    """
+    recipes_limit ограничивает рецепты каждого автора подписки,
+    recipes_count считает все его рецепты.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='reader', email='reader@foodgram.ru',
+            first_name='Reader', last_name='Reader')
+        cls.authors = []
+        for index, count in enumerate((3, 1, 0)):
+            author = CustomUser.objects.create_user(
+                username=f'author{index}', email=f'author{index}@foodgram.ru',
+                first_name='Author', last_name='Author')
+            for number in range(count):
+                models.Recipe.objects.create(
+                    name=f'рецепт {index}-{number}', text='Описание',
+                    cooking_time=5, author=author)
+            models.Subscription.objects.create(
+                user=cls.user, following=author)
+            cls.authors.append(author)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def get_subscriptions(self, query=''):
+        """{id автора: (названия рецептов, recipes_count)}"""
+        response = self.client.get(URL + query)
+        self.assertEqual(response.status_code, 200)
+        return {
+            item['id']: (
+                [recipe['name'] for recipe in item['recipes']],
+                item['recipes_count'],
+            )
+            for item in response.data['results']
+        }
+
+    def test_without_limit(self):
+        self.assertEqual(self.get_subscriptions(), {
+            self.authors[0].pk: (
+                ['рецепт 0-0', 'рецепт 0-1', 'рецепт 0-2'], 3),
+            self.authors[1].pk: (['рецепт 1-0'], 1),
+            self.authors[2].pk: ([], 0),
+        })
+
+    def test_limit_per_author(self):
+        self.assertEqual(self.get_subscriptions('?recipes_limit=2'), {
+            self.authors[0].pk: (['рецепт 0-0', 'рецепт 0-1'], 3),
+            self.authors[1].pk: (['рецепт 1-0'], 1),
+            self.authors[2].pk: ([], 0),
+        })
+
+    def test_zero_limit(self):
+        self.assertEqual(self.get_subscriptions('?recipes_limit=0'), {
+            self.authors[0].pk: ([], 3),
+            self.authors[1].pk: ([], 1),
+            self.authors[2].pk: ([], 0),
+        })
+
+    def test_recipes_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get_subscriptions('?recipes_limit=2')
+        recipe_queries = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT')
+            and 'FROM "recipes_recipe"' in query['sql']
+        ]
+        self.assertEqual(len(recipe_queries), 1)
+        self.assertIn('LIMIT 2', recipe_queries[0])
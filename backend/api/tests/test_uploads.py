@@ -0,0 +1,78 @@
+import gc
+import io
+import os
+import warnings
+
+from PIL import Image
+from recipes import models, uploads
+from users.models import CustomUser
+
+from .base import APITestCase
+
+
+class ImageUploadTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='author', email='author@foodgram.ru',
+            first_name='Author', last_name='Author')
+        cls.tag = models.Tag.objects.create(
+            name='tag', color='#E26C2D', slug='tag')
+        cls.ingredient = models.Ingredient.objects.create(
+            name='соль', measurement_unit=models.Unit.objects.create(name='г'))
+        image = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(image, 'PNG')
+        cls.image = image.getvalue()
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def start_upload(self):
+        response = self.client.post('/api/uploads/', {
+            'filename': 'image.png', 'size': len(self.image),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return models.ImageUpload.objects.get(token=response.data['token'])
+
+    def send(self, upload, data, offset=0):
+        return self.client.generic(
+            'PATCH', f'/api/uploads/{upload.token}/', data,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset))
+
+    def create_recipe(self, upload):
+        return self.client.post('/api/recipes/', {
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 5,
+            'tags': [self.tag.id],
+            'ingredients': [{'id': self.ingredient.id, 'amount': 1}],
+            'image_upload': str(upload.token),
+        }, format='json')
+
+    def test_missing_part_file_is_gone(self):
+        upload = self.start_upload()
+        os.remove(uploads.get_upload_path(upload))
+        response = self.send(upload, self.image)
+        self.assertEqual(response.status_code, 410)
+        self.assertFalse(
+            models.ImageUpload.objects.filter(pk=upload.pk).exists())
+
+    def test_completed_upload_without_file(self):
+        upload = self.start_upload()
+        self.assertEqual(self.send(upload, self.image).status_code, 200)
+        os.remove(uploads.get_upload_path(upload))
+        response = self.create_recipe(upload)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image_upload', response.data)
+
+    def test_upload_file_is_closed(self):
+        upload = self.start_upload()
+        self.assertEqual(self.send(upload, self.image).status_code, 200)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always', ResourceWarning)
+            response = self.create_recipe(upload)
+            gc.collect()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [warning for warning in caught
+             if issubclass(warning.category, ResourceWarning)], [])
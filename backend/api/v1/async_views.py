@@ -0,0 +1,104 @@
+"""
+Одновременные обращения к БД и кэшу для списка и страницы рецептов
+под ASGI (api/asgi.py).
+
+Запрос проходит middleware и dispatch представления как обычно;
+RecipeViewSet.list и retrieve под ASGI выполняют свои обращения
+в потоках пула и независимые из них - одновременно: рецепт из БД
+и его представление из кэша, представления страницы из кэша
+и подписки пользователя на авторов. Без ASGI (WSGI, тестовый клиент)
+те же действия выполняются последовательно в потоке запроса.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from api import db_router
+from api.middleware import collect_metrics, get_current_metrics
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import close_old_connections
+from recipes.cache import get_generation, recipe_cache_key
+from rest_framework.response import Response
+
+# Отметка запроса ASGI в request.META.
+ASGI_ENVIRON_KEY = 'foodgram.asgi'
+
+# Свой пул потоков: потоки обработчиков запросов ждут этих вызовов
+# и в общем пуле цикла событий могли бы занять его целиком.
+executor = ThreadPoolExecutor(thread_name_prefix='asgi-runner')
+
+
+def is_asgi(request):
+    return request.META.get(ASGI_ENVIRON_KEY, False)
+
+
+class Runner:
+    """
+    Запуск синхронного кода в потоке пула с репликой и метриками
+    текущего запроса. Соединение потока в конце вызова возвращается
+    в пул или закрывается по CONN_MAX_AGE, как в конце HTTP-запроса.
+    """
+
+    def __init__(self):
+        self.alias = db_router.get_current_alias()
+        self.metrics = get_current_metrics()
+
+    def call(self, func, args):
+        try:
+            with db_router.read_from(self.alias):
+                if self.metrics is None:
+                    return func(*args)
+                with collect_metrics(self.metrics):
+                    return func(*args)
+        finally:
+            close_old_connections()
+
+    async def __call__(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.call, func, args)
+
+
+def run_concurrently(handler, view, request):
+    """Выполнить handler(view, request, run) в цикле событий сервера."""
+    return async_to_sync(handler)(view, request, Runner())
+
+
+def get_cache_keys(recipe_ids):
+    generation = get_generation()
+    return [recipe_cache_key(pk, generation) for pk in recipe_ids]
+
+
+async def recipe_list(view, request, run):
+    def get_page():
+        queryset = view.filter_queryset(view.get_queryset())
+        page = view.paginate_queryset(queryset)
+        return list(queryset) if page is None else page
+
+    recipes = await run(get_page)
+    serializer = view.get_serializer_class()(
+        context=view.get_serializer_context())
+    keys = await run(get_cache_keys, [recipe.pk for recipe in recipes])
+    cached, _ = await asyncio.gather(
+        run(cache.get_many, keys),
+        run(serializer.prefetch_subscriptions, recipes),
+    )
+    shared = await run(serializer.get_shared_representations, recipes, cached)
+    data = await run(serializer.add_user_data, shared, recipes)
+    if view.paginator is None:
+        return Response(data)
+    return view.get_paginated_response(data)
+
+
+async def recipe_detail(view, request, run):
+    keys = await run(get_cache_keys, [view.get_recipe_id()])
+    recipe, cached = await asyncio.gather(
+        run(view.get_object),
+        run(cache.get_many, keys),
+    )
+    serializer = view.get_serializer_class()(
+        context=view.get_serializer_context())
+    shared = await run(
+        serializer.get_shared_representations, [recipe], cached)
+    await run(serializer.prefetch_subscriptions, [recipe])
+    data = await run(serializer.add_user_data, shared, [recipe])
+    return Response(data[0])
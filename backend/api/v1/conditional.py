@@ -0,0 +1,97 @@
+"""
+Условные GET-запросы: ETag и Last-Modified из штампов версий.
+
+Штампы меняются при записи (recipes/cache.py, recipes/versions.py),
+поэтому 304 Not Modified отдается до выборки и сериализации данных.
+ETag учитывает путь с параметрами, формат ответа и пользователя,
+если ответ от него зависит.
+
+Штампы из кэша Django верны, только если кэш общий для процессов:
+процесс со своим кэшем не видит изменений из других процессов и
+ответил бы 304 на устаревшие данные. Без общего кэша представления
+со штампами из кэша (conditional_cache_stamps) отвечают без ETag.
+"""
+import hashlib
+
+from django.utils.cache import (get_conditional_response, patch_vary_headers,
+                                quote_etag)
+from django.utils.http import http_date
+from recipes.cache import get_stamps, is_shared, user_stamp_key
+
+CONDITIONAL_METHODS = ('GET', 'HEAD')
+
+
+class ConditionalResponseError(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+def version_stamp(stamp):
+    """Штамп recipes.versions.VersionStamp в формате get_version_stamps."""
+    return stamp.get(), stamp.get_modified()
+
+
+def cache_stamps(keys):
+    """Штампы из кэша (время изменения) в формате get_version_stamps."""
+    return [(stamp, stamp) for stamp in get_stamps(keys)]
+
+
+def user_stamps(user):
+    if not user.is_authenticated:
+        return []
+    return cache_stamps([user_stamp_key(user.pk)])
+
+
+class ConditionalGetMixin:
+    """
+    ETag и Last-Modified для действий conditional_actions.
+    Представление возвращает штампы данных ответа в get_version_stamps.
+    """
+    conditional_actions = ('list', 'retrieve')
+    conditional_per_user = False
+    conditional_cache_stamps = False
+    conditional = None
+
+    def get_version_stamps(self):
+        """Список пар (штамп, время изменения) данных ответа."""
+        raise NotImplementedError
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.conditional = None
+        if (request.method not in CONDITIONAL_METHODS
+                or self.action not in self.conditional_actions
+                or self.conditional_cache_stamps and not is_shared()):
+            return
+
+        stamps = self.get_version_stamps()
+        parts = [request.get_full_path(), request.accepted_media_type]
+        if self.conditional_per_user:
+            parts.append(str(request.user.pk))
+        parts.extend(str(stamp) for stamp, _ in stamps)
+        etag = quote_etag(
+            hashlib.md5('\n'.join(parts).encode('utf-8')).hexdigest())
+        last_modified = int(max(modified for _, modified in stamps))
+        self.conditional = (etag, last_modified)
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            raise ConditionalResponseError(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, ConditionalResponseError):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        if self.conditional is not None and response.status_code in (
+                200, 304):
+            etag, last_modified = self.conditional
+            response.setdefault('ETag', etag)
+            response.setdefault('Last-Modified', http_date(last_modified))
+        if self.conditional is not None and self.conditional_per_user:
+            patch_vary_headers(response, ('Authorization',))
+        return response
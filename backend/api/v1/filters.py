@@ -1,21 +1,138 @@
+from django.db import connections
+from django.db.models import Count, Exists, OuterRef
 from django_filters import rest_framework
-from recipes.models import Recipe, Tag
+from django_filters.constants import EMPTY_VALUES
+from recipes import search, tag_index
+from recipes.models import Favorite, Recipe, ShoppingCart, TagRecipe
 from rest_framework import filters
 
+# Фильтры, которые RecipeFilter.filter_queryset применяет сам.
+TAG_FILTERS = ('tags', 'tags_any', 'facets')
+
 
 class CustomNameSearch(filters.SearchFilter):
     search_param = 'name'
 
 
+def get_tag_choices():
+    return [(slug, slug) for slug in tag_index.get_tag_index().slugs]
+
+
+class RecipeFilterBackend(rest_framework.DjangoFilterBackend):
+    """Сохраняет набор фильтров во view: из него берутся фасеты."""
+
+    def get_filterset(self, request, queryset, view):
+        view.filterset = super().get_filterset(request, queryset, view)
+        return view.filterset
+
+
 class RecipeFilter(rest_framework.FilterSet):
+    """
+    tags - рецепты со всеми тегами, tags_any - хотя бы с одним.
+    Если других фильтров нет, теги отбираются по битовому индексу
+    recipes.tag_index, иначе - подзапросами в том же SQL-запросе.
+    С facets=true считаются рецепты с каждым тегом в текущем отборе.
+    """
     author = rest_framework.CharFilter(field_name='author__id')
-    tags = rest_framework.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        conjoined=True,
-        queryset=Tag.objects.all(),
-    )
+    tags = rest_framework.MultipleChoiceFilter(choices=get_tag_choices)
+    tags_any = rest_framework.MultipleChoiceFilter(choices=get_tag_choices)
+    facets = rest_framework.BooleanFilter()
+    is_favorited = rest_framework.BooleanFilter(
+        method='filter_user_relation')
+    is_in_shopping_cart = rest_framework.BooleanFilter(
+        method='filter_user_relation')
+    search = rest_framework.CharFilter(method='filter_search')
+
+    relation_models = {
+        'is_favorited': Favorite,
+        'is_in_shopping_cart': ShoppingCart,
+    }
+
+    def filter_user_relation(self, queryset, name, value):
+        """Отбор рецептов из избранного/списка покупок через EXISTS."""
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none() if value else queryset
+
+        related = self.relation_models[name].objects.filter(
+            user=user, recipe=OuterRef('pk'))
+        return queryset.annotate(
+            **{name: Exists(related)}
+        ).filter(**{name: value})
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск, результаты по убыванию релевантности."""
+        return search.search(queryset, value)
+
+    def has_other_filters(self):
+        """Заданы ли фильтры, кроме тегов."""
+        return any(
+            value not in EMPTY_VALUES
+            for name, value in self.form.cleaned_data.items()
+            if name not in TAG_FILTERS
+        )
+
+    def filter_queryset(self, queryset):
+        data = self.form.cleaned_data
+        self.tag_bits = None
+        self.tags_only = not self.has_other_filters()
+        if data.get('tags') or data.get('tags_any'):
+            if self.tags_only:
+                self.tag_bits = tag_index.get_tag_index().match(
+                    data.get('tags') or (), data.get('tags_any') or ())
+                queryset = self.filter_tag_bits(queryset)
+            else:
+                queryset = self.filter_tag_subqueries(queryset)
+
+        for name, value in data.items():
+            if name not in TAG_FILTERS:
+                queryset = self.filters[name].filter(queryset, value)
+        return queryset
+
+    def filter_tag_bits(self, queryset):
+        """
+        Отбор по id из индекса. Если id больше, чем СУБД принимает
+        параметров в запросе (SQLite), теги проверяются подзапросами.
+        """
+        if not self.tag_bits:
+            return queryset.none()
+        ids = tag_index.to_ids(self.tag_bits)
+        max_params = connections[queryset.db].features.max_query_params
+        if max_params is None or len(ids) <= max_params // 2:
+            return queryset.filter(pk__in=ids)
+        return self.filter_tag_subqueries(queryset)
+
+    def filter_tag_subqueries(self, queryset):
+        """Отбор по тегам подзапросами, без выборки id рецептов."""
+        data = self.form.cleaned_data
+        for slug in set(data.get('tags') or ()):
+            queryset = queryset.filter(pk__in=TagRecipe.objects.filter(
+                tag__slug=slug).values('recipe_id'))
+        if data.get('tags_any'):
+            queryset = queryset.filter(pk__in=TagRecipe.objects.filter(
+                tag__slug__in=data['tags_any']).values('recipe_id'))
+        return queryset
+
+    def get_facets(self):
+        """
+        {'tags': {slug: число рецептов}} для отобранных рецептов
+        или None, если фасеты не запрошены. Отбор только по тегам
+        считается по битовому индексу, с другими фильтрами - одним
+        запросом с группировкой по тегам отобранных рецептов.
+        """
+        if not self.form.cleaned_data.get('facets'):
+            return None
+        index = tag_index.get_tag_index()
+        if self.tags_only:
+            return {'tags': index.facets(self.tag_bits)}
+        counts = dict(TagRecipe.objects.filter(
+            recipe__in=self.qs.order_by().values('pk')
+        ).order_by().values_list('tag__slug').annotate(Count('recipe_id')))
+        return {'tags': {slug: counts.get(slug, 0) for slug in index.slugs}}
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags')
+        fields = (
+            'author', 'tags', 'tags_any', 'is_favorited',
+            'is_in_shopping_cart', 'search', 'facets',
+        )
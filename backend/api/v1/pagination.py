@@ -1,5 +1,46 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class LimitCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация по первичному ключу.
+    Не выполняет COUNT(*) и OFFSET: любая страница стоит как первая.
+    Порядок - по pk, а не Meta.ordering модели: курсору нужно
+    уникальное неизменяемое поле, иначе при изменении названия
+    рецепт пропадет из листания или встретится дважды.
+    """
+    page_size_query_param = 'limit'
+    ordering = 'pk'
+
+
+class RankedPagination(PageNumberPagination):
+    """Постраничная пагинация готового ранжированного списка."""
+    page_size_query_param = 'limit'
 
 
 class PageLimitPagination(PageNumberPagination):
+    """
+    Постраничная пагинация с параметром limit.
+    Если в запросе передан ?cursor= (в т.ч. пустой), используется
+    курсорный режим LimitCursorPagination с порядком по pk вместо
+    порядка queryset (для рецептов - название и автор).
+    """
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    cursor_pagination_class = LimitCursorPagination
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.cursor_query_param) is None:
+            self.cursor_paginator = None
+            return super().paginate_queryset(queryset, request, view)
+
+        self.cursor_paginator = self.cursor_pagination_class()
+        self.cursor_paginator.cursor_query_param = self.cursor_query_param
+        return self.cursor_paginator.paginate_queryset(
+            queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,96 @@
+"""
+Кэш процесса для справочников: теги и ингредиенты с единицами
+измерения.
+
+Ответы хранятся готовыми байтами JSON вместе со штампом версии
+(recipes/versions.py), поэтому попадание в кэш не выполняет ни SQL,
+ни сериализации. Сигналы recipes.signals меняют штамп при изменении
+Tag, Ingredient или Unit, и каждый процесс перестраивает свою копию
+при первом запросе после изменения. Снимок читается с default:
+версия уже новая, а реплика может еще отставать.
+"""
+import threading
+from collections import namedtuple
+
+from django.db import router
+from django.http import HttpResponse
+from recipes import ingredient_index, models, versions
+from rest_framework.renderers import JSONRenderer
+
+from . import serializers
+
+Snapshot = namedtuple('Snapshot', 'version content items')
+
+
+class ReferenceData:
+    """
+    Снимок справочника: content - ответ списка, items - ответы
+    для отдельных объектов по строковому id. get_items нужен, если
+    объекты сериализуются иначе, чем элементы списка.
+    """
+
+    def __init__(self, get_version, get_list, get_items=None):
+        self.get_version = get_version
+        self.get_list = get_list
+        self.get_items = get_items
+        self.snapshot = Snapshot(None, None, {})
+        self.lock = threading.Lock()
+
+    def get(self):
+        version = self.get_version()
+        if self.snapshot.version != version:
+            with self.lock:
+                if self.snapshot.version != version:
+                    self.snapshot = self.load(version)
+        return self.snapshot
+
+    def load(self, version):
+        renderer = JSONRenderer()
+        data = self.get_list()
+        items = data if self.get_items is None else self.get_items()
+        return Snapshot(
+            version,
+            renderer.render(data),
+            {str(item['id']): renderer.render(item) for item in items},
+        )
+
+
+def get_tags():
+    tags = models.Tag.objects.using(router.db_for_write(models.Tag))
+    return serializers.TagSerializer(tags, many=True).data
+
+
+def get_ingredients():
+    return ingredient_index.get_ingredient_index().all()
+
+
+def get_ingredient_items():
+    ingredients = models.Ingredient.objects.using(
+        router.db_for_write(models.Ingredient))
+    return serializers.IngredientSerializer(
+        ingredients.select_related('measurement_unit'),
+        many=True
+    ).data
+
+
+tags = ReferenceData(versions.tags.get, get_tags)
+ingredients = ReferenceData(
+    ingredient_index.get_version, get_ingredients, get_ingredient_items)
+
+
+def get_cached_response(request, reference, pk=None):
+    """
+    Ответ из кэша или None, если ответ строится обычным путем:
+    другой формат (например, браузерный API) или объекта нет в кэше.
+    """
+    if (not isinstance(request.accepted_renderer, JSONRenderer)
+            or request.accepted_media_type != JSONRenderer.media_type):
+        return None
+    snapshot = reference.get()
+    if pk is None:
+        content = snapshot.content
+    else:
+        content = snapshot.items.get(str(pk))
+    if content is None:
+        return None
+    return HttpResponse(content, content_type=JSONRenderer.media_type)
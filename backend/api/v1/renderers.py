@@ -0,0 +1,149 @@
+import csv
+import io
+import json
+import os
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework import renderers
+from rest_framework.negotiation import DefaultContentNegotiation
+
+SHOPPING_CART_TITLE = 'Список покупок:'
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class FormatNegotiation(DefaultContentNegotiation):
+    """
+    Рендерер только по ?format=, без учета Accept: файл скачивается
+    в запрошенном формате, по умолчанию - в первом из renderer_classes.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        format = format_suffix or request.query_params.get(
+            self.settings.URL_FORMAT_OVERRIDE)
+        if format:
+            renderers = self.filter_renderers(renderers, format)
+        renderer = renderers[0]
+        return renderer, renderer.media_type
+
+
+class ShoppingCartRenderer(renderers.BaseRenderer):
+    """
+    Базовый рендерер списка покупок.
+    Строки списка - словари с ключами name, unit, amount.
+    Метод stream отдает документ по частям для StreamingHttpResponse.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            return renderers.JSONRenderer().render(data)
+        return b''.join(self.stream_bytes(data))
+
+    def stream(self, rows):
+        raise NotImplementedError
+
+    def stream_bytes(self, rows):
+        for chunk in self.stream(rows):
+            if isinstance(chunk, str):
+                chunk = chunk.encode(self.charset)
+            yield chunk
+
+    def get_filename(self):
+        return f'shopping_cart.{self.format}'
+
+
+class ShoppingCartTxtRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        yield SHOPPING_CART_TITLE
+        for row in rows:
+            yield f'\n{format_position(row)}'
+
+
+class ShoppingCartCsvRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for row in rows:
+            yield writer.writerow(
+                (row['name'], row['unit'], row['amount']))
+
+
+class ShoppingCartJsonRenderer(ShoppingCartRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, rows):
+        yield '['
+        separator = ''
+        for row in rows:
+            yield separator + json.dumps(row, ensure_ascii=False)
+            separator = ','
+        yield ']'
+
+
+class ShoppingCartPdfRenderer(ShoppingCartRenderer):
+    """
+    PDF собирается в памяти целиком: формат не позволяет
+    отдавать страницы до завершения документа.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_name = 'ShoppingCartFont'
+    font_size = 12
+    line_height = 16
+    margin = 50
+
+    def get_font(self):
+        font_path = settings.SHOPPING_CART_PDF_FONT
+        if not os.path.isfile(font_path):
+            return 'Helvetica'
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(self.font_name, font_path))
+        return self.font_name
+
+    def stream(self, rows):
+        buffer = io.BytesIO()
+        document = canvas.Canvas(buffer, pagesize=A4)
+        font = self.get_font()
+        _, height = A4
+        lines = [SHOPPING_CART_TITLE]
+        lines.extend(format_position(row) for row in rows)
+
+        position = height - self.margin
+        document.setFont(font, self.font_size)
+        for line in lines:
+            if position < self.margin:
+                document.showPage()
+                document.setFont(font, self.font_size)
+                position = height - self.margin
+            document.drawString(self.margin, position, line)
+            position -= self.line_height
+        document.save()
+        yield buffer.getvalue()
+
+
+def format_position(row):
+    """Строка списка покупок в виде 'Имя (ед.) - количество'."""
+    if row['unit']:
+        return (f'{row["name"]} ({row["unit"]})'
+                f' - {row["amount"]}')
+    return f'{row["name"]} - {row["amount"]}'
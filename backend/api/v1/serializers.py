@@ -1,11 +1,21 @@
 import base64
+import os
+import uuid
+from contextlib import contextmanager
 
+from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import ContentFile
 from django.core.validators import RegexValidator
-from django.db import transaction
+from django.db import router, transaction
+from django.db.models import (Count, Exists, Manager, OuterRef, Prefetch,
+                              Subquery, prefetch_related_objects)
 from django.shortcuts import get_object_or_404
-from recipes import models
+from django.utils.text import get_valid_filename
+from recipes import images, models, uploads
+from recipes.cache import get_generation, recipe_cache_key
 from rest_framework import serializers, validators
+from rest_framework.relations import MANY_RELATION_KWARGS
 from users.models import CustomUser
 
 
@@ -15,6 +25,47 @@ def check_user_authentication(context):
             and context['request'].user.is_authenticated)
 
 
+class SubscriptionResolver:
+    """
+    Подписки текущего пользователя в пределах одного запроса.
+    Авторы страницы загружаются одним запросом в prefetch,
+    дальнейшие проверки is_subscribed отвечаются из памяти.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.known = {}
+
+    def prefetch(self, authors):
+        ids = {author.pk for author in authors} - self.known.keys()
+        if not ids:
+            return
+        subscribed = set(models.Subscription.objects.filter(
+            user=self.user,
+            following_id__in=ids
+        ).order_by().values_list('following_id', flat=True))
+        for author_id in ids:
+            self.known[author_id] = author_id in subscribed
+
+    def remember(self, author, value):
+        self.known[author.pk] = value
+
+    def is_subscribed(self, author):
+        if author.pk not in self.known:
+            self.prefetch([author])
+        return self.known[author.pk]
+
+
+def get_subscription_resolver(context):
+    """Резолвер подписок, привязанный к request из контекста."""
+    if not check_user_authentication(context):
+        return None
+    request = context['request']
+    if not hasattr(request, '_subscription_resolver'):
+        request._subscription_resolver = SubscriptionResolver(request.user)
+    return request._subscription_resolver
+
+
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
@@ -26,6 +77,88 @@ class Base64ImageField(serializers.ImageField):
         return super().to_internal_value(data)
 
 
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField, который берет объекты из словаря,
+    заранее загруженного методом load() одним запросом.
+    Ключи, которых нет в словаре, проверяются как обычно.
+    """
+    loaded = None
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def load(self, values):
+        pks = set()
+        for value in values:
+            try:
+                pks.add(int(value))
+            except (TypeError, ValueError):
+                continue
+        self.loaded = self.get_queryset().in_bulk(pks)
+
+    def to_internal_value(self, data):
+        try:
+            return self.loaded[int(data)]
+        except (KeyError, TypeError, ValueError):
+            return super().to_internal_value(data)
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.child_relation.load(data)
+        return super().to_internal_value(data)
+
+
+class ImageUploadField(serializers.SlugRelatedField):
+    """Токен завершенной загрузки изображения текущего пользователя."""
+    default_error_messages = {
+        **serializers.SlugRelatedField.default_error_messages,
+        'incomplete': 'Загрузка изображения не завершена.',
+        'gone': 'Файл загрузки не найден, загрузите изображение заново.',
+    }
+
+    def __init__(self, **kwargs):
+        kwargs['slug_field'] = 'token'
+        kwargs['queryset'] = models.ImageUpload.objects.all()
+        super().__init__(**kwargs)
+
+    def get_queryset(self):
+        return super().get_queryset().filter(
+            user=self.context['request'].user)
+
+    def to_internal_value(self, data):
+        try:
+            uuid.UUID(str(data))
+        except ValueError:
+            self.fail('invalid')
+        upload = super().to_internal_value(data)
+        if not upload.complete:
+            self.fail('incomplete')
+        if not uploads.file_exists(upload):
+            self.fail('gone')
+        return upload
+
+
+class UserListSerializer(serializers.ListSerializer):
+    """Проверяет подписки на всех пользователей страницы одним запросом."""
+
+    def to_representation(self, data):
+        if isinstance(data, Manager):
+            data = data.all()
+        users = list(data)
+        resolver = get_subscription_resolver(self.context)
+        if resolver is not None:
+            resolver.prefetch(users)
+        return super().to_representation(users)
+
+
 class UserSerializer(serializers.ModelSerializer):
     username = serializers.CharField(
         required=True,
@@ -48,13 +181,11 @@ class UserSerializer(serializers.ModelSerializer):
         method_name='_get_is_subscribed')
 
     def _get_is_subscribed(self, obj):
-        if not check_user_authentication(self.context):
+        resolver = get_subscription_resolver(self.context)
+        if resolver is None:
             return False
 
-        return models.Subscription.objects.filter(
-            user=self.context['request'].user,
-            following=obj
-        ).exists()
+        return resolver.is_subscribed(obj)
 
     def create(self, validated_data):
         return models.CustomUser.objects.create_user(**validated_data)
@@ -74,6 +205,7 @@ class UserSerializer(serializers.ModelSerializer):
         return value
 
     class Meta:
+        list_serializer_class = UserListSerializer
         model = CustomUser
         fields = (
             'username',
@@ -148,8 +280,20 @@ class IngredientSerializer(serializers.ModelSerializer):
         )
 
 
+class IngredientRecipeListSerializer(serializers.ListSerializer):
+    """Загружает все ингредиенты списка одним запросом."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.child.fields['id'].load(
+                position.get('id') for position in data
+                if isinstance(position, dict)
+            )
+        return super().to_internal_value(data)
+
+
 class IngredientRecipeSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
+    id = BulkPrimaryKeyRelatedField(
         source='ingredient',
         queryset=models.Ingredient.objects.all()
     )
@@ -166,6 +310,7 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
         return response
 
     class Meta:
+        list_serializer_class = IngredientRecipeListSerializer
         model = models.IngredientRecipe
         fields = (
             'id',
@@ -174,8 +319,56 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
         )
 
 
+def build_absolute_variant_urls(variants, request):
+    return {
+        variant: {
+            image_format: request.build_absolute_uri(url)
+            for image_format, url in urls.items()
+        }
+        for variant, urls in variants.items()
+    }
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    complete = serializers.BooleanField(read_only=True)
+
+    def validate_filename(self, value):
+        filename = get_valid_filename(os.path.basename(value))
+        if not filename:
+            raise serializers.ValidationError('Недопустимое имя файла!')
+        return filename
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.IMAGE_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                'Размер изображения должен быть от 1 байта до '
+                f'{settings.IMAGE_UPLOAD_MAX_SIZE} байт!')
+        return value
+
+    class Meta:
+        model = models.ImageUpload
+        fields = (
+            'token',
+            'filename',
+            'size',
+            'offset',
+            'complete',
+        )
+        read_only_fields = ('token', 'offset')
+
+
 class RecipeBaseSerializer(serializers.ModelSerializer):
     image = Base64ImageField(required=False, allow_null=True)
+    image_variants = serializers.SerializerMethodField(
+        method_name='_get_image_variants')
+
+    def _get_image_variants(self, obj):
+        """Уменьшенные копии изображения; None, пока они не построены."""
+        variants = images.get_variant_urls(obj.image.name)
+        request = self.context.get('request')
+        if variants and request is not None:
+            variants = build_absolute_variant_urls(variants, request)
+        return variants
 
     class Meta:
         model = models.Recipe
@@ -183,10 +376,20 @@ class RecipeBaseSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time',
         )
 
 
+class RecipeListSerializer(serializers.ListSerializer):
+    """Сериализует страницу рецептов одним обращением к кэшу."""
+
+    def to_representation(self, data):
+        if isinstance(data, Manager):
+            data = data.all()
+        return self.child.to_representation_many(list(data))
+
+
 class RecipeReadSerializer(RecipeBaseSerializer):
     tags = TagSerializer(many=True)
     author = UserSerializer(read_only=True)
@@ -200,10 +403,134 @@ class RecipeReadSerializer(RecipeBaseSerializer):
     is_in_shopping_cart = serializers.SerializerMethodField(
         method_name='_get_is_in_shopping_cart')
 
+    @staticmethod
+    def setup_eager_loading(queryset, user):
+        """
+        Запрос страницы рецептов: автор и флаги текущего пользователя.
+        Теги и ингредиенты догружаются только для рецептов,
+        которых нет в кэше (см. get_prefetch_lookups).
+        """
+        queryset = queryset.select_related('author')
+        if not user.is_authenticated:
+            return queryset
+
+        return queryset.annotate(
+            is_favorited=Exists(models.Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(models.ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+    @staticmethod
+    def get_prefetch_lookups():
+        return (
+            'tags',
+            Prefetch(
+                'ingredientrecipe_set',
+                queryset=models.IngredientRecipe.objects.select_related(
+                    'ingredient__measurement_unit')
+            ),
+        )
+
+    def get_shared_representations(self, recipes, cached=None):
+        """
+        Не зависящая от пользователя часть ответа из кэша.
+        Промахи догружаются одним prefetch и сериализуются без request.
+        cached - уже прочитанное из кэша {ключ: представление}.
+        """
+        generation = get_generation()
+        keys = {
+            recipe.pk: recipe_cache_key(recipe.pk, generation)
+            for recipe in recipes
+        }
+        if cached is None:
+            cached = cache.get_many(list(keys.values()))
+        else:
+            cached = dict(cached)
+        misses = [
+            recipe for recipe in recipes if keys[recipe.pk] not in cached]
+        if misses:
+            primary = self.read_from_primary(misses)
+            fresh = {
+                keys[recipe_id]: data for recipe_id, data
+                in self.get_shared_data(primary.values()).items()
+            }
+            cache.set_many(fresh, settings.RECIPE_CACHE_TIMEOUT)
+            cached.update(fresh)
+            # Рецепт уже удален в default: ответ с реплики без кэша.
+            deleted = [
+                recipe for recipe in misses if recipe.pk not in primary]
+            for recipe_id, data in self.get_shared_data(deleted).items():
+                cached[keys[recipe_id]] = data
+        return [cached[keys[recipe.pk]] for recipe in recipes]
+
+    @staticmethod
+    def read_from_primary(recipes):
+        """
+        {id: рецепт} для записи в общий кэш. Рецепты, прочитанные
+        с реплики, перечитываются с default: отставшая копия иначе
+        осталась бы в кэше до следующего изменения рецепта.
+        """
+        alias = router.db_for_write(models.Recipe)
+        if all(recipe._state.db == alias for recipe in recipes):
+            return {recipe.pk: recipe for recipe in recipes}
+        return models.Recipe.objects.using(alias).select_related(
+            'author').in_bulk([recipe.pk for recipe in recipes])
+
+    def get_shared_data(self, recipes):
+        """{id: общая часть ответа} одним prefetch."""
+        recipes = list(recipes)
+        if not recipes:
+            return {}
+        prefetch_related_objects(recipes, *self.get_prefetch_lookups())
+        shared_serializer = RecipeReadSerializer(context={})
+        return {
+            recipe.pk: super(
+                RecipeReadSerializer, shared_serializer
+            ).to_representation(recipe)
+            for recipe in recipes
+        }
+
+    def _add_user_data(self, data, recipe):
+        """Наложить на общую часть флаги текущего пользователя."""
+        data = data.copy()
+        data['author'] = data['author'].copy()
+        data['author']['is_subscribed'] = (
+            self.fields['author']._get_is_subscribed(recipe.author))
+        data['is_favorited'] = self._get_is_favorited(recipe)
+        data['is_in_shopping_cart'] = self._get_is_in_shopping_cart(recipe)
+        request = self.context.get('request')
+        if data['image'] and request is not None:
+            data['image'] = request.build_absolute_uri(data['image'])
+        if data['image_variants'] and request is not None:
+            data['image_variants'] = build_absolute_variant_urls(
+                data['image_variants'], request)
+        return data
+
+    def prefetch_subscriptions(self, recipes):
+        """Подписки текущего пользователя на авторов одним запросом."""
+        resolver = get_subscription_resolver(self.context)
+        if resolver is not None:
+            resolver.prefetch(recipe.author for recipe in recipes)
+
+    def add_user_data(self, shared, recipes):
+        return [
+            self._add_user_data(data, recipe)
+            for data, recipe in zip(shared, recipes)
+        ]
+
+    def to_representation_many(self, recipes):
+        shared = self.get_shared_representations(recipes)
+        self.prefetch_subscriptions(recipes)
+        return self.add_user_data(shared, recipes)
+
     def _get_is_favorited(self, obj):
         if not check_user_authentication(self.context):
             return False
 
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+
         return models.Favorite.objects.filter(
             user=self.context['request'].user,
             recipe=obj
@@ -213,12 +540,19 @@ class RecipeReadSerializer(RecipeBaseSerializer):
         if not check_user_authentication(self.context):
             return False
 
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+
         return models.ShoppingCart.objects.filter(
             user=self.context['request'].user,
             recipe=obj
         ).exists()
 
+    def to_representation(self, instance):
+        return self.to_representation_many([instance])[0]
+
     class Meta:
+        list_serializer_class = RecipeListSerializer
         model = models.Recipe
         fields = (
             'id',
@@ -229,26 +563,60 @@ class RecipeReadSerializer(RecipeBaseSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
         )
         read_only_fields = ('author', 'is_favorited', 'is_in_shopping_cart')
 
 
+def raw_delete(queryset):
+    """
+    Удалить строки одним DELETE без выборки и сигналов post_delete
+    по каждой строке. Для строк без зависимых объектов.
+    """
+    return queryset._raw_delete(queryset.db)
+
+
 class RecipeSerializer(RecipeReadSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=models.Tag.objects.all(), many=True)
     ingredients = IngredientRecipeSerializer(many=True)
+    image_upload = ImageUploadField(write_only=True, required=False)
+
+    def validate(self, data):
+        if data.get('image') and data.get('image_upload'):
+            raise serializers.ValidationError(
+                'Передайте либо image, либо image_upload!')
+        return data
+
+    @staticmethod
+    @contextmanager
+    def pop_image_upload(validated_data):
+        """
+        Подставить файл загрузки вместо image; файл открыт
+        до конца блока with.
+        """
+        upload = validated_data.pop('image_upload', None)
+        if upload is None:
+            yield None
+            return
+        with uploads.UploadedImage(upload) as image:
+            validated_data['image'] = image
+            yield upload
 
     @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         author = self.context['request'].user
-        recipe = models.Recipe.objects.create(
-            **validated_data,
-            author=author
-        )
+        with self.pop_image_upload(validated_data) as upload:
+            recipe = models.Recipe.objects.create(
+                **validated_data,
+                author=author
+            )
+        if upload is not None:
+            upload.delete()
 
         list_ingredient = []
         for position in ingredients:
@@ -263,32 +631,87 @@ class RecipeSerializer(RecipeReadSerializer):
         models.TagRecipe.objects.bulk_create(list_tags)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        fields = ('name', 'text', 'cooking_time', 'image',)
-        for field in fields:
-            if field in validated_data:
-                instance.__setattr__(field, validated_data.get(field))
-
-        if 'tags' in validated_data:
-            instance.tags.clear()
-            for tag in validated_data.pop('tags'):
-                instance.tags.add(tag)
-
-        if 'ingredients' in validated_data:
-            instance.ingredients.clear()
-            for position in validated_data.pop('ingredients'):
-                instance.ingredients.add(
-                    position.pop('ingredient'),
-                    through_defaults=position
-                )
-
-        instance.save()
+        with self.pop_image_upload(validated_data) as upload:
+            fields = ('name', 'text', 'cooking_time', 'image',)
+            for field in fields:
+                if field in validated_data:
+                    instance.__setattr__(field, validated_data.get(field))
+
+            if 'tags' in validated_data:
+                self.update_tags(instance, validated_data.pop('tags'))
+
+            if 'ingredients' in validated_data:
+                self.update_ingredients(
+                    instance, validated_data.pop('ingredients'))
+
+            # Сигналы post_save рецепта сбрасывают кэш и индексы его тегов
+            # и состава один раз за запрос (строки удаляются без сигналов).
+            instance.save()
+        if upload is not None:
+            upload.delete()
         return instance
 
+    @staticmethod
+    def update_tags(recipe, tags):
+        """Добавить новые и удалить лишние теги, не трогая остальные."""
+        new_ids = {tag.id for tag in tags}
+        old_ids = set(models.TagRecipe.objects.filter(
+            recipe=recipe).order_by().values_list('tag_id', flat=True))
+
+        if old_ids - new_ids:
+            raw_delete(models.TagRecipe.objects.filter(
+                recipe=recipe, tag_id__in=old_ids - new_ids))
+        models.TagRecipe.objects.bulk_create(
+            models.TagRecipe(recipe=recipe, tag_id=tag_id)
+            for tag_id in new_ids - old_ids
+        )
+
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        """
+        Сравнить ингредиенты с сохраненными: новые добавить,
+        измененные количества обновить, лишние удалить.
+        """
+        amounts = {
+            position['ingredient'].id: position['amount']
+            for position in ingredients
+        }
+        existing = {
+            position.ingredient_id: position
+            for position in models.IngredientRecipe.objects.filter(
+                recipe=recipe).order_by()
+        }
+
+        removed = existing.keys() - amounts.keys()
+        if removed:
+            raw_delete(models.IngredientRecipe.objects.filter(
+                pk__in=[existing[pk].pk for pk in removed]))
+
+        changed = []
+        for ingredient_id, position in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and position.amount != amount:
+                position.amount = amount
+                changed.append(position)
+        if changed:
+            models.IngredientRecipe.objects.bulk_update(changed, ['amount'])
+
+        models.IngredientRecipe.objects.bulk_create(
+            models.IngredientRecipe(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        )
+
     def to_representation(self, instance):
-        serializer = RecipeReadSerializer(instance)
+        serializer = RecipeReadSerializer(instance, context=self.context)
         return serializer.data
 
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + ('image_upload',)
+
 
 class CurrentRecipeDefault:
     requires_context = True
@@ -371,16 +794,50 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         id = view.kwargs.get('user_id')
         return get_object_or_404(models.CustomUser, id=id)
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Авторы и число их рецептов в запросе страницы подписок."""
+        return queryset.select_related('following').annotate(
+            recipes_count=Count('following__recipes'))
+
+    @staticmethod
+    def prefetch_recipes(subscriptions, recipes_limit=None):
+        """
+        Первые recipes_limit рецептов всех авторов страницы одним запросом:
+        коррелированный подзапрос с LIMIT отбирает top-N для каждого автора.
+        """
+        recipes = models.Recipe.objects.all()
+        if recipes_limit == 0:
+            recipes = recipes.none()
+        elif recipes_limit is not None:
+            first_recipes = models.Recipe.objects.filter(
+                author=OuterRef('author')
+            ).values('pk')[:recipes_limit]
+            recipes = recipes.filter(pk__in=Subquery(first_recipes))
+        prefetch_related_objects(subscriptions, Prefetch(
+            'following__recipes',
+            queryset=recipes,
+            to_attr='first_recipes',
+        ))
+
     def to_representation(self, instance):
         author = instance.following
-        recipes = author.recipes.all()
-        if 'recipes_limit' in self.context:
-            recipes = recipes[:self.context['recipes_limit']]
+        if hasattr(author, 'first_recipes'):
+            recipes = author.first_recipes
+            recipes_count = instance.recipes_count
+        else:
+            recipes = author.recipes.all()
+            recipes_count = recipes.count()
+            if self.context.get('recipes_limit') is not None:
+                recipes = recipes[:self.context['recipes_limit']]
         serializer = RecipeBaseSerializer(recipes, many=True)
-        response = UserSerializer(author).data
+        resolver = get_subscription_resolver(self.context)
+        if resolver is not None and instance.user_id == resolver.user.pk:
+            resolver.remember(author, True)
+        response = UserSerializer(author, context=self.context).data
         response['is_subscribed'] = True
         response['recipes'] = serializer.data
-        response['recipes_count'] = recipes.count()
+        response['recipes_count'] = recipes_count
         return response
 
     def validate(self, data):
@@ -1,9 +1,9 @@
 from django.urls import include, path
 from rest_framework import routers
 
-from .views import (FavoriteViewSet, IngredientViewSet, RecipeViewSet,
-                    ShoppingCartViewSet, SubscriptionViewSet, TagViewSet,
-                    TokenViewSet, UserViewSet)
+from .views import (FavoriteViewSet, ImageUploadViewSet, IngredientViewSet,
+                    RecipeViewSet, ShoppingCartViewSet, SubscriptionViewSet,
+                    TagViewSet, TokenViewSet, UserViewSet)
 
 v1_router = routers.DefaultRouter()
 v1_router.register(r'users', UserViewSet)
@@ -23,6 +23,7 @@ v1_router.register(
     SubscriptionViewSet,
     basename='subscribe')
 v1_router.register(r'ingredients', IngredientViewSet)
+v1_router.register(r'uploads', ImageUploadViewSet, basename='uploads')
 
 urlpatterns = [
     path('', include(v1_router.urls)),
@@ -1,35 +1,51 @@
-import os
-import uuid
-
+from api import authentication, db_router
+from api.middleware import SerializerTimingMixin
 from django.conf import settings
-from django.http import FileResponse
+from django.db.models import F, Sum
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django_filters.rest_framework import DjangoFilterBackend
-from recipes import models
+from recipes import ingredient_index, models, pantry_index, uploads, versions
+from recipes.cache import RECIPES_STAMP_KEY, recipe_stamp_key
+from recipes.storage import save_protected
 from rest_framework import mixins, pagination, status, viewsets
 from rest_framework.authtoken.models import Token
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from users.models import CustomUser
 
-from . import filters, permissions, serializers
-from .pagination import PageLimitPagination
+from . import (async_views, filters, permissions, reference_cache, renderers,
+               serializers)
+from .conditional import (ConditionalGetMixin, cache_stamps, user_stamps,
+                          version_stamp)
+from .pagination import PageLimitPagination, RankedPagination
+
+# Наибольший id рецепта (AutoField).
+MAX_RECIPE_ID = 2 ** 31 - 1
 
 
 class CreateViewSet(
+    SerializerTimingMixin,
     mixins.CreateModelMixin,
     viewsets.GenericViewSet
 ):
     pass
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(SerializerTimingMixin, ConditionalGetMixin,
+                  viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = serializers.UserSerializer
     permission_classes = (AllowAny,)
     retrieve_permission = (IsAuthenticated,)
     pagination_class = PageLimitPagination
+    conditional_actions = ('me', )
+    conditional_per_user = True
+    conditional_cache_stamps = True
+
+    def get_version_stamps(self):
+        return user_stamps(self.request.user)
 
     def get_permissions(self):
         if self.action == 'retrieve':
@@ -61,6 +77,7 @@ class UserViewSet(viewsets.ModelViewSet):
         user = request.user
         if user.check_password(request.data.get('current_password')):
             user.set_password(request.data.get('new_password'))
+            user.save(update_fields=('password', ))
             return Response(status=status.HTTP_204_NO_CONTENT)
         error = {'detail': 'Неверный пароль от учетной записи'}
         return Response(error, status=status.HTTP_401_UNAUTHORIZED)
@@ -72,24 +89,27 @@ class UserViewSet(viewsets.ModelViewSet):
     )
     def subscriptions(self, request):
         """Список подписок пользователя"""
-        queryset = request.user.follower.all()
+        queryset = serializers.SubscriptionSerializer.setup_eager_loading(
+            request.user.follower.all())
 
         recipes_limit = request.query_params.get('recipes_limit')
         if recipes_limit is not None:
             recipes_limit = pagination._positive_int(recipes_limit)
 
+        context = self.get_serializer_context()
+        context['recipes_limit'] = recipes_limit
         page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = serializers.SubscriptionSerializer(page, many=True)
-            serializer.context['recipes_limit'] = recipes_limit
-            return self.get_paginated_response(serializer.data)
-
-        serializer = serializers.SubscriptionSerializer(queryset, many=True)
-        serializer.context['recipes_limit'] = recipes_limit
-        return Response(serializer.data)
+        subscriptions = list(queryset) if page is None else page
+        serializers.SubscriptionSerializer.prefetch_recipes(
+            subscriptions, recipes_limit)
+        serializer = serializers.SubscriptionSerializer(
+            subscriptions, many=True, context=context)
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
 
-class TokenViewSet(viewsets.ViewSet):
+class TokenViewSet(SerializerTimingMixin, viewsets.ViewSet):
     @action(
         methods=['POST'],
         detail=False,
@@ -105,8 +125,12 @@ class TokenViewSet(viewsets.ViewSet):
         )
         raw_password = request.data.get('password')
         if user.check_password(raw_password):
-            token, _ = Token.objects.get_or_create(user=user)
-            result = {'auth_token': token.key}
+            if settings.SIGNED_TOKEN_AUTH:
+                key = authentication.issue_token(user)
+            else:
+                key = Token.objects.get_or_create(user=user)[0].key
+            db_router.stick_to_primary(db_router.get_token_identity(key))
+            result = {'auth_token': key}
             return Response(result, status=status.HTTP_200_OK)
 
         error = {'detail': 'Неверный пароль'}
@@ -123,23 +147,78 @@ class TokenViewSet(viewsets.ViewSet):
         if not user.is_authenticated:
             return Response(status=status.HTTP_401_UNAUTHORIZED)
 
-        user.auth_token.delete()
+        if isinstance(request.auth, authentication.SignedToken):
+            authentication.revoke_token(request.auth)
+        else:
+            user.auth_token.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(SerializerTimingMixin, ConditionalGetMixin,
+                    viewsets.ModelViewSet):
     queryset = models.Recipe.objects.all()
     pagination_class = PageLimitPagination
     permission_classes = (permissions.OwnerOrReadOnly,)
-    filter_backends = (DjangoFilterBackend, )
+    filter_backends = (filters.RecipeFilterBackend, )
     filterset_class = filters.RecipeFilter
+    filterset = None
+    facets = None
+    conditional_actions = ('list', 'retrieve', 'pantry')
+    conditional_per_user = True
+    conditional_cache_stamps = True
 
-    def _get_related_data(self, user, favorite):
-        if favorite:
-            return user.favorites.all().values_list('recipe_id', flat=True)
-        else:
-            return user.shopping_cart.all().values_list(
-                'recipe_id', flat=True)
+    def get_version_stamps(self):
+        if self.action == 'retrieve':
+            return cache_stamps([
+                recipe_stamp_key(self.get_recipe_id())
+            ]) + user_stamps(self.request.user)
+        # Фасеты содержат все теги, в том числе новые, без рецептов.
+        stamps = (cache_stamps([RECIPES_STAMP_KEY])
+                  + [version_stamp(versions.tags)]
+                  + user_stamps(self.request.user))
+        if self.action == 'pantry':
+            # Пока индекс строится в фоне, ответ дает прежний индекс.
+            index = pantry_index.get_pantry_index()
+            stamps.append((index.stamp, index.modified))
+        return stamps
+
+    def list(self, request, *args, **kwargs):
+        if async_views.is_asgi(request):
+            return async_views.run_concurrently(
+                async_views.recipe_list, self, request)
+        return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if async_views.is_asgi(request):
+            return async_views.run_concurrently(
+                async_views.recipe_detail, self, request)
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_recipe_id(self):
+        """
+        id рецепта из URL для ключа кэша. Не id - 404, как ответил бы
+        get_object: длинная строка из URL дала бы недопустимый ключ.
+        """
+        try:
+            recipe_id = int(self.kwargs[self.lookup_field])
+        except ValueError:
+            raise NotFound
+        if not 0 < recipe_id <= MAX_RECIPE_ID:
+            raise NotFound
+        return recipe_id
+
+    def filter_queryset(self, queryset):
+        """Фасеты считаются здесь, вместе с отбором рецептов."""
+        queryset = super().filter_queryset(queryset)
+        if self.filterset is not None:
+            self.facets = self.filterset.get_facets()
+        return queryset
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.facets is not None:
+            response.data['facets'] = self.facets
+        return response
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -148,62 +227,108 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeSerializer
 
     def get_queryset(self):
-        user, data = self.request.user, models.Recipe.objects
-        is_favorited = self.request.query_params.get('is_favorited')
-        shopping_cart = self.request.query_params.get('is_in_shopping_cart')
-        if not is_favorited and not shopping_cart:
-            return data.all()
-        elif is_favorited and shopping_cart:
-            list_favorite = set(self._get_related_data(user, True))
-            list_shopping = set(self._get_related_data(user, False))
-            list_id = list(list_favorite.intersection(list_shopping))
-            return data.filter(id__in=list_id)
-        else:
-            list_id = list(self._get_related_data(user, is_favorited))
-            return data.filter(id__in=list_id)
+        queryset = models.Recipe.objects.all()
+        if self.request.method == 'GET':
+            queryset = serializers.RecipeReadSerializer.setup_eager_loading(
+                queryset, self.request.user)
+        return queryset
 
     @action(
         methods=['GET'],
         detail=False,
-        permission_classes=(IsAuthenticated,)
+        pagination_class=RankedPagination,
+        filter_backends=(),
     )
-    def download_shopping_cart(self, request):
-        """Скачать список покупок"""
-        shopping_list = models.ShoppingCart.objects.filter(
-            user=request.user
+    def pantry(self, request):
+        """
+        Рецепты из имеющихся продуктов: ?ingredients=<id>&ingredients=<id>.
+        Сначала рецепты с большей долей имеющихся ингредиентов;
+        coverage - эта доля, missing_ingredients - чего не хватает.
+        """
+        ingredient_ids = self.get_pantry_ingredients()
+        ranking = pantry_index.get_pantry_index().rank(ingredient_ids)
+        page = self.paginate_queryset(ranking)
+        recipes = self.get_queryset().in_bulk(
+            [match.recipe_id for match in page])
+        page = [match for match in page if match.recipe_id in recipes]
+        serializer = self.get_serializer(
+            [recipes[match.recipe_id] for match in page], many=True)
+
+        data = serializer.data
+        pantry = set(ingredient_ids)
+        for item, match in zip(data, page):
+            item['coverage'] = round(match.coverage, 4)
+            item['missing_ingredients'] = [
+                ingredient for ingredient in item['ingredients']
+                if ingredient['id'] not in pantry
+            ]
+        return self.get_paginated_response(data)
+
+    def get_pantry_ingredients(self):
+        values = self.request.query_params.getlist('ingredients')
+        try:
+            ingredient_ids = [
+                pagination._positive_int(
+                    value, strict=True, cutoff=pantry_index.MAX_ID)
+                for value in values
+            ]
+        except ValueError:
+            raise ValidationError(
+                {'ingredients': 'Укажите id ингредиентов числами.'})
+        if not ingredient_ids:
+            raise ValidationError({'ingredients': 'Укажите ингредиенты.'})
+        return ingredient_ids
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        content_negotiation_class=renderers.FormatNegotiation,
+        renderer_classes=(
+            renderers.ShoppingCartTxtRenderer,
+            renderers.ShoppingCartCsvRenderer,
+            renderers.ShoppingCartJsonRenderer,
+            renderers.ShoppingCartPdfRenderer,
         )
-        if not shopping_list.exists():
+    )
+    def download_shopping_cart(self, request):
+        """
+        Скачать список покупок в формате ?format=txt|csv|json|pdf,
+        по умолчанию txt. Строки выбираются одним запросом до ответа:
+        по частям отдается только документ.
+        """
+        if not request.user.shopping_cart.exists():
             return Response(status=status.HTTP_204_NO_CONTENT)
-        cart = {}
-        for shop_position in shopping_list:
-            composition = models.IngredientRecipe.objects.filter(
-                recipe=shop_position.recipe)
-            for line in composition:
-                name = str(line.ingredient)
-                if name in cart.keys():
-                    cart[name] += line.amount
-                else:
-                    cart[name] = line.amount
-
-        text = ['Список покупок:', ]
-        for position in cart.items():
-            text.append(f'{position[0]} - {position[1]}')
-
-        name_file = uuid.uuid4().hex + '.txt'
-        if not os.path.isdir("temp"):
-            os.mkdir("temp")
-        file_path = os.path.join(
-            os.path.join(settings.BASE_DIR, 'temp'), name_file)
-        f = open(file_path, "w+")
-        f.write("\n".join(text))
-        f.close()
-
-        response = FileResponse(
-            open(file_path, "rb"),
-            as_attachment=True,
-            filename='shopping_cart.txt'
-        )
-        os.remove(file_path)
+
+        rows = list(models.Ingredient.objects.filter(
+            ingredientrecipe__recipe__in_users_cart__user=request.user
+        ).values(
+            'name',
+            unit=F('measurement_unit__name'),
+        ).annotate(
+            amount=Sum('ingredientrecipe__amount')
+        ).order_by('name', 'unit'))
+
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f'; charset={renderer.charset}'
+        if settings.USE_X_ACCEL_REDIRECT:
+            name = save_protected(
+                renderer.stream_bytes(rows),
+                'shopping_lists',
+                f'.{renderer.format}'
+            )
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = (
+                settings.PROTECTED_MEDIA_URL + name)
+        else:
+            response = StreamingHttpResponse(
+                renderer.stream(rows),
+                content_type=content_type
+            )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{renderer.get_filename()}"')
         return response
 
 
@@ -227,8 +352,8 @@ class FavoriteViewSet(CreateViewSet):
             user=request.user,
             recipe=recipe,
         )
-        if result.exists():
-            result.delete()
+        deleted, _ = result.delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
         else:
             context = {'errors': 'object does not exist'}
@@ -254,8 +379,8 @@ class SubscriptionViewSet(CreateViewSet):
             user=request.user,
             following=following,
         )
-        if result.exists():
-            result.delete()
+        deleted, _ = result.delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
         else:
             context = {'errors': 'object does not exist'}
@@ -281,25 +406,158 @@ class ShoppingCartViewSet(CreateViewSet):
             user=request.user,
             recipe=recipe,
         )
-        if result.exists():
-            result.delete()
+        deleted, _ = result.delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
         else:
             context = {'errors': 'object does not exist'}
             return Response(context, status=status.HTTP_400_BAD_REQUEST)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class ImageUploadViewSet(
+    SerializerTimingMixin,
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet
+):
+    """
+    Загрузка изображения для рецепта; токен передается
+    в поле image_upload рецепта.
+    POST multipart/form-data с файлом image - загрузка целиком.
+    POST {"filename", "size"} - начать загрузку частями, затем
+    PATCH с заголовком Upload-Offset и байтами части в теле.
+    GET возвращает принятое смещение для продолжения загрузки.
+    """
+    serializer_class = serializers.ImageUploadSerializer
+    permission_classes = (IsAuthenticated, )
+    pagination_class = None
+    lookup_field = 'token'
+
+    def get_queryset(self):
+        return models.ImageUpload.objects.filter(user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        image = request.FILES.get('image')
+        if image is None:
+            return super().create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(
+            data={'filename': image.name, 'size': image.size})
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.save(user=request.user, offset=image.size)
+        uploads.create_file(upload, image)
+        self.verify(upload)
+        return Response(
+            self.get_serializer(upload).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    def perform_create(self, serializer):
+        upload = serializer.save(user=self.request.user)
+        uploads.create_file(upload)
+
+    def partial_update(self, request, token=None):
+        upload = self.get_object()
+        try:
+            offset = int(request.META['HTTP_UPLOAD_OFFSET'])
+        except (KeyError, ValueError):
+            context = {'errors': 'Нужен заголовок Upload-Offset'}
+            return Response(context, status=status.HTTP_400_BAD_REQUEST)
+
+        response_status = status.HTTP_200_OK
+        try:
+            uploads.append(
+                upload, uploads.get_body_stream(request._request), offset)
+        except uploads.UploadGoneError:
+            upload.delete()
+            context = {'errors': 'Файл загрузки не найден, начните заново'}
+            return Response(context, status=status.HTTP_410_GONE)
+        except uploads.OffsetMismatchError:
+            response_status = status.HTTP_409_CONFLICT
+        except uploads.UploadTooLargeError:
+            context = {'errors': 'Часть выходит за размер загрузки'}
+            return Response(context, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            # Удаленную загрузку (410) сохранять уже нечего.
+            if upload.pk is not None:
+                upload.offset = uploads.get_received(upload)
+                upload.save(update_fields=('offset', ))
+
+        if upload.complete:
+            self.verify(upload)
+        return Response(
+            self.get_serializer(upload).data,
+            status=response_status
+        )
+
+    def verify(self, upload):
+        if not uploads.verify_image(upload):
+            upload.delete()
+            raise ValidationError(
+                {'image': 'Загрузите правильное изображение.'})
+
+
+class ReferenceDataMixin:
+    """Ответы справочника из кэша процесса (см. reference_cache)."""
+    reference_data = None
+
+    def list(self, request, *args, **kwargs):
+        response = reference_cache.get_cached_response(
+            request, self.reference_data)
+        return response or super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        response = reference_cache.get_cached_response(
+            request, self.reference_data, kwargs[self.lookup_field])
+        return response or super().retrieve(request, *args, **kwargs)
+
+
+class TagViewSet(SerializerTimingMixin, ConditionalGetMixin,
+                 ReferenceDataMixin, viewsets.ReadOnlyModelViewSet):
     queryset = models.Tag.objects.all()
     serializer_class = serializers.TagSerializer
     permission_classes = (AllowAny, )
     pagination_class = None
+    reference_data = reference_cache.tags
+
+    def get_version_stamps(self):
+        return [version_stamp(versions.tags)]
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(SerializerTimingMixin, ConditionalGetMixin,
+                        ReferenceDataMixin, viewsets.ReadOnlyModelViewSet):
     queryset = models.Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
     permission_classes = (AllowAny, )
     pagination_class = None
     filter_backends = (filters.CustomNameSearch, )
     search_fields = ('^name', )
+    reference_data = reference_cache.ingredients
+
+    def get_version_stamps(self):
+        return [version_stamp(ingredient_index.version_stamp)]
+
+    def list(self, request, *args, **kwargs):
+        """
+        Автодополнение по индексу: ?name=<начало имени>&limit=<k>.
+        Весь справочник без параметров отдается из кэша процесса.
+        """
+        if not request.query_params:
+            response = reference_cache.get_cached_response(
+                request, self.reference_data)
+            if response is not None:
+                return response
+        try:
+            limit = pagination._positive_int(
+                request.query_params['limit'], strict=True)
+        except (KeyError, ValueError):
+            limit = None
+        query = request.query_params.get(
+            filters.CustomNameSearch.search_param, '')
+        result = ingredient_index.get_ingredient_index().search(
+            query,
+            limit=limit,
+            substring=settings.INGREDIENT_INDEX_SUBSTRING_FALLBACK,
+        )
+        return Response(result)
@@ -0,0 +1,22 @@
+"""
+ASGI config for foodgram project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Run with an ASGI server, e.g.:
+
+    gunicorn foodgram.asgi:application -k uvicorn.workers.UvicornWorker
+
+See api/asgi.py for how requests are handled.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+django.setup(set_prefix=False)
+
+from api.asgi import ASGIHandler  # noqa: E402
+
+application = ASGIHandler()
@@ -0,0 +1,118 @@
+"""
+Пул соединений с БД процесса.
+
+Соединения пула общие для потоков одного процесса (gunicorn
+--threads): поток берет соединение в начале запроса к БД и возвращает
+его в конце HTTP-запроса. Свободные соединения выдаются в порядке
+LIFO, поэтому под небольшой нагрузкой работают одни и те же
+"прогретые" соединения. Если все POOL_SIZE соединений заняты, поток
+ждет освобождения не дольше POOL_TIMEOUT секунд.
+"""
+import threading
+import time
+from collections import deque, namedtuple
+
+from django.db import OperationalError
+
+PooledConnection = namedtuple('PooledConnection', 'connection released')
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeoutError(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.idle = deque()
+        self.opened = 0
+        self.condition = threading.Condition()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+
+    def acquire(self):
+        """
+        Свободное соединение (PooledConnection) или None, если
+        вызывающий должен открыть новое: место под него уже занято.
+        """
+        with self.condition:
+            started = None
+            while not self.idle and self.opened >= self.size:
+                if started is None:
+                    started = time.monotonic()
+                    self.waits += 1
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeoutError(
+                        f'нет свободных соединений за {self.timeout} с')
+                self.condition.wait(remaining)
+            if started is not None:
+                self.wait_time += time.monotonic() - started
+            if self.idle:
+                self.reused += 1
+                return self.idle.pop()
+            self.opened += 1
+            self.created += 1
+            return None
+
+    def release(self, connection):
+        with self.condition:
+            self.idle.append(PooledConnection(connection, time.monotonic()))
+            self.condition.notify()
+
+    def discard(self, connection=None):
+        """Закрыть соединение и освободить его место в пуле."""
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+        with self.condition:
+            self.opened -= 1
+            self.discarded += 1
+            self.condition.notify()
+
+    def stats(self):
+        with self.condition:
+            return {
+                'size': self.size,
+                'opened': self.opened,
+                'idle': len(self.idle),
+                'created': self.created,
+                'reused': self.reused,
+                'discarded': self.discarded,
+                'waits': self.waits,
+                'wait_ms': round(self.wait_time * 1000, 2),
+                'timeouts': self.timeouts,
+            }
+
+
+def get_pool(alias, settings_dict):
+    """Пул соединения alias или None, если POOL_SIZE не задан."""
+    if not settings_dict.get('POOL_SIZE'):
+        return None
+    pool = _pools.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None:
+                pool = _pools[alias] = ConnectionPool(
+                    settings_dict['POOL_SIZE'],
+                    settings_dict.get('POOL_TIMEOUT', 10))
+    return pool
+
+
+def get_pool_stats():
+    """{alias: статистика} для созданных пулов процесса."""
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {alias: pool.stats() for alias, pool in pools}
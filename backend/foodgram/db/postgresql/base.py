@@ -0,0 +1,8 @@
+from django.db.backends.postgresql import base
+
+from ..wrapper import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def init_pooled_connection(self, connection):
+        self.isolation_level = connection.isolation_level
@@ -0,0 +1,112 @@
+"""
+Проверка и пул соединений для бэкендов foodgram.db.postgresql
+и foodgram.db.sqlite3. Дополнительные ключи DATABASES:
+
+CONN_HEALTH_CHECKS - соединение, простоявшее между запросами дольше
+    HEALTH_CHECK_IDLE секунд, перед первым SQL-запросом проверяется
+    SELECT 1; соединение, закрытое сервером (перезапуск, таймаут),
+    заменяется новым вместо ошибки в ответе пользователю.
+POOL_SIZE, POOL_TIMEOUT - соединения берутся из пула процесса
+    (foodgram/db/pool.py) и возвращаются в него в конце каждого
+    HTTP-запроса; CONN_MAX_AGE при этом не используется.
+
+connect_count и connect_time считают открытия соединения (вместе
+с ожиданием пула) для метрик api.metrics.
+"""
+import time
+
+from django.db import DatabaseError
+
+from .pool import get_pool
+
+HEALTH_CHECK_IDLE = 1.0
+
+
+class PooledDatabaseWrapperMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connect_count = 0
+        self.connect_time = 0.0
+        self.idle_since = None
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            self.connect_count += 1
+            self.connect_time += time.perf_counter() - start
+        self.idle_since = None
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        while True:
+            pooled = pool.acquire()
+            if pooled is None:
+                break
+            idle = time.monotonic() - pooled.released
+            if (not self.settings_dict.get('CONN_HEALTH_CHECKS')
+                    or idle < HEALTH_CHECK_IDLE
+                    or self.ping(pooled.connection)):
+                self.init_pooled_connection(pooled.connection)
+                return pooled.connection
+            pool.discard(pooled.connection)
+
+        try:
+            return super().get_new_connection(conn_params)
+        except Exception:
+            pool.discard()
+            raise
+
+    def init_pooled_connection(self, connection):
+        """Восстановить состояние обертки для соединения из пула."""
+
+    def ping(self, connection):
+        try:
+            cursor = connection.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+        except self.Database.Error:
+            return False
+        return True
+
+    def ensure_connection(self):
+        if (self.idle_since is not None and self.connection is not None
+                and not self.in_atomic_block):
+            idle = time.monotonic() - self.idle_since
+            self.idle_since = None
+            if (self.settings_dict.get('CONN_HEALTH_CHECKS')
+                    and idle >= HEALTH_CHECK_IDLE
+                    and not self.is_usable()):
+                self.close()
+        super().ensure_connection()
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        connection = self.connection
+        try:
+            with self.wrap_database_errors:
+                connection.rollback()
+        except DatabaseError:
+            pool.discard(connection)
+        else:
+            pool.release(connection)
+
+    def close_if_unusable_or_obsolete(self):
+        """Вызывается Django в начале и в конце каждого HTTP-запроса."""
+        super().close_if_unusable_or_obsolete()
+        if self.connection is None or self.in_atomic_block:
+            return
+        if self.pool is not None:
+            self.close()
+        elif self.idle_since is None:
+            self.idle_since = time.monotonic()
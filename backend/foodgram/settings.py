@@ -1,13 +1,18 @@
 import os
+import tempfile
 from datetime import timedelta
+from itertools import zip_longest
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-SECRET_KEY = os.getenv('SECRET_KEY', 'a&a%000000hhaaaaa^##a0)aaa@0aaa=aa&aaaaa^##aaa0(aa')
+# Ключ для разработки; на сервере SECRET_KEY задается в окружении.
+DEV_SECRET_KEY = 'a&a%000000hhaaaaa^##a0)aaa@0aaa=aa&aaaaa^##aaa0(aa'
+SECRET_KEY = os.getenv('SECRET_KEY', DEV_SECRET_KEY)
 
 DEBUG = False
 
@@ -36,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryMetricsMiddleware',
+    'api.db_router.ReadReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,17 +73,49 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+# Стандартные бэкенды заменяются обертками с проверкой соединений
+# и пулом (foodgram/db/wrapper.py).
+DB_ENGINES = {
+    'django.db.backends.postgresql': 'foodgram.db.postgresql',
+    'django.db.backends.sqlite3': 'foodgram.db.sqlite3',
+}
+DB_ENGINE = os.getenv('DB_ENGINE', 'django.db.backends.sqlite3')
+
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.sqlite3'),
+        'ENGINE': DB_ENGINES.get(DB_ENGINE, DB_ENGINE),
         'NAME': os.getenv('DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
         'USER': os.getenv('POSTGRES_USER', 'postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'postgres'),
         'HOST': os.getenv('DB_HOST', 'db'),
-        'PORT': os.getenv('DB_PORT', '5432')
+        'PORT': os.getenv('DB_PORT', '5432'),
+        # Постоянное соединение процесса вместо нового на каждый запрос.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        # Пул для gunicorn с потоками (--threads): POOL_SIZE на процесс.
+        'POOL_SIZE': int(os.getenv('DB_POOL_SIZE', 0)),
+        'POOL_TIMEOUT': int(os.getenv('DB_POOL_TIMEOUT', 10)),
     }
 }
 
+# Реплики только для чтения (api/db_router.py): хосты и/или имена БД
+# через запятую, недостающие параметры берутся из default. Локально
+# вместо реплики подойдет копия файла SQLite: DB_REPLICA_NAMES=replica.sqlite3
+replica_hosts = os.getenv('DB_REPLICA_HOSTS', '').split(',')
+replica_names = os.getenv('DB_REPLICA_NAMES', '').split(',')
+for index, (host, name) in enumerate(zip_longest(replica_hosts,
+                                                 replica_names)):
+    if host or name:
+        DATABASES[f'replica{index + 1}'] = dict(
+            DATABASES['default'],
+            HOST=host or DATABASES['default']['HOST'],
+            NAME=name or DATABASES['default']['NAME'],
+            TEST={'MIRROR': 'default'},
+        )
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['api.db_router.ReplicaRouter']
+DB_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 5))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -108,19 +147,102 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Файлы, которые nginx отдает только по X-Accel-Redirect.
+PROTECTED_MEDIA_URL = '/protected/'
+PROTECTED_MEDIA_ROOT = os.path.join(BASE_DIR, 'protected')
+USE_X_ACCEL_REDIRECT = os.getenv('USE_X_ACCEL_REDIRECT', '') == 'True'
+
+# Потоков для построения вариантов изображений; 0 - строить сразу.
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', 2))
+
+# Загрузки изображений частями (api/uploads/); каталог лучше держать
+# на том же томе, что и MEDIA_ROOT, тогда готовый файл перемещается.
+IMAGE_UPLOAD_DIR = os.getenv(
+    'IMAGE_UPLOAD_DIR',
+    os.path.join(tempfile.gettempdir(), 'foodgram', 'uploads')
+)
+IMAGE_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.SignedTokenAuthentication',
     ],
 }
 
-SIMPLE_JWT = {
-    'ACCESS_TOKEN_LIFETIME': timedelta(days=10),
-    'AUTH_HEADER_TYPES': ('Bearer',),
+# Вход выдает подписанные токены (api/authentication.py) вместо токенов
+# rest_framework.authtoken; выданные ранее токены из БД продолжают работать.
+# Ключ подписи берется только из окружения: SECRET_KEY по умолчанию
+# опубликован, и с ним можно подделать токен любого пользователя.
+SIGNED_TOKEN_KEY = os.getenv('SIGNED_TOKEN_KEY') or os.getenv('SECRET_KEY')
+SIGNED_TOKEN_AUTH = os.getenv(
+    'SIGNED_TOKEN_AUTH', str(bool(SIGNED_TOKEN_KEY))) == 'True'
+if SIGNED_TOKEN_AUTH and SIGNED_TOKEN_KEY in (None, '', DEV_SECRET_KEY):
+    raise ImproperlyConfigured(
+        'SIGNED_TOKEN_AUTH требует своего SIGNED_TOKEN_KEY или SECRET_KEY '
+        'в переменных окружения.')
+SIGNED_TOKEN_LIFETIME = timedelta(days=10)
+SIGNED_TOKEN_USER_CACHE_TTL = 60
+SIGNED_TOKEN_REVOCATION_REFRESH = 5
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+QUERY_METRICS_HEADERS = os.getenv('QUERY_METRICS_HEADERS', '') == 'True'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.metrics': {
+            'handlers': ['console'],
+            'level': os.getenv('QUERY_METRICS_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
 }
 
+# Общий кэш процессов: memcached, CACHE_LOCATION=memcached:11211
+# (несколько серверов - через запятую). Без него каждый процесс держит
+# свой кэш, и представления рецептов сбрасываются целиком при любом
+# изменении рецептов (см. recipes/cache.py).
+CACHE_LOCATION = os.getenv('CACHE_LOCATION')
+if CACHE_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': CACHE_LOCATION.split(','),
+        },
+    }
+
+RECIPE_CACHE_TIMEOUT = 60 * 60
+
+INGREDIENT_INDEX_PATH = os.getenv(
+    'INGREDIENT_INDEX_PATH',
+    os.path.join(tempfile.gettempdir(), 'foodgram', 'ingredients.idx')
+)
+INGREDIENT_INDEX_SUBSTRING_FALLBACK = True
+
+# Индекс ингредиент -> рецепты для /api/recipes/pantry/.
+PANTRY_INDEX_PATH = os.getenv(
+    'PANTRY_INDEX_PATH',
+    os.path.join(os.path.dirname(INGREDIENT_INDEX_PATH), 'pantry.idx')
+)
+# Пока индекс продуктов перестраивается в фоне, отдается прежний.
+PANTRY_INDEX_BACKGROUND_REBUILD = True
+
+# Штампы версий справочников (recipes/versions.py), общие для процессов.
+VERSION_STAMP_DIR = os.getenv(
+    'VERSION_STAMP_DIR', os.path.dirname(INGREDIENT_INDEX_PATH))
+
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
@@ -0,0 +1,102 @@
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from . import versions
+
+# Увеличить при изменении формата ответа RecipeReadSerializer.
+RECIPE_REPRESENTATION_VERSION = 2
+
+# Штамп версии - время последнего изменения данных (unix time),
+# по штампам строятся ETag и Last-Modified ответов API.
+RECIPES_STAMP_KEY = f'stamp:v{RECIPE_REPRESENTATION_VERSION}:recipes'
+
+
+def is_shared():
+    """Кэш общий для процессов (memcached), а не кэш процесса."""
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def get_generation():
+    """
+    Поколение ключей рецептов. Удаление из кэша процесса не видно
+    другим процессам, поэтому без общего кэша ключи содержат файловый
+    штамп versions.recipes, который меняется при любом изменении.
+    """
+    if is_shared():
+        return 'shared'
+    return versions.recipes.get().decode('ascii')
+
+
+def recipe_cache_key(recipe_id, generation=None):
+    """Ключ кэша общей (не зависящей от пользователя) части рецепта."""
+    if generation is None:
+        generation = get_generation()
+    return (f'recipe:v{RECIPE_REPRESENTATION_VERSION}:{generation}:'
+            f'{recipe_id}')
+
+
+def recipe_stamp_key(recipe_id):
+    return f'stamp:v{RECIPE_REPRESENTATION_VERSION}:recipe:{recipe_id}'
+
+
+def user_stamp_key(user_id):
+    """Штамп профиля и флагов пользователя: избранное, покупки, подписки."""
+    return f'stamp:user:{user_id}'
+
+
+def get_stamps(keys):
+    """Штампы по ключам; отсутствующие в кэше начинаются заново."""
+    stamps = cache.get_many(keys)
+    missing = {key: time.time() for key in keys if key not in stamps}
+    if missing:
+        cache.set_many(missing, None)
+        stamps.update(missing)
+    return [stamps[key] for key in keys]
+
+
+def now_and_on_commit(func):
+    """
+    Выполнить func сразу и еще раз после коммита транзакции.
+
+    Так сбрасываются кэши, штампы и индексы при записи: копия,
+    собранная другим процессом или запросом между первым вызовом
+    и коммитом, прочитана без изменений транзакции и иначе осталась бы
+    актуальной. Вне транзакции on_commit выполняет func сразу.
+    """
+    func()
+    transaction.on_commit(func)
+
+
+def bump_stamps(keys):
+    """Сменить штампы (см. now_and_on_commit)."""
+    def bump():
+        now = time.time()
+        cache.set_many({key: now for key in keys}, None)
+
+    now_and_on_commit(bump)
+
+
+def invalidate_recipes(recipe_ids):
+    """
+    Удалить из кэша представления рецептов и сменить их штампы
+    (см. now_and_on_commit).
+    """
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return
+
+    def evict():
+        if not is_shared():
+            versions.recipes.bump()
+        cache.delete_many([
+            recipe_cache_key(recipe_id) for recipe_id in recipe_ids])
+
+    now_and_on_commit(evict)
+    bump_stamps([RECIPES_STAMP_KEY, *map(recipe_stamp_key, recipe_ids)])
+
+
+def invalidate_user(user_id):
+    bump_stamps([user_stamp_key(user_id)])
@@ -0,0 +1,155 @@
+"""
+Уменьшенные копии изображений рецептов.
+
+Оригинал, загруженный через API, сохраняется как есть, а варианты
+(thumbnail, card, full в WebP и JPEG, без метаданных) строит пул
+фоновых потоков после коммита транзакции. Варианты лежат рядом
+с оригиналом:
+    <каталог оригинала>/variants/<имя оригинала>/<вариант>.<формат>
+Файл ready пишется последним и означает, что все варианты готовы.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .cache import invalidate_recipes
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Наибольшая сторона варианта в пикселях.
+VARIANTS = {
+    'thumbnail': 160,
+    'card': 480,
+    'full': 1280,
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+READY_MARKER = 'ready'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_variants_dir(name):
+    return os.path.join(
+        os.path.dirname(name), 'variants', os.path.basename(name))
+
+
+def get_variant_name(name, variant, image_format):
+    return os.path.join(get_variants_dir(name), f'{variant}.{image_format}')
+
+
+def variants_ready(name):
+    return default_storage.exists(
+        os.path.join(get_variants_dir(name), READY_MARKER))
+
+
+def get_variant_urls(name):
+    """
+    {вариант: {формат: url}} для готовых вариантов или None,
+    если они еще не построены.
+    """
+    if not name or not variants_ready(name):
+        return None
+    return {
+        variant: {
+            image_format: default_storage.url(
+                get_variant_name(name, variant, image_format))
+            for image_format in FORMATS
+        }
+        for variant in VARIANTS
+    }
+
+
+def _save(path, content):
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    default_storage.save(path, ContentFile(content))
+
+
+def _encode(image, image_format):
+    pil_format, params = FORMATS[image_format]
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        if 'A' in image.getbands():
+            background.paste(image, mask=image.getchannel('A'))
+        else:
+            background.paste(image.convert('RGB'))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **params)
+    return buffer.getvalue()
+
+
+def build_variants(name):
+    """Построить все варианты изображения и отметить их готовность."""
+    with default_storage.open(name) as image_file:
+        original = Image.open(image_file)
+        original.load()
+    original = ImageOps.exif_transpose(original)
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert(
+            'RGBA' if 'transparency' in original.info else 'RGB')
+
+    for variant, size in VARIANTS.items():
+        image = original.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        # EXIF, ICC-профиль и комментарии не переносятся в варианты.
+        image.info = {}
+        for image_format in FORMATS:
+            _save(get_variant_name(name, variant, image_format),
+                  _encode(image, image_format))
+    _save(os.path.join(get_variants_dir(name), READY_MARKER), b'')
+
+
+def process_image(name):
+    """Построить варианты и сбросить кэш рецептов с этим изображением."""
+    try:
+        build_variants(name)
+    except Exception:
+        logger.exception(f'не удалось обработать изображение {name}')
+        return
+    invalidate_recipes(Recipe.objects.filter(
+        image=name).order_by().values_list('id', flat=True))
+
+
+def _process_in_worker(name):
+    try:
+        process_image(name)
+    finally:
+        connection.close()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS,
+                thread_name_prefix='image-variants')
+    return _executor
+
+
+def schedule_variants(name):
+    """
+    Поставить изображение в очередь после коммита транзакции.
+    При IMAGE_VARIANT_WORKERS = 0 варианты строятся сразу.
+    """
+    if not name or variants_ready(name):
+        return
+    if settings.IMAGE_VARIANT_WORKERS:
+        transaction.on_commit(lambda: get_executor().submit(
+            _process_in_worker, name))
+    else:
+        transaction.on_commit(lambda: process_image(name))
@@ -0,0 +1,221 @@
+"""
+Индекс ингредиентов для автодополнения.
+
+Индекс - отсортированный по нормализованному имени массив записей,
+сохраненный в файл и открытый через mmap. Файл один на все процессы
+gunicorn: страницы файла делятся через page cache ОС.
+
+Формат файла:
+    заголовок  <4sH32sI: MAGIC, FORMAT_VERSION, штамп версии, число записей
+    смещения   <(N+1)I: начало каждой записи и конец последней
+    записи     utf-8 строки 'ключ\\tid\\tимя\\tединица'
+
+Штамп версии хранится в отдельном файле <путь>.version и меняется
+сигналами при изменении Ingredient/Unit (см. recipes.signals).
+Процесс, заметивший расхождение штампов, перестраивает индекс.
+"""
+import fcntl
+import heapq
+import mmap
+import os
+import struct
+
+from django.conf import settings
+from django.db import router
+
+from .models import Ingredient
+from .versions import VersionStamp, write_atomic
+
+MAGIC = b'FGIX'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sH32sI')
+OFFSET = struct.Struct('<I')
+SEPARATOR = b'\t'
+UPPER_BOUND = b'\xff'
+
+_index = None
+
+
+def normalize(value):
+    """Ключ поиска: регистр, ё/е и пробелы не различаются."""
+    return ' '.join(value.casefold().replace('ё', 'е').split())
+
+
+def _clean(value):
+    return (value or '').replace('\t', ' ').replace('\n', ' ')
+
+
+def get_index_path():
+    return settings.INGREDIENT_INDEX_PATH
+
+
+def get_version_path():
+    return get_index_path() + '.version'
+
+
+version_stamp = VersionStamp(get_version_path)
+
+
+def bump_version():
+    """Пометить индекс устаревшим во всех процессах."""
+    version_stamp.bump()
+
+
+def get_version():
+    """Текущий штамп версии; stat файла кэшируется в процессе."""
+    return version_stamp.get()
+
+
+def build_index(stamp=None):
+    """Выгрузить ингредиенты одним запросом и записать файл индекса."""
+    if stamp is None:
+        stamp = get_version()
+
+    records = []
+    # Индекс общий для всех запросов, поэтому читается с default.
+    rows = Ingredient.objects.using(
+        router.db_for_write(Ingredient)).values_list(
+            'id', 'name', 'measurement_unit__name')
+    for ingredient_id, name, unit in rows.iterator():
+        key = normalize(_clean(name)).encode('utf-8')
+        record = SEPARATOR.join((
+            key,
+            str(ingredient_id).encode('ascii'),
+            _clean(name).encode('utf-8'),
+            _clean(unit).encode('utf-8'),
+        ))
+        records.append((key, ingredient_id, record))
+    records.sort()
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, stamp, len(records))
+    offsets, position = [], 0
+    for _, _, record in records:
+        offsets.append(position)
+        position += len(record)
+    offsets.append(position)
+
+    content = b''.join((
+        header,
+        struct.pack(f'<{len(offsets)}I', *offsets),
+        *(record for _, _, record in records),
+    ))
+    write_atomic(get_index_path(), content)
+    return len(records)
+
+
+class IngredientIndex:
+    """Поиск по файлу индекса, открытому через mmap."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as index_file:
+            self.buffer = mmap.mmap(
+                index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.stamp, self.count = HEADER.unpack_from(
+            self.buffer)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f'{path} не является индексом ингредиентов')
+        self.offsets_start = HEADER.size
+        self.data_start = self.offsets_start + (self.count + 1) * OFFSET.size
+
+    def _offset(self, position):
+        return OFFSET.unpack_from(
+            self.buffer, self.offsets_start + position * OFFSET.size)[0]
+
+    def _record(self, position):
+        start = self.data_start + self._offset(position)
+        end = self.data_start + self._offset(position + 1)
+        return self.buffer[start:end]
+
+    def _key(self, position):
+        record = self._record(position)
+        return record[:record.index(SEPARATOR)]
+
+    def _bisect(self, value):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < value:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _to_dict(self, record):
+        _, ingredient_id, name, unit = record.split(SEPARATOR)
+        return {
+            'id': int(ingredient_id),
+            'name': name.decode('utf-8'),
+            'measurement_unit': unit.decode('utf-8') or None,
+        }
+
+    def all(self):
+        """Все ингредиенты в алфавитном порядке."""
+        return [self._to_dict(self._record(position))
+                for position in range(self.count)]
+
+    def search(self, query, limit=None, substring=False):
+        """
+        Автодополнение: сначала совпадения по началу имени,
+        ранжированные по длине имени без единицы измерения. Если их нет
+        и substring=True, ищутся вхождения в середине имени.
+        """
+        key = normalize(query).encode('utf-8')
+        if not key:
+            result = self.all()
+            return result[:limit] if limit else result
+
+        start = self._bisect(key)
+        end = self._bisect(key + UPPER_BOUND)
+        candidates = (
+            (len(name), name, position)
+            for position, name in zip(
+                range(start, end), map(self._key, range(start, end)))
+        )
+        if start == end and substring:
+            candidates = self._substring_candidates(key)
+
+        if limit:
+            ranked = heapq.nsmallest(limit, candidates)
+        else:
+            ranked = sorted(candidates)
+        return [self._to_dict(self._record(position))
+                for *_, position in ranked]
+
+    def _substring_candidates(self, key):
+        for position in range(self.count):
+            name = self._key(position)
+            found = name.find(key)
+            if found != -1:
+                yield found, len(name), name, position
+
+
+def _load(stamp):
+    """Открыть файл индекса или перестроить его, если штамп устарел."""
+    path = get_index_path()
+    try:
+        index = IngredientIndex(path)
+        if index.stamp == stamp:
+            return index
+    except (FileNotFoundError, ValueError, struct.error):
+        pass
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            index = IngredientIndex(path)
+            if index.stamp == stamp:
+                return index
+        except (FileNotFoundError, ValueError, struct.error):
+            pass
+        build_index(stamp)
+    return IngredientIndex(path)
+
+
+def get_ingredient_index():
+    """Индекс текущей версии; перестраивается при смене штампа."""
+    global _index
+    stamp = get_version()
+    if _index is None or _index.stamp != stamp:
+        _index = _load(stamp)
+    return _index
@@ -0,0 +1,25 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from recipes import ingredient_index
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Перестроить индекс автодополнения ингредиентов.
+    Use:
+        python manage.py build_ingredient_index
+    """
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        ingredient_index.bump_version()
+        count = ingredient_index.build_index()
+        self.stdout.write(
+            f'{count} ingredients indexed in '
+            f'{time.monotonic() - start:.3f}s: '
+            f'{ingredient_index.get_index_path()}'
+        )
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from recipes import search
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Перестроить индекс полнотекстового поиска рецептов.
+    Use:
+        python manage.py build_search_index
+    """
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        search.index_recipes()
+        self.stdout.write(
+            f'{Recipe.objects.count()} recipes indexed in '
+            f'{time.monotonic() - start:.3f}s'
+        )
@@ -2,11 +2,17 @@ import logging
 import os
 import sys
 
-from django.core.management.base import BaseCommand
-from recipes.models import Ingredient, Unit
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes import ingredient_index, pantry_index, versions
+from recipes.cache import invalidate_recipes
+from recipes.models import Recipe
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_CHUNK_SIZE = 1000
+
 
 class Command(BaseCommand):
     """
@@ -14,6 +20,10 @@ class Command(BaseCommand):
         python manage.py clear_table tablename <table name>
     For delete all tables use:
         python manage.py clear_table tablename all
+    Options:
+        --fast            TRUNCATE ... CASCADE на PostgreSQL; очищает
+                          и все таблицы, ссылающиеся на указанные
+        --chunk-size N    удалять пачками по N строк с выводом прогресса
     For help:
         python manage.py clear_table help
     """
@@ -21,6 +31,8 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
 
         parser.add_argument('arguments', nargs='+', type=str)
+        parser.add_argument('--fast', action='store_true')
+        parser.add_argument('--chunk-size', type=int)
 
     def handle(self, *args, **options):
 
@@ -36,30 +48,100 @@ class Command(BaseCommand):
             )
             return
 
-        if options['arguments'][0] == 'tablename':
-            if options['arguments'][1] == 'all':
-                tables = [
-                    'recipes_ingredient',
-                    'recipes_unit',
-                ]
-            else:
-                tables = [options['arguments'][1], ]
-
-            for table in tables:
-                self.tablename = table
-                self.clear_table()
-                logger.info(f'table {self.tablename} is cleared')
-            return
-        else:
+        if options['arguments'][0] != 'tablename':
             logger.info(__class__.__doc__)
+            return
+        if len(options['arguments']) < 2:
+            raise CommandError('Не указана таблица')
 
-    def clear_table(self):
-        table = self.tablename
+        models = self.get_models(options['arguments'][1])
+        if options['fast'] and connection.vendor == 'postgresql':
+            self.truncate(models)
+            return
+        if options['fast']:
+            logger.warning(
+                f'TRUNCATE не поддерживается для {connection.vendor}, '
+                'таблицы будут очищены пачками')
+
+        chunk_size = options['chunk_size']
+        if options['fast'] and not chunk_size:
+            chunk_size = DEFAULT_CHUNK_SIZE
+        for model in models:
+            if chunk_size:
+                self.delete_chunked(model, chunk_size)
+            else:
+                model.objects.all().delete()
+            logger.info(f'table {model._meta.db_table} is cleared')
+
+    def get_models(self, tablename):
+        """Модели приложения recipes: зависимые таблицы идут первыми."""
+        models = {
+            model._meta.db_table: model
+            for model in apps.get_app_config('recipes').get_models()
+        }
+        if tablename == 'all':
+            return dependents_first(models.values())
+        if tablename not in models:
+            raise CommandError(
+                f'Неизвестная таблица {tablename}, '
+                f'доступны: {", ".join(sorted(models))}')
+        return [models[tablename]]
+
+    def truncate(self, models):
+        quote = connection.ops.quote_name
+        tables = ', '.join(quote(model._meta.db_table) for model in models)
+        with transaction.atomic(), connection.cursor() as cursor:
+            # После TRUNCATE рецептов уже не найти: id собираются заранее,
+            # кэш очищается и сейчас, и после коммита.
+            recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+            cursor.execute(f'TRUNCATE {tables} CASCADE')
+            invalidate_recipes(recipe_ids)
+            transaction.on_commit(ingredient_index.bump_version)
+            transaction.on_commit(pantry_index.bump_version)
+            transaction.on_commit(versions.tags.bump)
+            transaction.on_commit(versions.recipe_tags.bump)
+        logger.info(f'tables {tables} are truncated')
+
+    def delete_chunked(self, model, chunk_size):
+        """
+        Удаление через ORM пачками: каскады и сигналы работают
+        как обычно, но в памяти одновременно не больше chunk_size
+        строк таблицы.
+        """
+        table = model._meta.db_table
+        total = model.objects.count()
+        deleted = 0
+        while True:
+            pks = list(model.objects.order_by('pk').values_list(
+                'pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            model.objects.filter(pk__in=pks).delete()
+            deleted += len(pks)
+            logger.info(f'{table}: deleted {deleted} of {total}')
+
+
+def dependents_first(models):
+    """
+    Упорядочить модели так, чтобы ссылающиеся модели шли раньше
+    тех, на которые они ссылаются: тогда при удалении ORM не нужно
+    собирать каскады.
+    """
+    models = list(models)
+    ordered, seen = [], set()
 
-        if table == 'recipes_ingredient':
-            Ingredient.objects.all().delete()
-        else:
-            Unit.objects.all().delete()
+    def visit(model):
+        if model in seen:
+            return
+        seen.add(model)
+        for relation in model._meta.related_objects:
+            if relation.related_model in models:
+                visit(relation.related_model)
+        ordered.append(model)
+
+    for model in models:
+        visit(model)
+    return ordered
 
 
 def initialize_logger():
@@ -0,0 +1,38 @@
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from recipes.models import ImageUpload
+
+
+class Command(BaseCommand):
+    """
+    Удалить незавершенные и неиспользованные загрузки изображений
+    и сформированные для X-Accel-Redirect списки покупок.
+    Use:
+        python manage.py clear_uploads --hours 24
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24,
+                            help='удалить файлы старше N часов')
+
+    def handle(self, *args, **options):
+        expired = timezone.now() - timedelta(hours=options['hours'])
+        count, _ = ImageUpload.objects.filter(created__lt=expired).delete()
+        self.stdout.write(f'{count} uploads deleted')
+
+        directory = os.path.join(
+            settings.PROTECTED_MEDIA_ROOT, 'shopping_lists')
+        if not os.path.isdir(directory):
+            return
+        expired = time.time() - options['hours'] * 60 * 60
+        count = 0
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.stat().st_mtime < expired:
+                os.remove(entry.path)
+                count += 1
+        self.stdout.write(f'{count} shopping lists deleted')
@@ -1,99 +1,231 @@
+import csv
+import io
 import json
 import logging
 import os
+import re
 import sys
+import time
 
-import api.v1.serializers as api_serializers
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes import ingredient_index
+from recipes.models import Ingredient, Unit
 
 logger = logging.getLogger(__name__)
 
+BATCH_SIZE = 10000
+CHUNK_SIZE = 1 << 16
+JSON_SEPARATORS = re.compile(r'[\s,]*')
+COPY_TABLE = 'load_data_ingredients'
+
 
 class Command(BaseCommand):
+    """
+    Загрузить ингредиенты из CSV (имя,единица) или JSON
+    ([{"name": ..., "measurement_unit": ...}]).
+    Use:
+        python manage.py load_data
+        python manage.py load_data data/ingredients.csv --batch-size 5000
+    Файлы читаются потоком, пары (имя, единица), которые уже есть
+    в БД, пропускает уникальный индекс, поэтому команду можно запускать
+    повторно. На PostgreSQL строки вставляются через COPY во временную
+    таблицу и INSERT ... ON CONFLICT DO NOTHING.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            help='файлы .csv или .json, по умолчанию data/ingredients.json')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--no-copy', action='store_true',
+                            help='не использовать COPY на PostgreSQL')
 
     def handle(self, *args, **options):
 
         initialize_logger()
 
-        data_dir = os.path.join(settings.BASE_DIR, "data")
-
-        files = os.listdir(data_dir)
+        paths = options['paths'] or [
+            os.path.join(settings.BASE_DIR, 'data', 'ingredients.json')]
+        use_copy = (connection.vendor == 'postgresql'
+                    and not options['no_copy'])
 
-        logger.info(
-            'files to load:'
-            f'[{[file for file in files]}]'
-        )
-
-        parameters = {
-            'IngredientSerializer':
-                {
-                    'class': api_serializers.IngredientSerializer,
-                    'file_name': 'ingredients.json',
-                },
-        }
-
-        for key, value in parameters.items():
-            class_name = key
-            file_path = os.path.join(data_dir, value['file_name'])
-            class_obj = value['class']
+        for path in paths:
             logger.info(
                 '----------------------------\n'
-                f'loading file ... {file_path}'
+                f'loading file ... {path}'
             )
-            params = {
-                class_name: {
-                    'class': class_obj,
-                    'file_path': file_path,
-                }
-            }
-            parameters[class_name] = {
-                'class': class_obj,
-                'file_path': file_path,
-            }
-            self.err = False
-            self.load_from_json(**params)
-            if not self.err:
-                logger.info('OK')
-
-    def load_from_json(self, **kvargs):
-
-        for key, val in kvargs.items():
-            class_params = kvargs[key]
-            class_obj = class_params['class']
-            file_path = class_params['file_path']
-
-            with open(file_path, encoding="utf-8") as csv_file:
-                try:
-                    json_list = json.load(csv_file)
-                    all_units = set().union(
-                        list(d['measurement_unit'] for d in json_list)
-                    )
-                    list_units = [{'name': name} for name in all_units]
-                    serializer_units = api_serializers.UnitSerializer(
-                        data=list_units, many=True
-                    )
-                    if serializer_units.is_valid():
-                        serializer_units.save()
-                    else:
-                        logger.error(
-                            f'serializer error:\n {serializer_units.errors[0]}'
-                        )
-                        continue
-
-                    serializer = class_obj(data=json_list, many=True)
-                    if serializer.is_valid():
-                        serializer.save()
-                    else:
-                        logger.error(
-                            f'serializer error:\n {serializer.errors}'
-                        )
-                except Exception as e:
-                    self.err = True
-                    logger.error(
-                        f'error while data loading, see below:\n {e}'
-                    )
-                    raise
+            start = time.monotonic()
+            with open(path, encoding='utf-8-sig', newline='') as file:
+                with transaction.atomic():
+                    loader = IngredientLoader(options['batch_size'], use_copy)
+                    loader.load(read_rows(path, file))
+                    if loader.inserted:
+                        transaction.on_commit(ingredient_index.bump_version)
+            elapsed = max(time.monotonic() - start, 1e-6)
+            logger.info(
+                f'read {loader.read}, inserted {loader.inserted}, '
+                f'skipped {loader.skipped}, invalid {loader.invalid}, '
+                f'units created {loader.units_created} '
+                f'in {elapsed:.2f}s ({loader.read / elapsed:.0f} rows/s)'
+            )
+
+
+class IngredientLoader:
+    """
+    Вставка ингредиентов пачками. Единицы загружаются заранее, новые
+    создаются по мере появления в файле. Пары (имя, единица), которые
+    уже есть в БД, пропускаются при вставке, а не проверяются в памяти.
+    """
+
+    def __init__(self, batch_size, use_copy=False):
+        self.batch_size = batch_size
+        self.use_copy = use_copy
+        self.name_length = Ingredient._meta.get_field('name').max_length
+        self.unit_length = Unit._meta.get_field('name').max_length
+        self.units = dict(
+            Unit.objects.order_by('-id').values_list('name', 'id'))
+        self.read = self.valid = self.inserted = self.invalid = 0
+        self.units_created = 0
+        self.count_before = Ingredient.objects.count()
+
+    @property
+    def skipped(self):
+        return self.valid - self.inserted
+
+    def get_unit_id(self, name):
+        if not name:
+            return None
+        if name not in self.units:
+            self.units[name] = Unit.objects.create(name=name).id
+            self.units_created += 1
+        return self.units[name]
+
+    def load(self, rows):
+        batch = []
+        for name, unit in rows:
+            self.read += 1
+            name, unit = (name or '').strip(), (unit or '').strip()
+            if (not name or len(name) > self.name_length
+                    or len(unit) > self.unit_length):
+                self.invalid += 1
+                logger.warning(f'row {self.read} skipped: {name!r}, {unit!r}')
+                continue
+
+            self.valid += 1
+            batch.append((name, self.get_unit_id(unit)))
+            if len(batch) >= self.batch_size:
+                self.insert(batch)
+                batch = []
+        self.insert(batch)
+        self.inserted = Ingredient.objects.count() - self.count_before
+
+    def insert(self, batch):
+        if not batch:
+            return
+        if self.use_copy:
+            self.copy(batch)
+        else:
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=name, measurement_unit_id=unit_id)
+                 for name, unit_id in batch),
+                ignore_conflicts=True
+            )
+
+    def copy(self, batch):
+        """
+        COPY ... FROM STDIN в формате CSV (пустое поле - NULL)
+        во временную таблицу, из нее - INSERT без конфликтующих строк.
+        """
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+
+        quote = connection.ops.quote_name
+        columns = ', '.join(
+            quote(Ingredient._meta.get_field(field).column)
+            for field in ('name', 'measurement_unit')
+        )
+        table = quote(Ingredient._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE IF NOT EXISTS {COPY_TABLE} '
+                f'ON COMMIT DROP AS SELECT {columns} FROM {table} '
+                'WITH NO DATA')
+            cursor.copy_expert(
+                f'COPY {COPY_TABLE} ({columns}) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) '
+                f'SELECT {columns} FROM {COPY_TABLE} '
+                'ON CONFLICT DO NOTHING')
+            cursor.execute(f'TRUNCATE {COPY_TABLE}')
+
+
+def read_rows(path, file):
+    """Пары (имя, единица) из файла; формат определяется расширением."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return read_csv(file)
+    if extension == '.json':
+        return (
+            (item.get('name'), item.get('measurement_unit'))
+            for item in read_json_array(file)
+        )
+    raise CommandError(f'{path}: поддерживаются только .csv и .json')
+
+
+def read_csv(file):
+    for number, row in enumerate(csv.reader(file)):
+        if not row:
+            continue
+        if number == 0 and row[:2] == ['name', 'measurement_unit']:
+            continue
+        yield row[0], row[1] if len(row) > 1 else ''
+
+
+def read_json_array(file):
+    """
+    Объекты JSON-массива по одному, без загрузки всего файла в память.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('ожидается JSON-массив объектов')
+    position, done = 1, False
+    while not done:
+        chunk = file.read(CHUNK_SIZE)
+        buffer = buffer[position:] + chunk
+        items, position, done = decode_items(
+            decoder, buffer, final=not chunk)
+        yield from items
+
+
+def decode_items(decoder, buffer, final):
+    """
+    Разобрать целые объекты в начале буфера.
+    Возвращает объекты, позицию недочитанного остатка
+    и признак конца массива.
+    """
+    items, position = [], 0
+    while True:
+        position = JSON_SEPARATORS.match(buffer, position).end()
+        if position == len(buffer):
+            return items, position, final
+        if buffer[position] == ']':
+            return items, position, True
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as error:
+            if final:
+                raise CommandError(f'ошибка в JSON: {error}')
+            return items, position, False
+        if not isinstance(item, dict):
+            raise CommandError('ожидается JSON-массив объектов')
+        items.append(item)
 
 
 def initialize_logger():
@@ -0,0 +1,121 @@
+# Generated by Django 2.2.19 on 2026-10-18 06:05
+
+import re
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Копия recipes.search на момент миграции: миграция не должна меняться
+# вместе с модулем поиска. Новый формат индекса - новая миграция или
+# команда build_search_index.
+CONFIG = 'russian'
+WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2}
+MIN_TERM_LENGTH = 2
+TERM_LENGTH = 100
+WORD_RE = re.compile(r'\w+')
+
+UPDATE_VECTORS_SQL = """
+UPDATE recipes_recipe SET search_vector =
+    setweight(to_tsvector(%(config)s, translate(name, 'ёЁ', 'еЕ')), 'A')
+    || setweight(to_tsvector(%(config)s, translate(coalesce((
+        SELECT string_agg(recipes_ingredient.name, ' ')
+        FROM recipes_ingredientrecipe
+        JOIN recipes_ingredient
+            ON recipes_ingredient.id = recipes_ingredientrecipe.ingredient_id
+        WHERE recipes_ingredientrecipe.recipe_id = recipes_recipe.id
+    ), ''), 'ёЁ', 'еЕ')), 'B')
+    || setweight(to_tsvector(%(config)s, translate(text, 'ёЁ', 'еЕ')), 'C')
+"""
+
+
+def normalize(value):
+    return ' '.join(value.casefold().replace('ё', 'е').split())
+
+
+def tokenize(value):
+    return [
+        word[:TERM_LENGTH] for word in WORD_RE.findall(normalize(value))
+        if len(word) >= MIN_TERM_LENGTH
+    ]
+
+
+def get_terms(name, ingredients, text):
+    terms = {}
+    for weight, values in (('C', [text]), ('B', ingredients), ('A', [name])):
+        for value in values:
+            for term in tokenize(value or ''):
+                terms[term] = WEIGHTS[weight]
+    return terms
+
+
+def get_term_rows(rows):
+    documents = {}
+    for recipe_id, name, text, ingredient in rows:
+        documents.setdefault(recipe_id, (name, [], text))[1].append(
+            ingredient)
+    for recipe_id, document in documents.items():
+        for term, weight in get_terms(*document).items():
+            yield recipe_id, term, weight
+
+
+def build_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX recipes_recipe_search_vector_gin '
+            'ON recipes_recipe USING gin (search_vector)')
+        schema_editor.execute(UPDATE_VECTORS_SQL, {'config': CONFIG})
+        return
+
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeSearchTerm = apps.get_model('recipes', 'RecipeSearchTerm')
+    db_alias = schema_editor.connection.alias
+    rows = Recipe.objects.using(db_alias).order_by().values_list(
+        'id', 'name', 'text', 'ingredients__name')
+    RecipeSearchTerm.objects.using(db_alias).bulk_create((
+        RecipeSearchTerm(recipe_id=recipe_id, term=term, weight=weight)
+        for recipe_id, term, weight in get_term_rows(rows.iterator())
+    ))
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS recipes_recipe_search_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_content_addressed_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(db_index=True, max_length=100, verbose_name='Слово')),
+                ('weight', models.FloatField(verbose_name='Вес')),
+            ],
+            options={
+                'verbose_name': 'Слово поискового индекса',
+                'verbose_name_plural': 'Поисковый индекс рецептов',
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipesearchterm',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='recipes.Recipe'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipesearchterm',
+            constraint=models.UniqueConstraint(fields=('recipe', 'term'), name='recipe_search_term'),
+        ),
+        migrations.RunPython(build_search_index, drop_search_index),
+    ]
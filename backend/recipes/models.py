@@ -1,7 +1,12 @@
+import uuid
+
+from django.contrib.postgres.search import SearchVectorField
 from django.core import validators
 from django.db import models
 from users.models import CustomUser
 
+from .storage import ContentAddressedStorage
+
 
 class Tag(models.Model):
     """Теги"""
@@ -87,6 +92,19 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('name', )
+        # NULL в уникальном индексе не совпадает с NULL, поэтому
+        # ингредиенты без единицы уникальны по имени отдельно.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_unit'
+            ),
+            models.UniqueConstraint(
+                fields=['name'],
+                condition=models.Q(measurement_unit__isnull=True),
+                name='unique_ingredient_without_unit'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name} ({self.measurement_unit})'
@@ -104,7 +122,11 @@ class Recipe(models.Model):
         help_text='Описание рецепта',
     )
     image = models.ImageField(
-        upload_to='recipes/images/', null=True, blank=True)
+        upload_to='recipes/images/',
+        storage=ContentAddressedStorage(),
+        null=True,
+        blank=True
+    )
     cooking_time = models.PositiveIntegerField(
         'Время приготовления (в минутах)',
         help_text='Время в минутах, необходимое для приготовления',
@@ -122,6 +144,8 @@ class Recipe(models.Model):
         Ingredient,
         through='IngredientRecipe'
     )
+    # Заполняется recipes.search на PostgreSQL, GIN-индекс - в миграции.
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         verbose_name = 'Рецепт'
@@ -273,3 +297,54 @@ class Favorite(models.Model):
 
     def __str__(self):
         return f'Рецепт {self.recipe} в избранном {self.user}'
+
+
+class ImageUpload(models.Model):
+    """
+    Загрузка изображения частями. Принятые байты лежат во временном
+    файле (см. recipes.uploads), offset - сколько байт уже принято.
+    """
+    token = models.UUIDField(
+        'Токен', default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name='image_uploads')
+    filename = models.CharField('Имя файла', max_length=255)
+    size = models.PositiveIntegerField('Размер')
+    offset = models.PositiveIntegerField('Принято байт', default=0)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Загрузка изображения'
+        verbose_name_plural = 'Загрузки изображений'
+        ordering = ('created', )
+
+    @property
+    def complete(self):
+        return self.offset == self.size
+
+    def __str__(self):
+        return f'{self.filename} ({self.offset}/{self.size})'
+
+
+class RecipeSearchTerm(models.Model):
+    """
+    Инвертированный индекс поиска рецептов для СУБД без tsvector
+    (см. recipes.search): слово и его вес в рецепте.
+    """
+    term = models.CharField('Слово', max_length=100, db_index=True)
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name='search_terms')
+    weight = models.FloatField('Вес')
+
+    class Meta:
+        verbose_name = 'Слово поискового индекса'
+        verbose_name_plural = 'Поисковый индекс рецептов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'term'],
+                name='recipe_search_term'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.term} - {self.recipe_id} ({self.weight})'
@@ -0,0 +1,276 @@
+"""
+Инвертированный индекс ингредиент -> рецепты для подбора рецептов
+по продуктам, которые есть у пользователя.
+
+Индекс - разреженная матрица ингредиентов и рецептов в формате CSR:
+для каждого ингредиента отсортированный список позиций его рецептов.
+Позиция рецепта - его номер в порядке Recipe.Meta.ordering, поэтому
+при равной полноте рецепты идут в обычном порядке списка. Покрытие
+всех рецептов считается одним numpy.bincount по спискам ингредиентов
+запроса, без запросов к БД.
+
+Формат файла (открывается через mmap, общий для процессов gunicorn):
+    заголовок  <4sH32sIII: MAGIC, FORMAT_VERSION, штамп версии,
+               число рецептов, ингредиентов и пар ингредиент-рецепт
+    массивы    <i4: id рецептов, число ингредиентов рецептов,
+               id ингредиентов, смещения (ингредиентов + 1), позиции
+
+Штамп версии хранится в файле <путь>.version и меняется сигналами
+при изменении рецептов и их ингредиентов (см. recipes.signals).
+Пока новый индекс строится в фоновом потоке, процесс отдает прежний
+(PANTRY_INDEX_BACKGROUND_REBUILD); штамп отданного индекса входит
+в ETag ответа. Без прежнего индекса процесс строит его сам.
+"""
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import threading
+from collections import namedtuple
+
+import numpy
+from django.conf import settings
+from django.db import connections, router, transaction
+
+from .models import IngredientRecipe, Recipe
+from .versions import VersionStamp, write_atomic
+
+MAGIC = b'FGPX'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sH32sIII')
+DTYPE = numpy.dtype('<i4')
+MAX_ID = int(numpy.iinfo(DTYPE).max)
+
+Match = namedtuple('Match', 'recipe_id coverage missing')
+
+logger = logging.getLogger(__name__)
+
+_index = None
+_rebuilding = False
+_lock = threading.Lock()
+
+
+def get_index_path():
+    return settings.PANTRY_INDEX_PATH
+
+
+def get_version_path():
+    return get_index_path() + '.version'
+
+
+version_stamp = VersionStamp(get_version_path)
+
+
+def bump_version():
+    """Пометить индекс устаревшим во всех процессах."""
+    version_stamp.bump()
+
+
+def get_version():
+    return version_stamp.get()
+
+
+def read_rows(alias):
+    """
+    id рецептов и пары (ингредиент, рецепт) из одного снимка БД.
+    На PostgreSQL снимок дает REPEATABLE READ; внутри чужой
+    транзакции уровень изоляции уже не сменить, и он остается прежним.
+    """
+    connection = connections[alias]
+    repeatable_read = (connection.vendor == 'postgresql'
+                       and not connection.in_atomic_block)
+    with transaction.atomic(using=alias):
+        if repeatable_read:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        recipe_ids = numpy.fromiter(
+            Recipe.objects.using(alias).values_list(
+                'id', flat=True).iterator(),
+            DTYPE)
+        pairs = numpy.array(
+            list(IngredientRecipe.objects.using(alias).order_by().values_list(
+                'ingredient_id', 'recipe_id').distinct().iterator()),
+            dtype=DTYPE,
+        ).reshape(-1, 2)
+    return recipe_ids, pairs
+
+
+def build_index(stamp=None):
+    """Выгрузить состав рецептов двумя запросами и записать файл индекса."""
+    if stamp is None:
+        stamp = get_version()
+
+    recipe_ids, pairs = read_rows(router.db_for_write(Recipe))
+
+    # id рецепта -> позиция в порядке Recipe.Meta.ordering.
+    lookup = numpy.full(int(recipe_ids.max(initial=0)) + 1, -1, DTYPE)
+    lookup[recipe_ids] = numpy.arange(len(recipe_ids), dtype=DTYPE)
+    pairs = pairs[pairs[:, 1] < len(lookup)]
+    positions = lookup[pairs[:, 1]]
+    known = positions >= 0
+    ingredients, positions = pairs[known, 0], positions[known]
+
+    order = numpy.lexsort((positions, ingredients))
+    ingredients, positions = ingredients[order], positions[order]
+    ingredient_ids, counts = numpy.unique(ingredients, return_counts=True)
+    offsets = numpy.concatenate(([0], numpy.cumsum(counts)))
+    sizes = numpy.bincount(positions, minlength=len(recipe_ids))
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, stamp,
+        len(recipe_ids), len(ingredient_ids), len(positions))
+    content = b''.join((
+        header,
+        *(numpy.asarray(array, dtype=DTYPE).tobytes()
+          for array in (recipe_ids, sizes, ingredient_ids, offsets,
+                        positions)),
+    ))
+    write_atomic(get_index_path(), content)
+    return len(recipe_ids)
+
+
+class Ranking:
+    """
+    Рецепты по убыванию доли имеющихся ингредиентов, затем по числу
+    недостающих. Срез возвращает список Match: пагинация переводит
+    в Python только текущую страницу.
+    """
+
+    def __init__(self, recipe_ids, coverage, missing):
+        self.recipe_ids = recipe_ids
+        self.coverage = coverage
+        self.missing = missing
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    def __getitem__(self, key):
+        return [
+            Match(*values) for values in zip(
+                self.recipe_ids[key].tolist(),
+                self.coverage[key].tolist(),
+                self.missing[key].tolist(),
+            )
+        ]
+
+
+class PantryIndex:
+    """Подбор рецептов по файлу индекса, открытому через mmap."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as index_file:
+            self.buffer = mmap.mmap(
+                index_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.modified = os.fstat(index_file.fileno()).st_mtime
+        magic, version, self.stamp, recipes, ingredients, pairs = (
+            HEADER.unpack_from(self.buffer))
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f'{path} не является индексом рецептов')
+
+        arrays, offset = [], HEADER.size
+        for count in (recipes, recipes, ingredients, ingredients + 1, pairs):
+            arrays.append(numpy.frombuffer(
+                self.buffer, DTYPE, count=count, offset=offset))
+            offset += count * DTYPE.itemsize
+        (self.recipe_ids, self.sizes, self.ingredient_ids, self.offsets,
+         self.positions) = arrays
+
+    def rank(self, ingredient_ids):
+        """Рецепты, в которых есть хотя бы один из ingredient_ids."""
+        pantry = numpy.unique(numpy.asarray(ingredient_ids, numpy.int64))
+        found = numpy.searchsorted(self.ingredient_ids, pantry)
+        valid = found < len(self.ingredient_ids)
+        found, pantry = found[valid], pantry[valid]
+        found = found[self.ingredient_ids[found] == pantry]
+        postings = [
+            self.positions[self.offsets[item]:self.offsets[item + 1]]
+            for item in found.tolist()
+        ]
+        if not postings:
+            empty = numpy.array([], DTYPE)
+            return Ranking(empty, empty.astype(float), empty)
+
+        have = numpy.bincount(
+            numpy.concatenate(postings), minlength=len(self.recipe_ids))
+        candidates = numpy.flatnonzero(have)
+        covered = have[candidates]
+        sizes = self.sizes[candidates]
+        coverage = covered / sizes
+        missing = sizes - covered
+        order = numpy.lexsort((candidates, missing, -coverage))
+        return Ranking(
+            self.recipe_ids[candidates[order]],
+            coverage[order],
+            missing[order],
+        )
+
+
+def _open():
+    """Индекс из файла любой версии или None."""
+    try:
+        return PantryIndex(get_index_path())
+    except (FileNotFoundError, ValueError, struct.error):
+        return None
+
+
+def _load(stamp):
+    """Открыть файл индекса или перестроить его, если штамп устарел."""
+    index = _open()
+    if index is not None and index.stamp == stamp:
+        return index
+
+    path = get_index_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        index = _open()
+        if index is not None and index.stamp == stamp:
+            return index
+        build_index(stamp)
+    return PantryIndex(path)
+
+
+def _rebuild(stamp):
+    global _index, _rebuilding
+    try:
+        _index = _load(stamp)
+    except Exception:
+        logger.exception('не удалось перестроить индекс продуктов')
+    finally:
+        connections.close_all()
+        with _lock:
+            _rebuilding = False
+
+
+def rebuild_in_background(stamp):
+    """Перестроить индекс в потоке, если он еще не строится."""
+    global _rebuilding
+    with _lock:
+        if _rebuilding:
+            return
+        _rebuilding = True
+    threading.Thread(
+        target=_rebuild, args=(stamp,), name='pantry-index', daemon=True
+    ).start()
+
+
+def get_pantry_index():
+    """
+    Индекс текущей версии. При смене штампа отдается прежний индекс,
+    пока новый строится в фоне; без прежнего - строится сразу.
+    """
+    global _index
+    stamp = get_version()
+    index = _index
+    if index is None or index.path != get_index_path():
+        index = _index = _open()
+    if index is not None and index.stamp == stamp:
+        return index
+    if index is None or not settings.PANTRY_INDEX_BACKGROUND_REBUILD:
+        index = _index = _load(stamp)
+        return index
+    rebuild_in_background(stamp)
+    return index
@@ -0,0 +1,146 @@
+"""
+Полнотекстовый поиск рецептов по названию, ингредиентам и описанию.
+
+PostgreSQL: столбец Recipe.search_vector (tsvector с весами A/B/C,
+GIN-индекс), запрос to_tsquery с поиском по началу слов, ранжирование
+ts_rank. Остальные СУБД: инвертированный индекс RecipeSearchTerm,
+слово - вес, ранг - сумма весов найденных слов запроса.
+
+В обоих случаях в рецепте должны найтись все слова запроса, а слова
+запроса и документа разбираются одной функцией tokenize. Индекс
+обновляется после коммита изменений рецепта (см. recipes.signals)
+и командой build_search_index.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections, router, transaction
+from django.db.models import F, FloatField, OuterRef, Subquery
+
+from .ingredient_index import normalize
+from .models import Recipe, RecipeSearchTerm
+
+CONFIG = 'russian'
+# Веса ts_rank по умолчанию для A (название), B (ингредиенты), C (текст).
+WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2}
+MIN_TERM_LENGTH = 2
+MAX_QUERY_TERMS = 8
+TERM_LENGTH = RecipeSearchTerm._meta.get_field('term').max_length
+UPPER_BOUND = chr(0x10FFFF)
+WORD_RE = re.compile(r'\w+')
+
+UPDATE_VECTORS_SQL = """
+UPDATE recipes_recipe SET search_vector =
+    setweight(to_tsvector(%(config)s, translate(name, 'ёЁ', 'еЕ')), 'A')
+    || setweight(to_tsvector(%(config)s, translate(coalesce((
+        SELECT string_agg(recipes_ingredient.name, ' ')
+        FROM recipes_ingredientrecipe
+        JOIN recipes_ingredient
+            ON recipes_ingredient.id = recipes_ingredientrecipe.ingredient_id
+        WHERE recipes_ingredientrecipe.recipe_id = recipes_recipe.id
+    ), ''), 'ёЁ', 'еЕ')), 'B')
+    || setweight(to_tsvector(%(config)s, translate(text, 'ёЁ', 'еЕ')), 'C')
+"""
+
+
+def tokenize(value):
+    """Слова для индекса и запроса: без регистра, ё/е не различаются."""
+    return [
+        word[:TERM_LENGTH] for word in WORD_RE.findall(normalize(value))
+        if len(word) >= MIN_TERM_LENGTH
+    ]
+
+
+def uses_postgresql():
+    return connections[router.db_for_write(Recipe)].vendor == 'postgresql'
+
+
+def get_terms(name, ingredients, text):
+    """{слово: вес} документа; у повторов остается больший вес."""
+    terms = {}
+    for weight, values in (('C', [text]), ('B', ingredients), ('A', [name])):
+        for value in values:
+            for term in tokenize(value or ''):
+                terms[term] = WEIGHTS[weight]
+    return terms
+
+
+def get_term_rows(rows):
+    """
+    Строки индекса (id рецепта, слово, вес) по строкам запроса
+    (id рецепта, название, описание, имя ингредиента).
+    """
+    documents = {}
+    for recipe_id, name, text, ingredient in rows:
+        documents.setdefault(recipe_id, (name, [], text))[1].append(
+            ingredient)
+    for recipe_id, document in documents.items():
+        for term, weight in get_terms(*document).items():
+            yield recipe_id, term, weight
+
+
+def index_recipes(recipe_ids=None):
+    """Переиндексировать рецепты recipe_ids (None - все)."""
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+    connection = connections[router.db_for_write(Recipe)]
+    if connection.vendor == 'postgresql':
+        sql, params = UPDATE_VECTORS_SQL, {'config': CONFIG}
+        if recipe_ids is not None:
+            sql += ' WHERE id = ANY(%(ids)s)'
+            params['ids'] = recipe_ids
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+        return
+
+    recipes = Recipe.objects.using(connection.alias).order_by()
+    terms = RecipeSearchTerm.objects.using(connection.alias)
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=recipe_ids)
+        terms = terms.filter(recipe_id__in=recipe_ids)
+    rows = get_term_rows(recipes.values_list(
+        'id', 'name', 'text', 'ingredients__name').iterator())
+    new_terms = [
+        RecipeSearchTerm(recipe_id=recipe_id, term=term, weight=weight)
+        for recipe_id, term, weight in rows
+    ]
+    with transaction.atomic(using=connection.alias):
+        terms.delete()
+        RecipeSearchTerm.objects.using(connection.alias).bulk_create(
+            new_terms)
+
+
+def search(queryset, query):
+    """
+    Рецепты queryset, содержащие все слова query, по убыванию
+    релевантности (ранг в аннотации search_rank).
+    """
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    if not terms:
+        return queryset.none()
+    ordering = ('-search_rank', *Recipe._meta.ordering)
+
+    if uses_postgresql():
+        search_query = SearchQuery(
+            ' & '.join(f'{term}:*' for term in terms),
+            config=CONFIG,
+            search_type='raw',
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by(*ordering)
+
+    rank = None
+    for term in terms:
+        matches = RecipeSearchTerm.objects.filter(
+            term__gte=term, term__lt=term + UPPER_BOUND)
+        queryset = queryset.filter(pk__in=matches.values('recipe_id'))
+        weight = Subquery(
+            matches.filter(recipe=OuterRef('pk')).order_by(
+                '-weight').values('weight')[:1],
+            output_field=FloatField()
+        )
+        rank = weight if rank is None else rank + weight
+    return queryset.annotate(search_rank=rank).order_by(*ordering)
@@ -0,0 +1,166 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from users.models import CustomUser
+
+from . import images, ingredient_index, pantry_index, search, uploads, versions
+from .cache import invalidate_recipes, invalidate_user, now_and_on_commit
+from .models import (Favorite, ImageUpload, Ingredient, IngredientRecipe,
+                     Recipe, ShoppingCart, Subscription, Tag, TagRecipe, Unit)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Unit)
+@receiver(post_delete, sender=Unit)
+def invalidate_ingredient_index(sender, **kwargs):
+    """Изменение ингредиентов или единиц делает индекс устаревшим."""
+    now_and_on_commit(ingredient_index.bump_version)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    now_and_on_commit(versions.tags.bump)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=TagRecipe)
+@receiver(post_delete, sender=TagRecipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_tag_index(sender, **kwargs):
+    """
+    Рецепт тоже: сериализатор добавляет теги через bulk_create
+    без сигналов, а сохраняет рецепт в той же транзакции.
+    """
+    if not kwargs.get('action', 'post_').startswith('post_'):
+        return
+    now_and_on_commit(versions.recipe_tags.bump)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_pantry_index(sender, **kwargs):
+    """Состав рецептов; название рецепта задает порядок при равенстве."""
+    if not kwargs.get('action', 'post_').startswith('post_'):
+        return
+    now_and_on_commit(pantry_index.bump_version)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    invalidate_recipes([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(sender, instance, **kwargs):
+    """Новое изображение отправляется на построение вариантов."""
+    if instance.image:
+        images.schedule_variants(instance.image.name)
+
+
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+@receiver(post_save, sender=TagRecipe)
+@receiver(post_delete, sender=TagRecipe)
+def invalidate_recipe_composition(sender, instance, **kwargs):
+    invalidate_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_recipe_relations(sender, instance, action, reverse, pk_set,
+                                **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_recipes([instance.pk])
+    elif pk_set:
+        invalidate_recipes(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+def invalidate_tag_recipes(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_recipes(Recipe.objects.filter(
+            tags=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_ingredient_recipes(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_recipes(Recipe.objects.filter(
+            ingredients=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Unit)
+def invalidate_unit_recipes(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_recipes(Recipe.objects.filter(
+            ingredients__measurement_unit=instance
+        ).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_author_recipes(sender, instance, created, update_fields=None,
+                              **kwargs):
+    """Пароль и время входа в представление рецепта не попадают."""
+    if update_fields and set(update_fields) <= {'password', 'last_login'}:
+        return
+    if not created:
+        invalidate_recipes(Recipe.objects.filter(
+            author=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, **kwargs):
+    """Индекс поиска - после коммита, когда записаны и ингредиенты."""
+    transaction.on_commit(partial(search.index_recipes, [instance.pk]))
+
+
+@receiver(post_save, sender=Ingredient)
+def index_ingredient_recipes(sender, instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(partial(
+            search.index_recipes,
+            Recipe.objects.filter(
+                ingredients=instance).values_list('id', flat=True)
+        ))
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def index_recipe_ingredients(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    if not action.startswith('post_'):
+        return
+    recipe_ids = set(pk_set or ()) if reverse else [instance.pk]
+    if recipe_ids:
+        transaction.on_commit(partial(search.index_recipes, recipe_ids))
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_profile(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_user_flags(sender, instance, **kwargs):
+    """Флаги is_favorited, is_in_shopping_cart и is_subscribed."""
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_delete, sender=ImageUpload)
+def delete_upload_file(sender, instance, **kwargs):
+    uploads.delete_file(instance)
@@ -0,0 +1,64 @@
+"""
+Хранилища файлов.
+
+ContentAddressedStorage сохраняет файл под именем, которое выводится
+из SHA-256 содержимого: <каталог>/ab/cd/<хэш>.<расширение>. Повторная
+загрузка тех же байт не пишет новый файл, а возвращает имя уже
+сохраненного, содержимое по имени никогда не меняется, поэтому nginx
+отдает такие файлы с Cache-Control: immutable (см. infra/nginx.conf).
+
+Защищенные файлы (списки покупок) пишутся в PROTECTED_MEDIA_ROOT,
+который nginx отдает только по X-Accel-Redirect из ответа Django.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 64 * 1024
+
+
+def get_content_name(directory, digest, extension):
+    return os.path.join(
+        directory, digest[:2], digest[2:4], digest + extension.lower())
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage с именами по хэшу содержимого."""
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks(CHUNK_SIZE):
+            digest.update(chunk)
+        content.seek(0)
+
+        directory, filename = os.path.split(name)
+        name = get_content_name(
+            directory, digest.hexdigest(), os.path.splitext(filename)[1])
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+
+def save_protected(chunks, directory, extension):
+    """
+    Записать поток байт в PROTECTED_MEDIA_ROOT под именем по хэшу
+    содержимого и вернуть путь относительно корня.
+    """
+    root = os.path.join(settings.PROTECTED_MEDIA_ROOT, directory)
+    os.makedirs(root, exist_ok=True)
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=root, delete=False) as tmp_file:
+        for chunk in chunks:
+            digest.update(chunk)
+            tmp_file.write(chunk)
+    # nginx читает файл от своего пользователя.
+    os.chmod(tmp_file.name, 0o644)
+    name = os.path.join(directory, digest.hexdigest() + extension)
+    os.replace(tmp_file.name, os.path.join(
+        settings.PROTECTED_MEDIA_ROOT, name))
+    return name
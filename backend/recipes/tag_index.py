@@ -0,0 +1,110 @@
+"""
+Битовый индекс тегов рецептов.
+
+Для каждого тега хранится множество его рецептов - целое число,
+в котором бит с номером id рецепта установлен, если у рецепта есть
+тег. Любое сочетание тегов через И/ИЛИ считается побитовыми
+операциями над числами без обращения к БД, число установленных бит
+пересечения дает счетчик тега (фасет) для текущего отбора.
+
+Индекс строится одним запросом и хранится в памяти процесса.
+Сигналы recipes.signals меняют штамп versions.recipe_tags при
+изменении тегов рецептов, и каждый процесс перестраивает свою копию
+при первом запросе после изменения.
+"""
+import threading
+
+from django.db import router
+
+from . import versions
+from .models import Tag
+
+# Номера установленных бит для каждого значения байта.
+BYTE_BITS = [
+    tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)
+]
+
+_index = None
+_lock = threading.Lock()
+
+
+def to_bits(recipe_ids):
+    """Множество id рецептов в виде битового числа."""
+    bits = 0
+    for recipe_id in recipe_ids:
+        bits |= 1 << recipe_id
+    return bits
+
+
+def to_ids(bits):
+    """id рецептов битового числа по возрастанию."""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    return [
+        position * 8 + bit
+        for position, byte in enumerate(data) if byte
+        for bit in BYTE_BITS[byte]
+    ]
+
+
+def count(bits):
+    return bin(bits).count('1')
+
+
+def get_version():
+    return versions.tags.get(), versions.recipe_tags.get()
+
+
+class TagIndex:
+    def __init__(self, version, bits):
+        self.version = version
+        self.bits = bits
+
+    @classmethod
+    def build(cls, version):
+        bits = {}
+        rows = Tag.objects.using(router.db_for_write(Tag)).values_list(
+            'slug', 'tagrecipe__recipe_id')
+        for slug, recipe_id in rows.iterator():
+            bits.setdefault(slug, 0)
+            if recipe_id is not None:
+                bits[slug] |= 1 << recipe_id
+        return cls(version, bits)
+
+    @property
+    def slugs(self):
+        return list(self.bits)
+
+    def match(self, all_slugs=(), any_slugs=()):
+        """
+        Рецепты, у которых есть все теги all_slugs и хотя бы один
+        из any_slugs; None, если тегов в отборе нет.
+        """
+        result = None
+        for slug in set(all_slugs):
+            bits = self.bits.get(slug, 0)
+            result = bits if result is None else result & bits
+        if any_slugs:
+            bits = 0
+            for slug in set(any_slugs):
+                bits |= self.bits.get(slug, 0)
+            result = bits if result is None else result & bits
+        return result
+
+    def facets(self, bits=None):
+        """{slug: число рецептов bits с тегом}; None - все рецепты."""
+        if bits is None:
+            return {slug: count(tag_bits)
+                    for slug, tag_bits in self.bits.items()}
+        return {slug: count(bits & tag_bits)
+                for slug, tag_bits in self.bits.items()}
+
+
+def get_tag_index():
+    """Индекс текущей версии; перестраивается при смене штампа."""
+    global _index
+    version = get_version()
+    if _index is None or _index.version != version:
+        with _lock:
+            if _index is None or _index.version != version:
+                _index = TagIndex.build(version)
+    return _index
@@ -0,0 +1,126 @@
+"""
+Прием изображений рецептов частями.
+
+Принятые байты загрузки ImageUpload пишутся потоком в файл
+<IMAGE_UPLOAD_DIR>/<token>.part. Размер файла - истинное смещение:
+часть принимается, только если клиент передал то же смещение,
+а запись защищена flock, поэтому параллельные части одной загрузки
+не перемешаются.
+"""
+import fcntl
+import os
+import shutil
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image
+
+CHUNK_SIZE = 64 * 1024
+
+
+class OffsetMismatchError(Exception):
+    pass
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+class UploadGoneError(Exception):
+    """Файла загрузки нет: удален clear_uploads или вручную."""
+
+
+def get_upload_path(upload):
+    return os.path.join(settings.IMAGE_UPLOAD_DIR, f'{upload.token.hex}.part')
+
+
+def file_exists(upload):
+    return os.path.exists(get_upload_path(upload))
+
+
+def get_received(upload):
+    """Сколько байт загрузки уже на диске."""
+    try:
+        return os.path.getsize(get_upload_path(upload))
+    except FileNotFoundError:
+        return 0
+
+
+def create_file(upload, source=None):
+    """Создать файл загрузки; source - уже принятый Django файл."""
+    path = get_upload_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if hasattr(source, 'temporary_file_path'):
+        shutil.move(source.temporary_file_path(), path)
+        return
+    with open(path, 'wb') as part:
+        for chunk in source.chunks(CHUNK_SIZE) if source else ():
+            part.write(chunk)
+
+
+def delete_file(upload):
+    try:
+        os.remove(get_upload_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def get_body_stream(request):
+    """
+    Тело запроса для потокового чтения. При Transfer-Encoding: chunked
+    Django 2.2 считает тело пустым, поэтому читается wsgi.input,
+    если сервер (gunicorn) сам отмечает конец тела.
+    """
+    environ = request.META
+    if (not environ.get('CONTENT_LENGTH')
+            and environ.get('wsgi.input_terminated')):
+        return environ['wsgi.input']
+    return request
+
+
+def append(upload, stream, offset):
+    """Дописать поток в файл загрузки с позиции offset."""
+    try:
+        part = open(get_upload_path(upload), 'r+b')
+    except FileNotFoundError:
+        raise UploadGoneError
+    with part:
+        fcntl.flock(part, fcntl.LOCK_EX)
+        received = part.seek(0, os.SEEK_END)
+        if offset != received:
+            raise OffsetMismatchError
+
+        left = upload.size - received
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if len(chunk) > left:
+                part.truncate(received)
+                raise UploadTooLargeError
+            part.write(chunk)
+            left -= len(chunk)
+
+
+def verify_image(upload):
+    try:
+        with Image.open(get_upload_path(upload)) as image:
+            image.verify()
+    except Exception:
+        return False
+    return True
+
+
+class UploadedImage(File):
+    """
+    Файл завершенной загрузки для ImageField. FileSystemStorage
+    перемещает его по temporary_file_path(), не читая в память.
+    Используется в with: файл закрывается после сохранения модели.
+    """
+
+    def __init__(self, upload):
+        self.path = get_upload_path(upload)
+        super().__init__(open(self.path, 'rb'), name=upload.filename)
+
+    def temporary_file_path(self):
+        return self.path
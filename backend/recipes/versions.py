@@ -0,0 +1,63 @@
+"""
+Штампы версий данных, общие для всех процессов.
+
+Штамп - случайная строка в файле; сигналы записывают новый штамп
+при изменении данных, а процессы сравнивают его со штампом своей
+копии. Чтение штампа стоит одного os.stat: содержимое файла
+перечитывается, только если файл сменился.
+"""
+import os
+import uuid
+from functools import partial
+
+from django.conf import settings
+
+
+def write_atomic(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as tmp_file:
+        tmp_file.write(content)
+    os.replace(tmp_path, path)
+
+
+class VersionStamp:
+    def __init__(self, get_path):
+        self.get_path = get_path
+        self.cached = (None, None)
+
+    def bump(self):
+        """Пометить данные устаревшими во всех процессах."""
+        write_atomic(self.get_path(), uuid.uuid4().hex.encode('ascii'))
+
+    def get(self):
+        """Текущий штамп версии."""
+        path = self.get_path()
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.bump()
+            stat = os.stat(path)
+
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        cached_key, stamp = self.cached
+        if cached_key != key:
+            with open(path, 'rb') as version_file:
+                stamp = version_file.read().strip()
+            self.cached = (key, stamp)
+        return stamp
+
+    def get_modified(self):
+        """Время последней смены штампа (unix time)."""
+        self.get()
+        (_, mtime_ns, _), _ = self.cached
+        return mtime_ns / 1e9
+
+
+def get_stamp_path(name):
+    return os.path.join(settings.VERSION_STAMP_DIR, f'{name}.version')
+
+
+tags = VersionStamp(partial(get_stamp_path, 'tags'))
+recipe_tags = VersionStamp(partial(get_stamp_path, 'recipe_tags'))
+recipes = VersionStamp(partial(get_stamp_path, 'recipes'))
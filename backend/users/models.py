@@ -37,3 +37,17 @@ class CustomUser(AbstractUser):
 
     def __str__(self):
         return self.username
+
+
+class RevokedToken(models.Model):
+    """Отозванный при выходе подписанный токен (api/authentication.py)."""
+
+    jti = models.CharField('Идентификатор токена', max_length=16, unique=True)
+    expires = models.DateTimeField('Срок действия', db_index=True)
+
+    class Meta:
+        verbose_name = 'Отозванный токен'
+        verbose_name_plural = 'Отозванные токены'
+
+    def __str__(self):
+        return self.jti